@@ -0,0 +1,227 @@
+"""
+Benchmark of every command on synthetic trees.
+
+Generates trees of different shapes and sizes in temporary SQLite files, runs
+every command from MainLogic.commands on them (with rendering of the tree
+afterwards, as the REPL does it), saves the results to JSON and compares them
+with the baseline.
+
+Usage (from the project root):
+    python -m benchmarks.commands [--sizes 1000 10000 100000 1000000]
+        [--shapes wide deep balanced collapsed] [--output results.json]
+        [--save-baseline]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from configparser import ConfigParser
+from typing import Dict, List, Optional
+
+from benchmarks import synthetic_trees
+from config.ini_worker import MyINIWorker
+from handlers.handlers import Handlers
+from main_logic import MainLogic
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(
+    PROJECT_ROOT, "benchmarks", "baselines", "commands.json"
+)
+# Measured time can be that much slower than the baseline before it is
+# reported as a regression
+ALLOWED_SLOWDOWN = 1.25
+# Differences smaller than that are noise
+MIN_REGRESSION_SECONDS = 0.002
+
+# Command (by its first name) -> command lines to benchmark; "{directory}" is
+# replaced with a temporary directory. Task 1 is the root of a large subtree
+# in every shape, tasks 2 and 3 exist in every shape
+COMMAND_LINES: Dict[str, List[str]] = {
+    "автопоказ": ["autoshowing on"],
+    "помощь": ["help", "help add, move"],
+    "добавить": ["add 1 new task"],
+    "показать": ["show"],
+    "удалить": ["delete 1"],
+    "пометить": ["check 1"],
+    "убрать метку": ["uncheck 1"],
+    "свернуть": ["collapse 1"],
+    "развернуть": ["expand 1"],
+    "изменить": ["edit 1 new text"],
+    "переместить": ["move - 2", "move 3 2"],
+    "поставить перед": ["before 3 2"],
+    "поставить после": ["after 2 3"],
+    "дата": ["date 1"],
+    "найти": ["search word7", "search task 1"],
+    "статистика": ["stats"],
+    "отчет": ["report"],
+    "метрики": ["metrics"],
+    "профилирование": ["profile off"],
+    "пересчитать": ["recount"],
+    "экспорт": [
+        "export {directory}/export.jsonl", "export {directory}/export.txt"
+    ],
+    "импорт": ["import - {directory}/import.jsonl"],
+    "отменить": ["undo"],
+    "вернуть": ["redo"],
+    "начать": ["begin"],
+    "зафиксировать": ["commit"],
+    "откатить": ["rollback"],
+    "синхронизировать": ["sync"],
+    "бэкап": ["backup"],
+    "восстановить": ["restore {directory}/backup.db"],
+    "пространство": ["workspace copy"],
+    "пространства": ["workspaces"],
+    "искать везде": ["search-all word7"],
+    "выгрузить все": ["export-all {directory}/workspaces"],
+}
+
+
+def create_main_logic(directory: str) -> MainLogic:
+    def open_storage(database_path: str):
+        from orm import db_apis
+        return db_apis.TasksManager(db_apis.get_sqlalchemy_db_session(
+            f"sqlite:///{database_path}"
+        ))
+    ini_worker = MyINIWorker(
+        ConfigParser(), os.path.join(directory, "config.ini")
+    )
+    main_logic = MainLogic(ini_worker, Handlers(ini_worker, open_storage))
+    ini_worker["backup_directory"] = os.path.join(directory, "backups")
+    # The second workspace is a copy of the same tree
+    for name, file_name in (("main", "tree_of_tasks.db"), ("copy", "copy.db")):
+        ini_worker[("workspaces", name)] = os.path.join(directory, file_name)
+    # The workspace command of a previous measurement could save another one
+    ini_worker.set_workspace("main")
+    return main_logic
+
+
+def measure_command(
+        database_path: str, command_line: str, directory: str) -> float:
+    """
+    Runs the command on a fresh copy of the database with a fresh session
+    (like a new launch of the program does).
+
+    Returns:
+        seconds spent on handling the command and rendering the tree
+    """
+    shutil.copy(database_path, os.path.join(directory, "tree_of_tasks.db"))
+    main_logic = create_main_logic(directory)
+    # Database is opened before the measurement
+    main_logic.handlers.tasks_manager
+    start = time.perf_counter()
+    result = main_logic.handle_command(
+        command_line.format(directory=directory)
+    )
+    if result.whether_to_print_a_tree:
+        main_logic.render_tree()
+    duration = time.perf_counter() - start
+    # Commands for all workspaces open the storages of the other ones too
+    main_logic.handlers.workspace_pool.close_all()
+    # The config is saved by a timer, it must be saved before the directory
+    # is removed
+    main_logic.ini_worker.flush()
+    return duration
+
+
+def run(sizes: List[int], shapes: List[str]) -> Dict[str, float]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        commands = create_main_logic(directory).commands
+        not_covered_commands = {
+            command.names[0] for command in commands
+        } - COMMAND_LINES.keys()
+        if not_covered_commands:
+            print(
+                f"Commands without benchmarks: "
+                f"{', '.join(sorted(not_covered_commands))}",
+                file=sys.stderr
+            )
+        for size in sizes:
+            for shape in shapes:
+                database_path = os.path.join(directory, f"{shape}-{size}.db")
+                start = time.perf_counter()
+                synthetic_trees.create_database(shape, size, database_path)
+                print(
+                    f"{shape}/{size}: generated in "
+                    f"{time.perf_counter() - start:.1f} s", file=sys.stderr
+                )
+                shutil.copy(
+                    database_path, os.path.join(directory, "tree_of_tasks.db")
+                )
+                create_main_logic(directory).handle_command(
+                    f"export {directory}/import.jsonl"
+                )
+                for file_name in ("backup.db", "copy.db"):
+                    shutil.copy(
+                        database_path, os.path.join(directory, file_name)
+                    )
+                for command_lines in COMMAND_LINES.values():
+                    for command_line in command_lines:
+                        name = f"{shape}/{size}/{command_line}"
+                        results[name] = measure_command(
+                            database_path, command_line, directory
+                        )
+                        print(f"{name}: {results[name] * 1000:.2f} ms")
+                os.remove(database_path)
+    return results
+
+
+def compare_with_baseline(
+        results: Dict[str, float],
+        baseline: Dict[str, float]) -> List[str]:
+    """
+    Returns:
+        names of the measurements, which are slower than in the baseline
+    """
+    return [
+        name for name, duration in results.items()
+        if name in baseline
+        and duration > baseline[name] * ALLOWED_SLOWDOWN
+        and duration - baseline[name] > MIN_REGRESSION_SECONDS
+    ]
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000]
+    )
+    parser.add_argument(
+        "--shapes", nargs="+", choices=synthetic_trees.SHAPES,
+        default=list(synthetic_trees.SHAPES)
+    )
+    parser.add_argument("--output", help="where to save the results (JSON)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="save the results as the new baseline"
+    )
+    args = parser.parse_args(arguments)
+    results = run(args.sizes, args.shapes)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    regressions = compare_with_baseline(results, baseline)
+    for name in regressions:
+        print(
+            f"REGRESSION {name}: {results[name] * 1000:.2f} ms "
+            f"(baseline {baseline[name] * 1000:.2f} ms)", file=sys.stderr
+        )
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
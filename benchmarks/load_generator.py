@@ -0,0 +1,142 @@
+"""
+Load generator for the network server.
+
+Opens many concurrent connections to server.tree_server and sends a mix of
+reading and writing commands from every connection, then reports throughput
+and latency percentiles of both kinds of commands. Without --connect the
+server is started in this process on a copy of the database (the original
+database isn't changed).
+
+Usage (from the project root):
+    python -m benchmarks.load_generator [--connect 127.0.0.1:8765]
+        [--database tree_of_tasks.db] [--clients 50] [--commands 100]
+        [--write-ratio 0.2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.commands import create_main_logic
+from benchmarks.replay import get_percentile
+from server.client import TreeClient
+from server.tree_server import TreeServer, DEFAULT_HOST
+
+READING_COMMANDS = ("show", "stats", "search task")
+WRITING_COMMANDS = ("add - load test task {number}",)
+
+
+async def run_client(
+        host: str, port: int, commands_amount: int, write_ratio: float,
+        seed: int) -> List[Tuple[str, float]]:
+    """
+    Returns:
+        kind of every command ("read" or "write") and its latency in seconds
+    """
+    random_generator = random.Random(seed)
+    client = TreeClient()
+    await client.connect(host, port)
+    latencies = []
+    try:
+        for number in range(commands_amount):
+            if random_generator.random() < write_ratio:
+                kind = "write"
+                command = random_generator.choice(WRITING_COMMANDS).format(
+                    number=number
+                )
+            else:
+                kind = "read"
+                command = random_generator.choice(READING_COMMANDS)
+            start = time.perf_counter()
+            await client.execute(command)
+            latencies.append((kind, time.perf_counter() - start))
+    finally:
+        await client.close()
+    return latencies
+
+
+async def generate_load(
+        host: str, port: int, clients_amount: int, commands_amount: int,
+        write_ratio: float) -> List[Tuple[str, float]]:
+    results = await asyncio.gather(*(
+        run_client(host, port, commands_amount, write_ratio, seed)
+        for seed in range(clients_amount)
+    ))
+    return [latency for latencies in results for latency in latencies]
+
+
+async def generate_load_on_local_server(
+        database_path: str, clients_amount: int, commands_amount: int,
+        write_ratio: float) -> List[Tuple[str, float]]:
+    with tempfile.TemporaryDirectory() as directory:
+        if os.path.exists(database_path):
+            shutil.copy(
+                database_path, os.path.join(directory, "tree_of_tasks.db")
+            )
+        tree_server = TreeServer(create_main_logic(directory))
+        # Port 0 means any free port
+        server = await tree_server.start(DEFAULT_HOST, 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await generate_load(
+                DEFAULT_HOST, port, clients_amount, commands_amount,
+                write_ratio
+            )
+        finally:
+            server.close()
+            await server.wait_closed()
+            tree_server.close()
+
+
+def print_report(latencies: List[Tuple[str, float]], duration: float) -> None:
+    print(
+        f"Commands: {len(latencies)} in {duration:.3f} s "
+        f"({len(latencies) / duration:.1f} commands/s)"
+    )
+    latencies_by_kind: Dict[str, List[float]] = {}
+    for kind, latency in latencies:
+        latencies_by_kind.setdefault(kind, []).append(latency)
+    for kind, kind_latencies in sorted(latencies_by_kind.items()):
+        kind_latencies.sort()
+        print(f"{kind} ({len(kind_latencies)}), latency, ms: " + ", ".join(
+            f"{name} {value * 1000:.3f}"
+            for name, value in (
+                ("mean", sum(kind_latencies) / len(kind_latencies)),
+                ("p50", get_percentile(kind_latencies, 0.5)),
+                ("p90", get_percentile(kind_latencies, 0.9)),
+                ("p99", get_percentile(kind_latencies, 0.99)),
+                ("max", kind_latencies[-1]),
+            )
+        ))
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--connect", metavar="HOST:PORT",
+        help="address of a running server (else a local one is started)"
+    )
+    parser.add_argument("--database", default="tree_of_tasks.db")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=100)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args(arguments)
+    start = time.perf_counter()
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        latencies = asyncio.run(generate_load(
+            host, int(port), args.clients, args.commands, args.write_ratio
+        ))
+    else:
+        latencies = asyncio.run(generate_load_on_local_server(
+            args.database, args.clients, args.commands, args.write_ratio
+        ))
+    print_report(latencies, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
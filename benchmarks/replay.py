@@ -0,0 +1,126 @@
+"""
+Replay of the recorded REPL sessions.
+
+Feeds the commands from a session log (see the "session_log" config key)
+through MainLogic.handle_command against a copy of the database (the original
+database isn't changed) and reports throughput and latency percentiles. The
+tree is rendered after the commands, which change it, as the REPL does it.
+
+Usage (from the project root):
+    python -m benchmarks.replay <session log> [--database tree_of_tasks.db]
+        [--original-pacing] [--speed 2]
+"""
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from benchmarks.commands import create_main_logic
+
+
+def read_session_log(file_path: str) -> Iterator[Tuple[float, str]]:
+    """
+    Yields:
+        UNIX time, when the command was entered, and the command
+    """
+    with open(file_path, encoding="utf-8") as f:
+        for line in f:
+            timestamp, _, command = line.rstrip("\n").partition("\t")
+            yield float(timestamp), command
+
+
+def get_percentile(sorted_values: List[float], percentile: float) -> float:
+    index = math.ceil(percentile * len(sorted_values)) - 1
+    return sorted_values[min(max(index, 0), len(sorted_values) - 1)]
+
+
+def replay(
+        session_log_path: str, database_path: str,
+        original_pacing: bool = False, speed: float = 1) -> List[float]:
+    """
+    Args:
+        session_log_path: path to the session log
+        database_path: database, a copy of which is used
+        original_pacing:
+            wait between the commands as long as the user did (divided by the
+            speed), else run the commands as fast as possible
+        speed: how many times faster than the original pacing to go
+
+    Returns:
+        latencies of the commands (in seconds)
+    """
+    latencies = []
+    with tempfile.TemporaryDirectory() as directory:
+        if os.path.exists(database_path):
+            shutil.copy(
+                database_path, os.path.join(directory, "tree_of_tasks.db")
+            )
+        main_logic = create_main_logic(directory)
+        try:
+            # Database is opened before the replay, so the first command doesn't
+            # pay for it
+            main_logic.handlers.tasks_manager
+            first_timestamp = None
+            replay_start = time.perf_counter()
+            for timestamp, command in read_session_log(session_log_path):
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                if original_pacing:
+                    delay = (
+                        (timestamp - first_timestamp) / speed
+                        - (time.perf_counter() - replay_start)
+                    )
+                    if delay > 0:
+                        time.sleep(delay)
+                start = time.perf_counter()
+                result = main_logic.handle_command(command)
+                if result.whether_to_print_a_tree:
+                    main_logic.render_tree()
+                latencies.append(time.perf_counter() - start)
+        finally:
+            # Storages of all opened workspaces are closed and the config is
+            # saved (by a timer otherwise) before the directory is removed
+            main_logic.handlers.workspace_pool.close_all()
+            main_logic.ini_worker.flush()
+    return latencies
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("session_log")
+    parser.add_argument("--database", default="tree_of_tasks.db")
+    parser.add_argument("--original-pacing", action="store_true")
+    parser.add_argument("--speed", type=float, default=1)
+    args = parser.parse_args(arguments)
+    start = time.perf_counter()
+    latencies = replay(
+        args.session_log, args.database, args.original_pacing, args.speed
+    )
+    duration = time.perf_counter() - start
+    if not latencies:
+        print("Session log is empty", file=sys.stderr)
+        return
+    sorted_latencies = sorted(latencies)
+    print(f"Commands: {len(latencies)} in {duration:.3f} s")
+    print(
+        f"Throughput: {len(latencies) / sum(latencies):.1f} commands/s "
+        f"(of handling time)"
+    )
+    print("Latency, ms: " + ", ".join(
+        f"{name} {value * 1000:.3f}"
+        for name, value in (
+            ("mean", sum(latencies) / len(latencies)),
+            ("p50", get_percentile(sorted_latencies, 0.5)),
+            ("p90", get_percentile(sorted_latencies, 0.9)),
+            ("p99", get_percentile(sorted_latencies, 0.99)),
+            ("max", sorted_latencies[-1]),
+        )
+    ))
+
+
+if __name__ == "__main__":
+    main()
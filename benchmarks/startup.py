@@ -0,0 +1,154 @@
+"""
+Startup time benchmark.
+
+Measures how long it takes to import main_logic, to run one-shot commands
+(`python main_logic.py <command>`) and to handle the first command in a fresh
+process, and checks that the commands, which don't need the
+tasks, don't import SQLAlchemy.
+
+Usage (from the project root):
+    python -m benchmarks.startup [--runs N] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(
+    PROJECT_ROOT, "benchmarks", "baselines", "startup.json"
+)
+# Measured time can be that much slower than the baseline before it is
+# reported as a regression
+ALLOWED_SLOWDOWN = 1.25
+
+FIRST_COMMAND_SCRIPT = (
+    "import functools\n"
+    "import sys\n"
+    "from configparser import ConfigParser\n"
+    "from main_logic import MainLogic, get_tasks_manager, CONFIG_FILE_PATH\n"
+    "from config.ini_worker import MyINIWorker\n"
+    "from handlers.handlers import Handlers\n"
+    "ini_worker = MyINIWorker(ConfigParser(), CONFIG_FILE_PATH)\n"
+    "handlers = Handlers(\n"
+    "    ini_worker, functools.partial(get_tasks_manager, ini_worker)\n"
+    ")\n"
+    "main_logic = MainLogic(ini_worker, handlers)\n"
+    "main_logic.handle_command(sys.argv[1])\n"
+    "print('sqlalchemy' in sys.modules)\n"
+)
+
+# Command and whether it is allowed to import SQLAlchemy
+FIRST_COMMANDS: Tuple[Tuple[str, bool], ...] = (
+    ("help", False),
+    ("show", True),
+)
+
+
+def run_python(args: List[str], working_directory: str) -> Tuple[float, str]:
+    environment = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    start = time.perf_counter()
+    completed_process = subprocess.run(
+        [sys.executable, *args], cwd=working_directory, env=environment,
+        capture_output=True, text=True, check=True
+    )
+    return (
+        time.perf_counter() - start,
+        completed_process.stdout + completed_process.stderr
+    )
+
+
+def get_import_times(working_directory: str) -> Dict[str, int]:
+    """
+    Returns:
+        cumulative import times (in microseconds) of the modules, which are
+        imported by main_logic
+    """
+    _, output = run_python(
+        ["-X", "importtime", "-c", "import main_logic"], working_directory
+    )
+    import_times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self_time, cumulative_time, module_name = line[12:].split("|")
+        if cumulative_time.strip().isdigit():
+            import_times[module_name.strip()] = int(cumulative_time)
+    return import_times
+
+
+def measure(runs: int) -> Dict[str, float]:
+    results = {}
+    with tempfile.TemporaryDirectory() as working_directory:
+        import_times = get_import_times(working_directory)
+        results["import main_logic (importtime), ms"] = (
+            import_times["main_logic"] / 1000
+        )
+        results["import main_logic, ms"] = 1000 * statistics.median(
+            run_python(["-c", "import main_logic"], working_directory)[0]
+            for _ in range(runs)
+        )
+        for command, _ in FIRST_COMMANDS:
+            results[f"one-shot {command!r}, ms"] = 1000 * statistics.median(
+                run_python(
+                    [os.path.join(PROJECT_ROOT, "main_logic.py"), command],
+                    working_directory
+                )[0]
+                for _ in range(runs)
+            )
+        for command, may_import_sqlalchemy in FIRST_COMMANDS:
+            durations = []
+            for _ in range(runs):
+                duration, output = run_python(
+                    ["-c", FIRST_COMMAND_SCRIPT, command], working_directory
+                )
+                durations.append(duration)
+            if output.split()[-1] == "True" and not may_import_sqlalchemy:
+                raise AssertionError(
+                    f"Command {command!r} imported SQLAlchemy on startup"
+                )
+            results[f"first command {command!r}, ms"] = (
+                1000 * statistics.median(durations)
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help=f"save results to {BASELINE_PATH}"
+    )
+    args = parser.parse_args()
+    results = measure(args.runs)
+    try:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    regressions = []
+    for name, value in results.items():
+        baseline_value = baseline.get(name)
+        comparison = ""
+        if baseline_value is not None:
+            comparison = f" (baseline {baseline_value:.1f})"
+            if value > baseline_value * ALLOWED_SLOWDOWN:
+                regressions.append(name)
+                comparison += " REGRESSION"
+        print(f"{name}: {value:.1f}{comparison}")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=4)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
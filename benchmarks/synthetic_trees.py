@@ -0,0 +1,99 @@
+"""
+Generators of synthetic trees of tasks for benchmarks.
+"""
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, Tuple
+
+# Length of chains in the "deep" shape (the tree is rendered recursively, so
+# it shouldn't come close to the recursion limit)
+CHAIN_LENGTH = 200
+BRANCHING_FACTOR = 10
+WIDE_ROOTS_AMOUNT = 10
+# Share of checked tasks
+CHECKED_SHARE = 0.3
+
+
+def get_wide_parent_index(index: int) -> int:
+    # A few roots with a lot of direct children
+    return -1 if index < WIDE_ROOTS_AMOUNT else index % WIDE_ROOTS_AMOUNT
+
+
+def get_deep_parent_index(index: int) -> int:
+    # Long chains of tasks, every task has only one child
+    return -1 if index % CHAIN_LENGTH == 0 else index - 1
+
+
+def get_balanced_parent_index(index: int) -> int:
+    # One root, every task has BRANCHING_FACTOR children
+    return (index - 1) // BRANCHING_FACTOR if index else -1
+
+
+# Shape name -> (function, which gets index of the parent by index of the task
+# (-1 means no parent), whether tasks with children are collapsed)
+SHAPES: Dict[str, Tuple[Callable[[int], int], bool]] = {
+    "wide": (get_wide_parent_index, False),
+    "deep": (get_deep_parent_index, False),
+    "balanced": (get_balanced_parent_index, False),
+    "collapsed": (get_balanced_parent_index, True),
+}
+
+
+def generate_rows(
+        shape: str, size: int, seed: int = 0) -> Iterator[Tuple]:
+    """
+    Generates rows of the "tasks" table without the subtree counters (they are
+    rebuilt afterwards). Parents always go before their children.
+    """
+    get_parent_index, collapse_parents = SHAPES[shape]
+    random_generator = random.Random(seed)
+    creation_date = datetime(2020, 1, 1)
+    for index in range(size):
+        parent_index = get_parent_index(index)
+        yield (
+            index + 1,
+            f"task {index + 1} word{index % 100}",
+            random_generator.random() < CHECKED_SHARE,
+            # Only the balanced layout is collapsed, there the parent of the
+            # last task is the last task with children. Roots stay expanded
+            collapse_parents
+            and parent_index != -1
+            and index <= get_parent_index(size - 1),
+            None if parent_index == -1 else parent_index + 1,
+            (creation_date + timedelta(seconds=index)).strftime(
+                "%Y-%m-%d %H:%M:%S.%f"
+            ),
+            float(index + 1),
+        )
+
+
+def create_database(shape: str, size: int, file_path: str) -> None:
+    """
+    Creates an SQLite database with the synthetic tree of the specified shape
+    and size (the schema is the same as the program creates).
+    """
+    from orm import db_apis
+    db_session = db_apis.get_sqlalchemy_db_session(f"sqlite:///{file_path}")
+    db_session.close()
+    db_session.get_bind().dispose()
+    connection = sqlite3.connect(file_path)
+    rows = generate_rows(shape, size)
+    with connection:
+        while True:
+            batch = [row for _, row in zip(range(10000), rows)]
+            if not batch:
+                break
+            connection.executemany(
+                "INSERT INTO tasks (id, text, is_checked, is_collapsed, "
+                "parent_id, creation_date, position, descendant_count, "
+                "checked_descendant_count) VALUES (?, ?, ?, ?, ?, ?, ?, 0, 0)",
+                batch
+            )
+    connection.close()
+    # Counters are computed the same way the consistency check does it
+    db_session = db_apis.get_sqlalchemy_db_session(f"sqlite:///{file_path}")
+    db_apis.TasksManager(db_session).rebuild_subtree_counters()
+    db_session.commit()
+    db_session.close()
+    db_session.get_bind().dispose()
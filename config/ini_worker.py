@@ -1,8 +1,18 @@
+import atexit
 import os
+import tempfile
+import threading
+import configparser
 from configparser import ConfigParser, SectionProxy
-from typing import Optional, Any, Tuple, Dict, Union
+from typing import Optional, Any, Tuple, Dict, Union, Callable
 
 from config import type_converters
+from instrumentation import profiling
+
+# Marks that get_typed has no default value (None can be a default value)
+_NO_DEFAULT = object()
+# Workspace, which exists even if the config doesn't list it
+DEFAULT_WORKSPACE = "main"
 
 
 class INIWorker:
@@ -13,6 +23,30 @@ class INIWorker:
         self.config_parser = config_parser
         self.file_path = file_path
         self.default_section = default_section
+        # Values converted by get_typed, keys are (section, key) tuples
+        self._typed_values: Dict[Tuple[str, str], Any] = {}
+        # Guards config parser, because scheduled saves are made from another
+        # thread
+        self._lock = threading.RLock()
+        self._scheduled_save: Optional[threading.Timer] = None
+        self._flush_is_registered = False
+        # (modification time, size, inode) of the file at the moment it was
+        # loaded or saved by this worker
+        self._file_signature: Optional[Tuple[int, int, int]] = None
+
+    def _split_section_and_key(
+            self,
+            section_and_key: Union[Tuple[str, str], str]) -> Tuple[str, str]:
+        if isinstance(section_and_key, str):
+            return self.default_section, section_and_key
+        return section_and_key
+
+    def _get_file_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
 
     def load(
             self, file_path: Optional[str] = None,
@@ -29,6 +63,7 @@ class INIWorker:
         """
         if file_path is None:
             file_path = self.file_path
+        self._typed_values.clear()
         try:
             with open(file_path, "r") as f:
                 self.config_parser.read_file(f)
@@ -40,11 +75,72 @@ class INIWorker:
                     f.write(default_contents)
             else:
                 raise
+        if file_path == self.file_path:
+            self._file_signature = self._get_file_signature()
+
+    def reload_if_changed(self) -> bool:
+        """
+        Loads the config file again, if it was changed by someone else since
+        it was loaded or saved by this worker. Costs one stat() call, if the
+        file wasn't changed. Only the cached typed values of the changed and
+        removed keys are invalidated.
+
+        Changes of the file are ignored while there is a scheduled save of
+        local changes, the local changes win. A file, which can't be parsed,
+        is ignored until it's fixed.
+
+        Returns:
+            True if the config was reloaded, else False
+        """
+        file_signature = self._get_file_signature()
+        if (
+            file_signature == self._file_signature
+            or file_signature is None
+            or self._scheduled_save is not None
+        ):
+            return False
+        with self._lock:
+            old_values = self._get_all_values()
+            try:
+                with open(self.file_path, "r") as f:
+                    contents = f.read()
+            except OSError:
+                return False
+            # The file is parsed into a fresh parser first, so a broken file
+            # (or a file, which is being written by hand) doesn't leave the
+            # config half-cleared, the old values are kept then
+            try:
+                type(self.config_parser)().read_string(contents)
+            except configparser.Error:
+                return False
+            # Keys and sections, which were removed from the file, are
+            # removed from the config too
+            for section_name in self.config_parser.sections():
+                self.config_parser.remove_section(section_name)
+            self.config_parser.defaults().clear()
+            self.config_parser.read_string(contents)
+            self._file_signature = file_signature
+            new_values = self._get_all_values()
+        for section_and_key in old_values.keys() | new_values.keys():
+            if old_values.get(section_and_key) != new_values.get(
+                section_and_key
+            ):
+                self._typed_values.pop(section_and_key, None)
+        return True
+
+    def _get_all_values(self) -> Dict[Tuple[str, str], str]:
+        return {
+            (section_name, key): value
+            for section_name, section in self.config_parser.items()
+            for key, value in section.items()
+        }
 
     def load_from_string(self, string: str) -> None:
+        self._typed_values.clear()
         self.config_parser.read_string(string)
 
     def load_from_dict(self, dict_: Dict[str, Dict[str, Any]]) -> None:
+        self._typed_values.clear()
         self.config_parser.read_dict(dict_)
 
     def save(self, file_path: Optional[str] = None) -> None:
@@ -52,12 +148,65 @@ class INIWorker:
         Saves the current state of config parser to the file with the specified
         path.
 
+        The config is written to a temporary file first, which then replaces
+        the old one, so the file is never left half-written.
+
         Args:
             file_path:
                 path to the file, where config parser info should be saved
         """
-        with open(self.file_path if file_path is None else file_path, "w") as f:
-            self.config_parser.write(f)
+        if file_path is None:
+            file_path = self.file_path
+        directory = os.path.dirname(os.path.abspath(file_path))
+        with self._lock:
+            file_descriptor, temporary_file_path = tempfile.mkstemp(
+                dir=directory, prefix=".", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(file_descriptor, "w") as f:
+                    self.config_parser.write(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporary_file_path, file_path)
+            except BaseException:
+                os.remove(temporary_file_path)
+                raise
+            if file_path == self.file_path:
+                self._file_signature = self._get_file_signature()
+
+    def schedule_save(self, delay: float = 0.5) -> None:
+        """
+        Saves the config to self.file_path in the background after the delay.
+        All saves, which are scheduled before the pending one is made, are
+        coalesced into it. Pending save is made on exit anyway.
+
+        Args:
+            delay: seconds to wait for other changes before saving
+        """
+        with self._lock:
+            if not self._flush_is_registered:
+                atexit.register(self.flush)
+                self._flush_is_registered = True
+            if self._scheduled_save is None:
+                self._scheduled_save = threading.Timer(
+                    delay, self._make_scheduled_save
+                )
+                self._scheduled_save.daemon = True
+                self._scheduled_save.start()
+
+    def _make_scheduled_save(self) -> None:
+        with self._lock:
+            self._scheduled_save = None
+            self.save()
+
+    def flush(self) -> None:
+        """
+        Makes the scheduled save right now (if there is one).
+        """
+        with self._lock:
+            if self._scheduled_save is not None:
+                self._scheduled_save.cancel()
+                self._make_scheduled_save()
 
     def as_str(self) -> str:
         """
@@ -110,13 +259,43 @@ class INIWorker:
         Returns:
             received value (as string, because they are stored as strings...)
         """
-        if isinstance(section_and_key, str):
-            section = self.default_section
-            name = section_and_key
-        else:
-            section, name = section_and_key
+        section, name = self._split_section_and_key(section_and_key)
         return self.config_parser[section][name]
 
+    def get_typed(
+            self, section_and_key: Union[Tuple[str, str], str],
+            converter: Callable[[str], Any], default: Any = _NO_DEFAULT) -> Any:
+        """
+        Gets the value of the specified key converted by the converter. The
+        converted value is cached until the key is set or the config is
+        loaded again, so the converter is called only once.
+
+        Args:
+            section_and_key:
+                tuple of two strings - section name and key
+                OR
+                key, then section is self.default_section
+            converter: function, which converts the string value
+            default:
+                value, which is returned if there's no such key (if not
+                specified - KeyError is raised)
+
+        Returns:
+            converted value
+        """
+        section_and_key = self._split_section_and_key(section_and_key)
+        try:
+            return self._typed_values[section_and_key]
+        except KeyError:
+            try:
+                value = converter(self[section_and_key])
+            except KeyError:
+                if default is _NO_DEFAULT:
+                    raise
+                value = default
+            self._typed_values[section_and_key] = value
+            return value
+
     def __setitem__(
             self, section_and_key: Union[Tuple[str, str], str],
             value: Any) -> None:
@@ -131,12 +310,10 @@ class INIWorker:
                 key, then section is self.default_section
             value: you know what this is. Will be converted to string
         """
-        if isinstance(section_and_key, str):
-            section = self.default_section
-            name = section_and_key
-        else:
-            section, name = section_and_key
-        self.config_parser[section][name] = str(value)
+        section, name = self._split_section_and_key(section_and_key)
+        with self._lock:
+            self.config_parser[section][name] = str(value)
+        self._typed_values.pop((section, name), None)
 
     def get_section(
             self, name: str,
@@ -149,10 +326,194 @@ class INIWorker:
         return self.config_parser[name]
 
     def set_section(self, name: str, value: Dict[str, str]) -> None:
-        self.config_parser[name] = value
+        with self._lock:
+            self.config_parser[name] = value
+        self._typed_values.clear()
 
 
 class MyINIWorker(INIWorker):
 
     def get_auto_showing_state(self) -> bool:
-        return type_converters.str_to_bool(self["auto_showing"])
+        return self.get_typed(
+            "auto_showing", type_converters.str_to_bool, True
+        )
+
+    def set_auto_showing_state(self, state: bool) -> None:
+        self["auto_showing"] = state
+
+    def get_profiling_mode(self) -> profiling.ProfilingMode:
+        """
+        Returns:
+            profiling mode named like in the profiling command ("off", "вкл",
+            "trace" and so on), OFF if the mode is empty or unknown
+        """
+        return self.get_typed(
+            "profiling",
+            lambda value: profiling.MODE_NAMES.get(
+                value.strip().lower(), profiling.ProfilingMode.OFF
+            ),
+            profiling.ProfilingMode.OFF
+        )
+
+    def get_history_file_path(self) -> Optional[str]:
+        """
+        Returns:
+            path to the file, from which the history of the entered commands
+            is loaded on start and to which it is saved on exit, or None if
+            the history should be lost on exit
+        """
+        return self.get_typed("history_file", lambda path: path or None, None)
+
+    def get_session_log_path(self) -> Optional[str]:
+        """
+        Returns:
+            path to the file, where the entered commands should be logged, or
+            None if they shouldn't be logged
+        """
+        return self.get_typed("session_log", lambda path: path or None, None)
+
+    def get_metrics_file_path(self) -> Optional[str]:
+        """
+        Returns:
+            path to the file, where the metrics should be saved on exit, or
+            None if they shouldn't be saved
+        """
+        return self.get_typed("metrics_file", lambda path: path or None, None)
+
+    def get_storage(self) -> str:
+        """
+        Returns:
+            "sqlite", "memory" or "event_log"
+        """
+        return self.get_typed("storage", str.lower, "sqlite")
+
+    def get_memory_snapshot_path(self) -> Optional[str]:
+        """
+        Returns:
+            path to the file, from which the in-memory storage is loaded on
+            start and to which it is saved on exit, or None if the tree of the
+            in-memory storage should be lost on exit
+        """
+        return self.get_typed(
+            "memory_snapshot", lambda path: path or None, None
+        )
+
+    def get_event_log_path(self) -> str:
+        return self.get_typed(
+            "event_log", lambda path: path or "tree_of_tasks.events",
+            "tree_of_tasks.events"
+        )
+
+    def get_event_log_fsync_state(self) -> bool:
+        """
+        Returns:
+            whether the event log should be synced to the disk after every
+            command
+        """
+        return self.get_typed(
+            "event_log_fsync", type_converters.str_to_bool, False
+        )
+
+    def get_backup_directory(self) -> str:
+        return self.get_typed(
+            "backup_directory", lambda path: path or "backups", "backups"
+        )
+
+    def get_backup_interval(self) -> Optional[float]:
+        """
+        Returns:
+            time between the scheduled backups of the SQLite database in
+            minutes, or None if backups are made only by the command
+        """
+        return self.get_typed(
+            "backup_interval", lambda value: float(value) if value else None,
+            None
+        )
+
+    def get_backup_retention(self) -> Optional[int]:
+        """
+        Returns:
+            amount of the newest backups, which are kept, or None if all
+            backups are kept
+
+        Raises:
+            ValueError: if the amount is negative or isn't a number
+        """
+        return self.get_typed(
+            "backup_retention",
+            lambda value: (
+                type_converters.str_to_non_negative_int(value) or None
+            ) if value else None,
+            None
+        )
+
+    def get_undo_journal_path(self) -> Optional[str]:
+        """
+        Returns:
+            path to the file, from which the undo journal is loaded on start
+            and to which it is saved on exit, or None if the journal should be
+            lost on exit
+        """
+        return self.get_typed("undo_journal", lambda path: path or None, None)
+
+    def get_workspaces(self) -> Dict[str, str]:
+        """
+        Returns:
+            paths to the SQLite databases of the workspaces from the
+            "workspaces" section by their names (in lower case)
+        """
+        workspaces = {DEFAULT_WORKSPACE: "tree_of_tasks.db"}
+        section = self.get_section("workspaces", none_on_error=True)
+        if section is not None:
+            defaults = self.config_parser.defaults()
+            # Keys of the DEFAULT section are seen in every section
+            workspaces.update(
+                (name, path) for name, path in section.items()
+                if name not in defaults
+            )
+        return workspaces
+
+    def get_workspace(self) -> str:
+        """
+        Returns:
+            name of the current workspace
+        """
+        return self.get_typed(
+            "workspace", lambda name: name.lower() or DEFAULT_WORKSPACE,
+            DEFAULT_WORKSPACE
+        )
+
+    def set_workspace(self, name: str) -> None:
+        self["workspace"] = name
+
+    def get_workspace_pool_size(self) -> int:
+        """
+        Returns:
+            amount of the workspaces, which are kept opened after they are
+            used
+        """
+        return self.get_typed("workspace_pool_size", int, 4)
+
+    def get_worker_processes_amount(self) -> int:
+        """
+        Returns:
+            amount of the worker processes of the jobs over big trees (export,
+            recount), all cores are used by default
+        """
+        return self.get_typed(
+            "worker_processes",
+            lambda value: int(value) if value else os.cpu_count() or 1,
+            os.cpu_count() or 1
+        )
+
+    def get_write_behind_window(self) -> Optional[float]:
+        """
+        Returns:
+            durability window of the SQLite storage in seconds (committed
+            changes are written to the database in the background, not later
+            than that), or None if changes are written on commit
+        """
+        return self.get_typed(
+            "write_behind_window",
+            lambda value: float(value) if value else None, None
+        )
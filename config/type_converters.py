@@ -3,3 +3,13 @@ def str_to_bool(string: str) -> bool:
     Converts empty string or "False" to False, any other string to True
     """
     return False if string in ("False", "") else True
+
+
+def str_to_non_negative_int(string: str) -> int:
+    """
+    Converts the string to int, raises ValueError if it's negative
+    """
+    value = int(string)
+    if value < 0:
+        raise ValueError(f"Negative value: {string}")
+    return value
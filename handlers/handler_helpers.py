@@ -1,22 +1,24 @@
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import List, Optional
+from typing import Any, List, Optional, TYPE_CHECKING
 
-from orm import models
+from orm import tree_formats
+
+if TYPE_CHECKING:
+    from instrumentation.metrics import Histogram
+    from orm import models
 
 
 def get_tasks_as_strings(
-        root_tasks: List[models.Task], indentation_level: int = 0,
+        root_tasks: List["models.Task"], indentation_level: int = 0,
         indent_size: int = 4, indentation_symbol: str = " ") -> List[str]:
     tasks_as_strings = []
     for task in root_tasks:
-        tasks_as_strings.append(
-            f"{indentation_symbol * (indentation_level * indent_size)}"
-            f"[{'+' if task.is_collapsed else '-'}]"
-            f"[{'X' if task.is_checked else ' '}]"
-            f"[ID: {task.id}]"
-            f" {task.text}"
-        )
+        tasks_as_strings.append(tree_formats.format_task_line(
+            task.id, task.text, task.is_checked, task.is_collapsed,
+            task.descendant_count, task.checked_descendant_count,
+            indentation_level, indent_size, indentation_symbol
+        ))
         if not task.is_collapsed and task.nested_tasks:
             tasks_as_strings.extend(get_tasks_as_strings(
                 task.nested_tasks,
@@ -27,6 +29,15 @@ def get_tasks_as_strings(
     return tasks_as_strings
 
 
+def format_found_task(task: Any, ancestors: List[Any]) -> str:
+    return f"[ID: {task.id}] {task.text}" + (
+        " (путь: " + " / ".join(
+            ancestor.text for ancestor in ancestors
+        ) + ")"
+        if ancestors else ""
+    )
+
+
 def get_strings_enumeration(strings: List[str]) -> str:
     return " и ".join([i for i in (", ".join(strings[:-1]), strings[-1]) if i])
 
@@ -48,6 +59,23 @@ def make_optional_string_from_optional_strings(
     return separator.join(errors) if errors else None
 
 
+def format_histogram(histogram: "Histogram", multiplier: float = 1) -> str:
+    """
+    Formats main statistics of the histogram, every value is multiplied by the
+    multiplier (to convert seconds to milliseconds, for example).
+    """
+    return ", ".join(
+        f"{name} {value * multiplier:.3g}"
+        for name, value in (
+            ("ср.", histogram.mean),
+            ("p50", histogram.get_quantile(0.5)),
+            ("p90", histogram.get_quantile(0.9)),
+            ("p99", histogram.get_quantile(0.99)),
+            ("макс.", histogram.max),
+        )
+    )
+
+
 class BooleanTaskFields(Enum):
     IS_CHECKED = auto()
     IS_COLLAPSED = auto()
@@ -57,3 +85,5 @@ class BooleanTaskFields(Enum):
 class HandlingResult:
     message: str
     whether_to_print_a_tree: bool
+    # False if the command failed (entirely or for some of the tasks)
+    is_successful: bool = True
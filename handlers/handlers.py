@@ -1,26 +1,336 @@
-from typing import Tuple, Dict, List, Callable
+import atexit
+import functools
+import os
+from datetime import datetime
+from typing import (
+    Tuple, Dict, List, Callable, Optional, TypeVar, TYPE_CHECKING
+)
 
-from sqlalchemy.orm.exc import NoResultFound
-
-from config.ini_worker import MyINIWorker
+from config.ini_worker import MyINIWorker, DEFAULT_WORKSPACE
 from handlers import handler_helpers
 from handlers.handler_helpers import HandlingResult
+from instrumentation import metrics, profiling
 from lexer import lexer_classes
-from orm import models
-from orm.db_apis import TasksManager
+from orm import tree_formats, undo_journal
+from orm.exceptions import TaskNotFoundError, JournalMismatchError
+
+if TYPE_CHECKING:
+    from orm import workspaces
+    from orm.base_tasks_manager import BaseTasksManager
+
+# Workspaces, which are handled at the same time by the commands for all
+# workspaces (SQLite releases the GIL while it executes a query)
+MAX_FAN_OUT_THREADS = 8
+
+T = TypeVar("T")
+
+# Amount of the depths and of the biggest root tasks, which are shown by the
+# report (deeper levels are shown together)
+REPORT_DEPTHS_AMOUNT = 10
+REPORT_ROOT_TASKS_AMOUNT = 10
+DAY_SECONDS = 24 * 60 * 60
+# Groups of the tasks by the age in the report
+REPORT_AGE_GROUPS = (
+    ("за сутки", DAY_SECONDS),
+    ("за неделю", 7 * DAY_SECONDS),
+    ("за месяц", 30 * DAY_SECONDS),
+    ("за год", 365 * DAY_SECONDS),
+)
 
 
 class Handlers:
 
-    def __init__(self, ini_worker: MyINIWorker, tasks_manager: TasksManager):
+    def __init__(
+            self, ini_worker: MyINIWorker,
+            open_storage: Callable[[str], "BaseTasksManager"]):
+        """
+        Args:
+            ini_worker: config of the program
+            open_storage:
+                function, which opens the storage of the SQLite database
+                with the specified path; it is called only when some handler
+                needs the tasks of the workspace for the first time, so the
+                commands, which don't need the database, don't wait for it
+        """
         self.ini_worker = ini_worker
-        self.tasks_manager = tasks_manager
+        self._open_storage = open_storage
+        # While a transaction is open, changes are saved only by the commit
+        # command
+        self.is_in_transaction = False
+        # Journals of the workspaces, which were opened, by their names
+        self._undo_journals: Dict[str, undo_journal.UndoJournal] = {}
+
+    @functools.cached_property
+    def workspace_pool(self) -> "workspaces.WorkspacePool":
+        from orm import workspaces
+        return workspaces.WorkspacePool(
+            self._open_storage, self.ini_worker.get_workspace_pool_size()
+        )
+
+    @functools.cached_property
+    def workspace_name(self) -> str:
+        name = self.ini_worker.get_workspace()
+        if name not in self.ini_worker.get_workspaces():
+            return DEFAULT_WORKSPACE
+        return name
+
+    @functools.cached_property
+    def workspace_path(self) -> str:
+        """
+        Path to the SQLite database of the current workspace.
+        """
+        return self.ini_worker.get_workspaces()[self.workspace_name]
+
+    @functools.cached_property
+    def tasks_manager(self) -> "BaseTasksManager":
+        return self.workspace_pool.acquire(self.workspace_path)
+
+    @functools.cached_property
+    def undo_journal(self) -> undo_journal.UndoJournal:
+        try:
+            return self._undo_journals[self.workspace_name]
+        except KeyError:
+            pass
+        journal_path = self.ini_worker.get_undo_journal_path()
+        if journal_path is None:
+            journal = undo_journal.UndoJournal()
+        else:
+            if self.workspace_name != DEFAULT_WORKSPACE:
+                journal_path = f"{journal_path}.{self.workspace_name}"
+            journal = undo_journal.UndoJournal.from_file(journal_path)
+            atexit.register(journal.save, journal_path)
+        self._undo_journals[self.workspace_name] = journal
+        return journal
+
+    def _close_workspace(self) -> None:
+        """
+        Returns the storage of the current workspace to the pool, so the
+        workspace can be changed.
+        """
+        if "tasks_manager" in self.__dict__:
+            del self.tasks_manager
+            self.workspace_pool.release(self.workspace_path)
+        for name in ("workspace_name", "workspace_path", "undo_journal"):
+            self.__dict__.pop(name, None)
+
+    def _get_all_workspaces(self) -> Dict[str, str]:
+        """
+        Returns:
+            paths to the databases of all workspaces by their names, other
+            storages have only the current workspace
+        """
+        if self.ini_worker.get_storage() != "sqlite":
+            return {self.workspace_name: self.workspace_path}
+        return self.ini_worker.get_workspaces()
+
+    def _get_worker_processes_amount(self) -> int:
+        """
+        Returns:
+            amount of the worker processes for a job over the whole tree, 1
+            means that the job should be done by the storage itself (workers
+            can read only the committed tasks of an SQLite database, and
+            starting them costs more, than a small tree takes)
+        """
+        # Multiprocessing is imported only when it's needed
+        from orm import parallel_jobs
+        if (
+            self.is_in_transaction
+            or self.tasks_manager.get_database_path() is None
+            or self.tasks_manager.get_stats()[1]
+            < parallel_jobs.MIN_PARALLEL_TASKS
+        ):
+            return 1
+        return self.ini_worker.get_worker_processes_amount()
+
+    def _call_in_workspace(
+            self, function: Callable[[str, "BaseTasksManager"], T],
+            name: str, database_path: str) -> T:
+        with self.workspace_pool.using(database_path) as tasks_manager:
+            # The storage could stay in the pool, while other programs
+            # changed the database
+            tasks_manager.refresh()
+            return function(name, tasks_manager)
+
+    def _fan_out(
+            self, function: Callable[[str, "BaseTasksManager"], T]
+    ) -> Dict[str, T]:
+        """
+        Calls the function with the name and the storage of every workspace
+        (once for every database). Other workspaces are handled in parallel
+        threads, the current one is handled in this thread, because its
+        session can be in the middle of a transaction.
+
+        Returns:
+            results of the function by the names of the workspaces
+        """
+        names_by_path: Dict[str, str] = {}
+        for name, database_path in self._get_all_workspaces().items():
+            names_by_path.setdefault(database_path, name)
+        names_by_path[self.workspace_path] = self.workspace_name
+        other_workspaces = [
+            (name, database_path)
+            for database_path, name in names_by_path.items()
+            if database_path != self.workspace_path
+        ]
+        if not other_workspaces:
+            return {
+                self.workspace_name: function(
+                    self.workspace_name, self.tasks_manager
+                )
+            }
+        # Threads are imported only when there are other workspaces
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(
+            max_workers=min(len(other_workspaces), MAX_FAN_OUT_THREADS),
+            thread_name_prefix="fan-out"
+        ) as executor:
+            futures = {
+                name: executor.submit(
+                    self._call_in_workspace, function, name, database_path
+                )
+                for name, database_path in other_workspaces
+            }
+            results = {
+                self.workspace_name: function(
+                    self.workspace_name, self.tasks_manager
+                )
+            }
+            for name, future in futures.items():
+                results[name] = future.result()
+        return {name: results[name] for name in names_by_path.values()}
+
+    def refresh_tasks(self) -> bool:
+        """
+        Picks up the changes, which other processes made in the storage, if
+        the storage is already opened (it isn't opened just for that).
+
+        Returns:
+            True if something was changed since the last refresh, else False
+        """
+        if "tasks_manager" in self.__dict__:
+            return self.tasks_manager.refresh()
+        return False
+
+    def commit_changes(self) -> None:
+        """
+        Saves the changes of the command, unless a transaction is open.
+        """
+        if not self.is_in_transaction:
+            self.tasks_manager.commit()
+            self.undo_journal.commit()
+
+    def discard_changes(self) -> str:
+        """
+        Discards the changes of the command. The storages can't discard only
+        a part of a transaction, so an open transaction is discarded entirely.
+
+        Returns:
+            note about the discarded transaction for the message of the
+            command, or an empty string
+        """
+        self.tasks_manager.rollback()
+        self.undo_journal.discard()
+        if self.is_in_transaction:
+            self.is_in_transaction = False
+            return " Изменения открытой транзакции тоже отменены!"
+        return ""
+
+    def _discard_transaction_on_exit(self) -> None:
+        if self.is_in_transaction:
+            self.discard_changes()
+
+    def begin_transaction(self) -> HandlingResult:
+        if self.is_in_transaction:
+            return HandlingResult(
+                "Транзакция уже открыта!", whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        self.is_in_transaction = True
+        # atexit calls the functions in the reverse order, and the storage
+        # registers its saving, when it's opened, so the hook is registered
+        # (again) after the storage is opened, and a transaction, which
+        # wasn't committed, is discarded before the storage saves itself
+        self.tasks_manager
+        atexit.unregister(self._discard_transaction_on_exit)
+        atexit.register(self._discard_transaction_on_exit)
+        return HandlingResult(
+            (
+                "Транзакция открыта, изменения будут сохранены только "
+                "командой \"зафиксировать\""
+            ), whether_to_print_a_tree=False
+        )
+
+    def commit_transaction(self) -> HandlingResult:
+        if not self.is_in_transaction:
+            return HandlingResult(
+                "Транзакция не открыта!", whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        self.is_in_transaction = False
+        self.tasks_manager.commit()
+        self.undo_journal.commit()
+        return HandlingResult(
+            "Изменения транзакции сохранены", whether_to_print_a_tree=True
+        )
+
+    def rollback_transaction(self) -> HandlingResult:
+        if not self.is_in_transaction:
+            return HandlingResult(
+                "Транзакция не открыта!", whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        self.is_in_transaction = False
+        self.tasks_manager.rollback()
+        self.undo_journal.discard()
+        return HandlingResult(
+            "Изменения транзакции отменены", whether_to_print_a_tree=True
+        )
+
+    def _apply_journal_entry(
+            self, apply: Callable[["BaseTasksManager"], bool],
+            success_message: str, nothing_message: str) -> HandlingResult:
+        if self.is_in_transaction:
+            return HandlingResult(
+                (
+                    "Отмена и возврат изменений недоступны, пока открыта "
+                    "транзакция!"
+                ), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        try:
+            something_is_applied = apply(self.tasks_manager)
+        except JournalMismatchError:
+            self.discard_changes()
+            self.undo_journal.clear()
+            return HandlingResult(
+                (
+                    "Задачи были изменены в обход журнала отмены (например, "
+                    "другой копией программы), поэтому изменение нельзя "
+                    "применить! Журнал отмены очищен"
+                ), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        if not something_is_applied:
+            return HandlingResult(
+                nothing_message, whether_to_print_a_tree=False
+            )
+        self.commit_changes()
+        return HandlingResult(success_message, whether_to_print_a_tree=True)
+
+    def undo_change(self) -> HandlingResult:
+        return self._apply_journal_entry(
+            self.undo_journal.undo, "Изменение отменено!", "Нечего отменять"
+        )
+
+    def redo_change(self) -> HandlingResult:
+        return self._apply_journal_entry(
+            self.undo_journal.redo, "Изменение возвращено!", "Нечего возвращать"
+        )
 
     def change_auto_showing(self, new_state: bool) -> HandlingResult:
-        new_state_str = str(new_state)
-        if self.ini_worker["auto_showing"] != new_state_str:
-            self.ini_worker["auto_showing"] = new_state_str
-            self.ini_worker.save()
+        if self.ini_worker.get_auto_showing_state() != new_state:
+            self.ini_worker.set_auto_showing_state(new_state)
+            self.ini_worker.schedule_save()
             return HandlingResult(
                 (
                     "Автопоказ дерева задач после каждой команды теперь "
@@ -80,11 +390,11 @@ class Handlers:
     def add_task(self, parent_id: int, text: str) -> HandlingResult:
         if (
             parent_id is None
-            or self.tasks_manager.check_existence(models.Task.id == parent_id)
+            or self.tasks_manager.task_exists(parent_id)
         ):
-            task = models.Task(text=text, parent_id=parent_id)
-            self.tasks_manager.add(task)
-            self.tasks_manager.commit()
+            task = self.tasks_manager.add_task(text, parent_id)
+            self.undo_journal.record(undo_journal.make_deletion(task.id))
+            self.commit_changes()
             return HandlingResult(
                 "Задача создана!", whether_to_print_a_tree=True
             )
@@ -93,7 +403,8 @@ class Handlers:
                 (
                     f"Задачи с ID {parent_id} нет, поэтому новая задача не "
                     f"может быть создана"
-                ), whether_to_print_a_tree=False
+                ), whether_to_print_a_tree=False,
+                is_successful=False
             )
 
     def get_tasks_as_string(
@@ -117,15 +428,19 @@ class Handlers:
         ids_of_non_existing_tasks = []
         ids_of_successful_tasks = []
         for task_id in task_ids:
-            try:
-                self.tasks_manager.delete(
-                    self.tasks_manager.get_task_by_id(task_id)
-                )
-            except NoResultFound:
+            # Tasks, which are in the subtree of an already deleted task,
+            # don't exist too
+            if not self.tasks_manager.task_exists(task_id):
                 ids_of_non_existing_tasks.append(task_id)
-            else:
-                self.tasks_manager.commit()
-                ids_of_successful_tasks.append(task_id)
+                continue
+            task = self.tasks_manager.get_task_by_id(task_id)
+            self.undo_journal.record(
+                undo_journal.make_restoration(self.tasks_manager, task)
+            )
+            self.tasks_manager.delete(task)
+            ids_of_successful_tasks.append(task_id)
+        if ids_of_successful_tasks:
+            self.commit_changes()
         return HandlingResult(
             handler_helpers.make_optional_string_from_optional_strings(
                 [
@@ -142,7 +457,8 @@ class Handlers:
                         "Задачи с ID {} успешно удалены!"
                     )
                 ]
-            ), whether_to_print_a_tree=bool(ids_of_successful_tasks)
+            ), whether_to_print_a_tree=bool(ids_of_successful_tasks),
+            is_successful=not ids_of_non_existing_tasks
         )
 
     def change_bool_field_state(
@@ -156,19 +472,27 @@ class Handlers:
                 task = self.tasks_manager.get_task_by_id(
                     task_id
                 )
-            except NoResultFound:
+            except TaskNotFoundError:
                 ids_of_non_existing_tasks.append(task_id)
             else:
                 if field is handler_helpers.BooleanTaskFields.IS_CHECKED:
-                    something_changed = task.change_state_recursively(
-                        is_checked=state
+                    reverting_operation = undo_journal.make_check(
+                        self.tasks_manager, task, [[task.id, state]]
+                    )
+                    something_changed = self.tasks_manager.set_checked(
+                        task, is_checked=state
                     )
+                    if something_changed:
+                        self.undo_journal.record(reverting_operation)
                 elif field is handler_helpers.BooleanTaskFields.IS_COLLAPSED:
                     if task.is_collapsed == state:
                         something_changed = False
                     else:
                         something_changed = True
-                        task.is_collapsed = state
+                        self.undo_journal.record(
+                            undo_journal.make_collapse(task)
+                        )
+                        self.tasks_manager.set_collapsed(task, state)
                 else:
                     raise NotImplementedError(f"Unknown field \"{field}\"!")
                 if something_changed:
@@ -176,7 +500,7 @@ class Handlers:
                 else:
                     ids_of_tasks_where_nothing_changed.append(task_id)
         if ids_of_successful_tasks:
-            self.tasks_manager.commit()
+            self.commit_changes()
         return HandlingResult(
             handler_helpers.make_optional_string_from_optional_strings(
                 [
@@ -200,22 +524,25 @@ class Handlers:
                         "Состояние задач с ID {} успешно изменено!"
                     )
                 ]
-            ), whether_to_print_a_tree=bool(ids_of_successful_tasks)
+            ), whether_to_print_a_tree=bool(ids_of_successful_tasks),
+            is_successful=not ids_of_non_existing_tasks
         )
 
     def edit_task(self, task_id: int, text: str) -> HandlingResult:
         try:
             task = self.tasks_manager.get_task_by_id(task_id)
-        except NoResultFound:
+        except TaskNotFoundError:
             return HandlingResult(
                 (
                     f"Задачи с ID {task_id} нет, поэтому она не может быть "
                     f"изменена!"
-                ), whether_to_print_a_tree=False
+                ), whether_to_print_a_tree=False,
+                is_successful=False
             )
         else:
-            task.text = text
-            self.tasks_manager.commit()
+            self.undo_journal.record(undo_journal.make_edit(task, text))
+            self.tasks_manager.edit(task, text)
+            self.commit_changes()
             return HandlingResult(
                 "Задача изменена!", whether_to_print_a_tree=True
             )
@@ -231,7 +558,7 @@ class Handlers:
         for task_id in task_ids:
             try:
                 task = self.tasks_manager.get_task_by_id(task_id)
-            except NoResultFound:
+            except TaskNotFoundError:
                 ids_of_tasks_with_first_error.append(task_id)
             else:
                 if task_id == parent_id:
@@ -240,15 +567,18 @@ class Handlers:
                     ids_of_tasks_with_third_error.append(task_id)
                 elif (
                     parent_id is not None
-                    and self.tasks_manager.check_existence(task.id == parent_id)
+                    and not self.tasks_manager.task_exists(parent_id)
                 ):
                     ids_of_tasks_with_fourth_error.append(task_id)
                 elif parent_id and task.check_for_subtask(parent_id):
                     ids_of_tasks_with_fifth_error.append(task_id)
                 else:
                     ids_of_successful_tasks.append(task_id)
-                    task.parent_id = parent_id
-        self.tasks_manager.commit()
+                    self.undo_journal.record(undo_journal.make_relocation(
+                        self.tasks_manager, task, {"parent_id": parent_id}
+                    ))
+                    self.tasks_manager.move(task, parent_id)
+        self.commit_changes()
         return HandlingResult(
             handler_helpers.make_optional_string_from_optional_strings(
                 [
@@ -305,21 +635,541 @@ class Handlers:
                         "У задач с ID {} была изменена родительская задача!"
                     )
                 ]
-            ), whether_to_print_a_tree=bool(ids_of_successful_tasks)
+            ), whether_to_print_a_tree=bool(ids_of_successful_tasks),
+            # The tasks, which already have the parent, aren't errors
+            is_successful=not (
+                ids_of_tasks_with_first_error
+                or ids_of_tasks_with_second_error
+                or ids_of_tasks_with_fourth_error
+                or ids_of_tasks_with_fifth_error
+            )
         )
 
     def show_date(self, task_id: int) -> HandlingResult:
         try:
             task = self.tasks_manager.get_task_by_id(task_id)
-        except NoResultFound:
+        except TaskNotFoundError:
             return HandlingResult(
                 (
                     f"Задачи с ID {task_id} нет, поэтому невозможно узнать "
                     f"дату ее создания!"
-                ), whether_to_print_a_tree=False
+                ), whether_to_print_a_tree=False,
+                is_successful=False
             )
         else:
             return HandlingResult(
                 f"Дата создания задачи с ID {task_id}: {task.creation_date}",
                 whether_to_print_a_tree=False
             )
+
+    def search_tasks(self, text: str) -> HandlingResult:
+        found_tasks = self.tasks_manager.search(text)
+        if not found_tasks:
+            return HandlingResult(
+                "Ничего не найдено", whether_to_print_a_tree=False
+            )
+        return HandlingResult(
+            "\n".join(
+                handler_helpers.format_found_task(task, ancestors)
+                for task, ancestors in found_tasks
+            ), whether_to_print_a_tree=False
+        )
+
+    def search_all_workspaces(self, text: str) -> HandlingResult:
+        def search(_name: str, tasks_manager: "BaseTasksManager") -> List[str]:
+            # Tasks are formatted in the thread of the workspace, which owns
+            # them
+            return [
+                handler_helpers.format_found_task(task, ancestors)
+                for task, ancestors in tasks_manager.search(text)
+            ]
+        lines = [
+            f"{name}: {line}"
+            for name, found_lines in self._fan_out(search).items()
+            for line in found_lines
+        ]
+        if not lines:
+            return HandlingResult(
+                "Ничего не найдено", whether_to_print_a_tree=False
+            )
+        return HandlingResult("\n".join(lines), whether_to_print_a_tree=False)
+
+    def show_stats(self) -> HandlingResult:
+        root_tasks_amount, tasks_amount, checked_tasks_amount = (
+            self.tasks_manager.get_stats()
+        )
+        return HandlingResult(
+            (
+                f"Всего задач: {tasks_amount} (корневых: {root_tasks_amount})"
+                f"\nВыполнено: {checked_tasks_amount}" + (
+                    f" ({checked_tasks_amount * 100 // tasks_amount}%)"
+                    if tasks_amount else ""
+                )
+            ), whether_to_print_a_tree=False
+        )
+
+    def show_report(self) -> HandlingResult:
+        from orm import tree_arrays
+        tree = self.tasks_manager.get_tree_arrays()
+        if not len(tree):
+            return HandlingResult("Задач нет", whether_to_print_a_tree=False)
+        subtree_sizes, checked_subtree_sizes = tree_arrays.get_subtree_sizes(
+            tree
+        )
+        checked_tasks_amount = sum(
+            checked_subtree_sizes[:tree.level_starts[1]]
+        )
+        lines = [
+            f"Всего задач: {len(tree)}, выполнено: {checked_tasks_amount} "
+            f"({checked_tasks_amount * 100 // len(tree)}%)",
+            "Задач на уровнях вложенности:"
+        ]
+        depth_histogram = tree_arrays.get_depth_histogram(tree)
+        lines.extend(
+            f"    {depth}: {tasks_amount}"
+            for depth, tasks_amount in enumerate(
+                depth_histogram[:REPORT_DEPTHS_AMOUNT]
+            )
+        )
+        if len(depth_histogram) > REPORT_DEPTHS_AMOUNT:
+            lines.append(
+                f"    {REPORT_DEPTHS_AMOUNT}-{len(depth_histogram) - 1}: "
+                f"{sum(depth_histogram[REPORT_DEPTHS_AMOUNT:])}"
+            )
+        average_children_amount, max_children_amount = (
+            tree_arrays.get_branching_factor(tree)
+        )
+        lines.append(
+            f"Подзадач у задачи с подзадачами: в среднем "
+            f"{average_children_amount:.1f}, максимум {max_children_amount}"
+        )
+        lines.append("Создано задач:")
+        age_histogram = tree_arrays.get_age_histogram(
+            tree, tree_arrays.get_timestamp(datetime.now()),
+            [age for _, age in REPORT_AGE_GROUPS]
+        )
+        lines.extend(
+            f"    {name}: {tasks_amount}"
+            for name, tasks_amount in zip(
+                [name for name, _ in REPORT_AGE_GROUPS] + ["раньше"],
+                age_histogram
+            )
+        )
+        lines.append("Выполнение самых больших корневых задач:")
+        root_indexes = sorted(
+            range(tree.level_starts[1]), key=subtree_sizes.__getitem__,
+            reverse=True
+        )[:REPORT_ROOT_TASKS_AMOUNT]
+        for index in root_indexes:
+            descendants_amount = subtree_sizes[index] - 1
+            checked_descendants_amount = checked_subtree_sizes[index] - (
+                tree.flags[index] & tree_arrays.IS_CHECKED_FLAG
+            )
+            percentage = (
+                f" ({checked_descendants_amount * 100 // descendants_amount}%)"
+                if descendants_amount else ""
+            )
+            lines.append(
+                "    " + handler_helpers.format_found_task(
+                    self.tasks_manager.get_task_by_id(tree.ids[index]), []
+                ) + f": {checked_descendants_amount} из "
+                f"{descendants_amount} подзадач{percentage}"
+            )
+        return HandlingResult("\n".join(lines), whether_to_print_a_tree=False)
+
+    def rebuild_subtree_counters(self) -> HandlingResult:
+        wrong_counters_amount = self.tasks_manager.rebuild_subtree_counters(
+            processes=self._get_worker_processes_amount()
+        )
+        self.commit_changes()
+        if wrong_counters_amount:
+            return HandlingResult(
+                (
+                    f"Счетчики подзадач были неправильными у "
+                    f"{wrong_counters_amount} задач, теперь они исправлены"
+                ), whether_to_print_a_tree=True
+            )
+        return HandlingResult(
+            "Все счетчики подзадач правильные", whether_to_print_a_tree=False
+        )
+
+    def sync(self) -> HandlingResult:
+        try:
+            self.tasks_manager.sync()
+        except OSError as error:
+            return HandlingResult(
+                f"Не удалось записать изменения на диск: {error}",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        return HandlingResult(
+            "Все изменения записаны на диск", whether_to_print_a_tree=False
+        )
+
+    def backup_database(self) -> HandlingResult:
+        # sqlite3 and the file utilities are imported only when they're needed
+        from orm import backups
+        database_path = self.tasks_manager.get_database_path()
+        if database_path is None:
+            return HandlingResult(
+                "Резервные копии доступны только для хранилища SQLite!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        try:
+            retention = self.ini_worker.get_backup_retention()
+        except ValueError:
+            return HandlingResult(
+                "Настройка backup_retention должна быть целым неотрицательным "
+                "числом!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        try:
+            # Changes, which are written in the background, must get into
+            # the backup too
+            self.tasks_manager.sync()
+            backup_path = backups.make_backup(
+                database_path, self.ini_worker.get_backup_directory(),
+                retention
+            )
+        except OSError as error:
+            return HandlingResult(
+                f"Не удалось сделать резервную копию: {error}",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        return HandlingResult(
+            f"Резервная копия сохранена в файл \"{backup_path}\"",
+            whether_to_print_a_tree=False
+        )
+
+    def restore_database(self, backup_path: str) -> HandlingResult:
+        from orm import backups
+        if self.is_in_transaction:
+            return HandlingResult(
+                "Восстановление недоступно, пока открыта транзакция!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        database_path = self.tasks_manager.get_database_path()
+        if database_path is None:
+            return HandlingResult(
+                "Резервные копии доступны только для хранилища SQLite!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        try:
+            self.tasks_manager.sync()
+        except OSError as error:
+            return HandlingResult(
+                f"Не удалось записать изменения на диск: {error}",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        # The storage is opened again by the next command, so it loads the
+        # restored tasks
+        del self.tasks_manager
+        self.workspace_pool.discard(self.workspace_path)
+        try:
+            backups.restore_backup(backup_path, database_path)
+        except backups.BackupIntegrityError as error:
+            return HandlingResult(
+                "Резервная копия повреждена, база данных не изменена:\n"
+                + "\n".join(error.problems), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        except FileNotFoundError:
+            return HandlingResult(
+                f"Файл \"{backup_path}\" не найден!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        except OSError as error:
+            return HandlingResult(
+                f"Не удалось восстановить базу данных: {error}",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        # The journal describes the changes of the replaced tasks
+        self.undo_journal.clear()
+        return HandlingResult(
+            f"База данных восстановлена из файла \"{backup_path}\"",
+            whether_to_print_a_tree=True
+        )
+
+    def export_tasks(self, file_path: str) -> HandlingResult:
+        file_format = tree_formats.TreeFileFormat.from_file_name(file_path)
+        processes = self._get_worker_processes_amount()
+        try:
+            with open(file_path, "w", encoding="utf-8") as f:
+                if processes == 1:
+                    tasks_amount = self.tasks_manager.export_tasks(
+                        f, file_format
+                    )
+                else:
+                    # Workers read the database, so the changes, which are
+                    # only in memory, must be written before
+                    self.tasks_manager.sync()
+                    from orm import parallel_jobs
+                    tasks_amount = parallel_jobs.export_tasks(
+                        self.tasks_manager.get_database_path(), f,
+                        file_format, processes
+                    )
+        except OSError:
+            return HandlingResult(
+                f"Не удалось записать файл \"{file_path}\"!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        return HandlingResult(
+            f"Задач экспортировано в файл \"{file_path}\": {tasks_amount}",
+            whether_to_print_a_tree=False
+        )
+
+    def export_all_workspaces(self, directory: str) -> HandlingResult:
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            return HandlingResult(
+                f"Не удалось создать папку \"{directory}\"!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+
+        def export(
+                name: str, tasks_manager: "BaseTasksManager") -> Optional[int]:
+            try:
+                with open(
+                    os.path.join(directory, f"{name}.jsonl"), "w",
+                    encoding="utf-8"
+                ) as f:
+                    return tasks_manager.export_tasks(
+                        f, tree_formats.TreeFileFormat.JSON_LINES
+                    )
+            except OSError:
+                return None
+        tasks_amounts = self._fan_out(export)
+        return HandlingResult(
+            f"Задач экспортировано в папку \"{directory}\":\n"
+            + "\n".join(
+                f"{name}: " + (
+                    str(tasks_amount) if tasks_amount is not None
+                    else "не удалось записать файл!"
+                )
+                for name, tasks_amount in tasks_amounts.items()
+            ), whether_to_print_a_tree=False,
+            is_successful=None not in tasks_amounts.values()
+        )
+
+    def switch_workspace(self, name: str) -> HandlingResult:
+        name = name.lower()
+        if self.is_in_transaction:
+            return HandlingResult(
+                "Рабочее пространство нельзя сменить, пока открыта транзакция!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        if self.ini_worker.get_storage() != "sqlite":
+            return HandlingResult(
+                "Рабочие пространства доступны только для хранилища SQLite!",
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        workspace_paths = self.ini_worker.get_workspaces()
+        if name not in workspace_paths:
+            return HandlingResult(
+                f"Рабочего пространства \"{name}\" нет в настройках! Есть: "
+                + ", ".join(workspace_paths), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        if name == self.workspace_name:
+            return HandlingResult(
+                "Это рабочее пространство уже открыто",
+                whether_to_print_a_tree=False
+            )
+        self._close_workspace()
+        self.ini_worker.set_workspace(name)
+        self.ini_worker.schedule_save()
+        # The storage could stay in the pool, while other programs changed
+        # the database
+        self.tasks_manager.refresh()
+        return HandlingResult(
+            f"Открыто рабочее пространство \"{name}\"",
+            whether_to_print_a_tree=True
+        )
+
+    def show_workspaces(self) -> HandlingResult:
+        return HandlingResult(
+            "\n".join(
+                ("* " if name == self.workspace_name else "  ")
+                + f"{name}: {database_path}" + (
+                    " (открыто)"
+                    if self.workspace_pool.is_opened(database_path) else ""
+                )
+                for name, database_path in (
+                    self.ini_worker.get_workspaces().items()
+                )
+            ), whether_to_print_a_tree=False
+        )
+
+    def import_tasks(
+            self, parent_id: Optional[int], file_path: str) -> HandlingResult:
+        if not (
+            parent_id is None
+            or self.tasks_manager.task_exists(parent_id)
+        ):
+            return HandlingResult(
+                (
+                    f"Задачи с ID {parent_id} нет, поэтому в нее нельзя "
+                    f"импортировать задачи!"
+                ), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                tasks_amount, root_ids = self.tasks_manager.import_tasks(
+                    f, tree_formats.TreeFileFormat.from_file_name(file_path),
+                    parent_id
+                )
+        except OSError:
+            return HandlingResult(
+                f"Не удалось прочитать файл \"{file_path}\"!"
+                + self.discard_changes(),
+                whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        except tree_formats.ImportFormatError as error:
+            return HandlingResult(
+                (
+                    f"Ошибка в строке {error.line_number} файла "
+                    f"\"{file_path}\", ничего не импортировано! (Строка "
+                    f"должна быть в формате экспорта, и родительская задача "
+                    f"должна идти перед дочерними)"
+                ) + self.discard_changes(), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        for root_id in root_ids:
+            self.undo_journal.record(undo_journal.make_deletion(root_id))
+        self.commit_changes()
+        return HandlingResult(
+            f"Задач импортировано: {tasks_amount}",
+            whether_to_print_a_tree=bool(tasks_amount)
+        )
+
+    def place_task_next_to_sibling(
+            self, after: bool, task_id: int,
+            sibling_id: int) -> HandlingResult:
+        try:
+            task = self.tasks_manager.get_task_by_id(task_id)
+        except TaskNotFoundError:
+            return HandlingResult(
+                (
+                    f"Задачи с ID {task_id} нет, поэтому ее нельзя "
+                    f"переставить!"
+                ), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        try:
+            sibling = self.tasks_manager.get_task_by_id(sibling_id)
+        except TaskNotFoundError:
+            return HandlingResult(
+                (
+                    f"Задачи с ID {sibling_id} нет, поэтому рядом с ней нельзя "
+                    f"поставить задачу!"
+                ), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        if task_id == sibling_id or task.check_for_subtask(sibling_id):
+            return HandlingResult(
+                (
+                    f"Задача с ID {sibling_id} находится внутри задачи с ID "
+                    f"{task_id} (или это одна и та же задача), поэтому их "
+                    f"нельзя поставить рядом!"
+                ), whether_to_print_a_tree=False,
+                is_successful=False
+            )
+        self.undo_journal.record(undo_journal.make_relocation(
+            self.tasks_manager, task, {
+                "parent_id": sibling.parent_id,
+                ("after_id" if after else "before_id"): sibling.id
+            }
+        ))
+        self.tasks_manager.place_next_to_sibling(task, sibling, after)
+        self.commit_changes()
+        return HandlingResult(
+            "Задача переставлена!", whether_to_print_a_tree=True
+        )
+
+    # noinspection PyMethodMayBeStatic
+    # Because maybe in the future I will use self
+    def show_metrics(self) -> HandlingResult:
+        lines = []
+        for command_name in metrics.registry.get_command_names():
+            handling_histogram = metrics.registry.get_histogram(
+                f"command.{command_name}.handling_seconds"
+            )
+            lines.append(
+                f"Команда '{command_name}' (выполнена "
+                f"{handling_histogram.count} раз):"
+            )
+            for kind, description in (
+                ("parsing_seconds", "разбор"),
+                ("handling_seconds", "обработка"),
+                ("rendering_seconds", "показ дерева"),
+            ):
+                histogram = metrics.registry.get_histogram(
+                    f"command.{command_name}.{kind}"
+                )
+                if histogram is not None:
+                    lines.append(
+                        f"    {description}: "
+                        + handler_helpers.format_histogram(histogram, 1000)
+                        + " (мс)"
+                    )
+            for kind, description in (
+                ("handling_sql_statements", "SQL-запросов при обработке"),
+                ("rendering_sql_statements", "SQL-запросов при показе"),
+            ):
+                histogram = metrics.registry.get_histogram(
+                    f"command.{command_name}.{kind}"
+                )
+                if histogram is not None and histogram.max:
+                    lines.append(
+                        f"    {description}: "
+                        + handler_helpers.format_histogram(histogram)
+                    )
+        statement_histogram = metrics.registry.get_histogram(
+            metrics.SQL_STATEMENT_SECONDS_HISTOGRAM
+        )
+        if statement_histogram is not None:
+            lines.append(
+                f"Всего SQL-запросов: {statement_histogram.count}, время "
+                f"одного запроса: "
+                + handler_helpers.format_histogram(statement_histogram, 1000)
+                + " (мс)"
+            )
+        return HandlingResult(
+            "\n".join(lines) if lines else "Пока нечего показывать",
+            whether_to_print_a_tree=False
+        )
+
+    # noinspection PyMethodMayBeStatic
+    # Because maybe in the future I will use self
+    def change_profiling_mode(
+            self, mode: profiling.ProfilingMode) -> HandlingResult:
+        trace_file_path = profiling.profiler.set_mode(mode)
+        if mode is profiling.ProfilingMode.OFF:
+            message = "Профилирование выключено"
+        elif mode is profiling.ProfilingMode.CPROFILE:
+            message = (
+                f"Теперь каждая команда выполняется под cProfile, профили "
+                f"сохраняются в папку \"{profiling.profiler.output_directory}\""
+            )
+        else:
+            message = (
+                f"Теперь разбор, обработка, SQL-запросы и показ дерева "
+                f"записываются в файл \"{trace_file_path}\" (формат Chrome "
+                f"trace)"
+            )
+        return HandlingResult(message, whether_to_print_a_tree=False)
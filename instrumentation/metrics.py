@@ -0,0 +1,135 @@
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Optional, List
+
+
+SQL_STATEMENTS_COUNTER = "sql.statements"
+SQL_STATEMENT_SECONDS_HISTOGRAM = "sql.statement_seconds"
+# Histograms of every command are named like "command.<name>.<kind>", where
+# kind is one of these
+COMMAND_HISTOGRAM_KINDS = (
+    "parsing_seconds", "handling_seconds", "rendering_seconds",
+    "handling_sql_statements", "rendering_sql_statements"
+)
+
+# Every bucket of a histogram is that many times wider than the previous one
+BUCKET_GROWTH = 2 ** 0.25
+
+
+@dataclass
+class Histogram:
+    """
+    Histogram with logarithmic buckets, so it takes the same small amount of
+    memory for any amount of observed values. Quantiles are approximate (with
+    the precision of the bucket width, which is about 19%).
+    """
+    count: int = 0
+    sum: float = 0
+    min: float = math.inf
+    max: float = -math.inf
+    # Bucket number -> amount of values in this bucket, bucket number N holds
+    # values up to BUCKET_GROWTH ** N
+    buckets: Dict[int, int] = field(default_factory=dict)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        bucket = (
+            math.ceil(math.log(value, BUCKET_GROWTH)) if value > 0 else
+            -10 ** 6  # All zeroes go to one bucket
+        )
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        Args:
+            quantile: from 0 to 1, for example 0.99
+
+        Returns:
+            upper bound of the bucket with the quantile (but never more than
+            the maximal value)
+        """
+        if not self.count:
+            return 0
+        rank = quantile * self.count
+        seen_values_amount = 0
+        for bucket in sorted(self.buckets):
+            seen_values_amount += self.buckets[bucket]
+            if seen_values_amount >= rank:
+                return min(BUCKET_GROWTH ** bucket, self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "mean": self.mean,
+            "p50": self.get_quantile(0.5),
+            "p90": self.get_quantile(0.9),
+            "p99": self.get_quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process storage of counters and histograms, names are arbitrary
+    strings.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def get_counter(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def observe(self, name: str, value: float) -> None:
+        try:
+            histogram = self.histograms[name]
+        except KeyError:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(value)
+
+    def get_histogram(self, name: str) -> Optional[Histogram]:
+        return self.histograms.get(name)
+
+    def get_command_names(self) -> List[str]:
+        """
+        Returns:
+            names of the commands, which have histograms, in the order of the
+            first use
+        """
+        return list(dict.fromkeys(
+            name.split(".")[1] for name in self.histograms
+            if name.startswith("command.")
+        ))
+
+    def as_dict(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "histograms": {
+                name: histogram.as_dict()
+                for name, histogram in self.histograms.items()
+            }
+        }
+
+    def dump(self, file_path: str) -> None:
+        with open(file_path, "w") as f:
+            json.dump(self.as_dict(), f, indent=4, ensure_ascii=False)
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,110 @@
+import cProfile
+import json
+import os
+from datetime import datetime
+from enum import Enum
+from typing import Optional, Callable, Any, TextIO, Dict
+
+
+class ProfilingMode(Enum):
+    OFF = "off"
+    # Every command is run under cProfile, stats of every command are saved to
+    # a separate .prof file
+    CPROFILE = "cprofile"
+    # Spans of parsing, handling, SQL statements and rendering are written to
+    # one file in the Chrome trace format (can be opened in chrome://tracing
+    # or Perfetto)
+    TRACE = "trace"
+
+
+# Names of the modes in the profiling command and in the config
+# (case-insensitive)
+MODE_NAMES: Dict[str, ProfilingMode] = {
+    "выкл": ProfilingMode.OFF,
+    "off": ProfilingMode.OFF,
+    "вкл": ProfilingMode.CPROFILE,
+    "on": ProfilingMode.CPROFILE,
+    "cprofile": ProfilingMode.CPROFILE,
+    "трассировка": ProfilingMode.TRACE,
+    "trace": ProfilingMode.TRACE,
+}
+
+
+class Profiler:
+
+    def __init__(self, output_directory: str = "profiles"):
+        self.output_directory = output_directory
+        self.mode = ProfilingMode.OFF
+        # Tracing is checked on every span, so it's a plain attribute
+        self.is_tracing = False
+        self._trace_file: Optional[TextIO] = None
+        self._profiled_commands_amount = 0
+
+    def set_mode(self, mode: ProfilingMode) -> Optional[str]:
+        """
+        Returns:
+            path to the trace file, if the tracing was turned on, else None
+        """
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+        self.mode = mode
+        self.is_tracing = mode is ProfilingMode.TRACE
+        if self.is_tracing:
+            os.makedirs(self.output_directory, exist_ok=True)
+            trace_file_path = self._get_output_file_path("trace", "json")
+            # Closing "]" is optional in the Chrome trace format, so the file
+            # is valid after every written event
+            self._trace_file = open(trace_file_path, "w")
+            self._trace_file.write("[\n")
+            return trace_file_path
+        return None
+
+    def _get_output_file_path(self, name: str, extension: str) -> str:
+        return os.path.join(
+            self.output_directory,
+            f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}.{extension}"
+        )
+
+    def run_profiled(self, function: Callable, *args: Any) -> Any:
+        """
+        Runs the function under cProfile and saves the stats to a new .prof
+        file in the output directory.
+        """
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            os.makedirs(self.output_directory, exist_ok=True)
+            self._profiled_commands_amount += 1
+            profile.dump_stats(self._get_output_file_path(
+                f"command-{self._profiled_commands_amount}", "prof"
+            ))
+
+    def record_span(
+            self, name: str, start: float, end: float, **args: Any) -> None:
+        """
+        Writes a span to the trace file, if tracing is on.
+
+        Args:
+            name: name of the span
+            start: time.perf_counter() at the start of the span
+            end: time.perf_counter() at the end of the span
+            **args: additional info, which is shown for the span
+        """
+        if not self.is_tracing:
+            return
+        self._trace_file.write(json.dumps({
+            "name": name,
+            "ph": "X",
+            "ts": start * 1_000_000,
+            "dur": (end - start) * 1_000_000,
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": args
+        }, ensure_ascii=False))
+        self._trace_file.write(",\n")
+        self._trace_file.flush()
+
+
+profiler = Profiler()
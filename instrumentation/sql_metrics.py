@@ -0,0 +1,43 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from instrumentation import profiling
+from instrumentation.metrics import (
+    MetricsRegistry, SQL_STATEMENTS_COUNTER, SQL_STATEMENT_SECONDS_HISTOGRAM
+)
+
+
+def track_sql_statements(sql_engine: Engine, registry: MetricsRegistry) -> None:
+    """
+    Counts SQL statements, which are executed by the engine, and measures
+    their durations (and writes them as spans, if tracing is on).
+    """
+
+    @event.listens_for(sql_engine, "before_cursor_execute")
+    def before_cursor_execute(
+            connection, _cursor, _statement, _parameters, _context,
+            _executemany):
+        connection.info.setdefault("statement_starts", []).append(
+            time.perf_counter()
+        )
+
+    @event.listens_for(sql_engine, "after_cursor_execute")
+    def after_cursor_execute(
+            connection, _cursor, statement, _parameters, _context,
+            _executemany):
+        end = time.perf_counter()
+        start = connection.info["statement_starts"].pop()
+        registry.increment(SQL_STATEMENTS_COUNTER)
+        registry.observe(SQL_STATEMENT_SECONDS_HISTOGRAM, end - start)
+        if profiling.profiler.is_tracing:
+            profiling.profiler.record_span(
+                "SQL", start, end, statement=statement
+            )
+
+    @event.listens_for(sql_engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("statement_starts"):
+            connection.info["statement_starts"].pop()
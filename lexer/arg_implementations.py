@@ -1,5 +1,5 @@
 import re
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Dict, Any
 
 from lexer.lexer_classes import BaseArgType
 
@@ -142,3 +142,34 @@ class BoolArgType(BaseArgType):
         if arg.lower() in self.true_values:
             return True
         return False
+
+
+class ChoiceArgType(BaseArgType):
+
+    def __init__(self, choices: Dict[str, Any]):
+        """
+        Args:
+            choices:
+                possible values of the argument (case-insensitive) and what
+                they are converted to
+        """
+        self.choices = {key.lower(): value for key, value in choices.items()}
+
+    @property
+    def name(self) -> str:
+        return "один из вариантов"
+
+    @property
+    def description(self) -> str:
+        return f"Варианты: {', '.join(self.choices)}"
+
+    @property
+    def regex(self) -> str:
+        # Longer variants go first, so they aren't cut by shorter ones
+        return "|".join([
+            re.escape(choice)
+            for choice in sorted(self.choices, key=len, reverse=True)
+        ])
+
+    def convert(self, arg: str) -> Any:
+        return self.choices[arg.lower()]
@@ -0,0 +1,293 @@
+"""
+Completion of the entered commands: names of the commands and IDs of the
+tasks (by the beginning of the ID or of the text of the task).
+
+Everything is looked up in memory: the names are in a prefix trie, the tasks
+are in sorted lists, which are searched by bisection. The index of the tasks
+is synchronized with the storage at most once after every command (when the
+completion is requested for the first time), never on every key press.
+"""
+import bisect
+import itertools
+import re
+from typing import (
+    Any, Callable, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple,
+    TYPE_CHECKING
+)
+
+from lexer import arg_implementations
+from lexer.lexer_classes import BaseArgType, Command
+
+if TYPE_CHECKING:
+    from orm.base_tasks_manager import BaseTasksManager
+
+MAX_COMPLETIONS = 50
+# If more tasks are changed, the sorted lists are built again instead of
+# changing them one by one
+MAX_INCREMENTAL_CHANGES = 1000
+
+
+class _TrieNode:
+
+    __slots__ = ("children", "words")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # All words, which start with the prefix of the node
+        self.words: List[str] = []
+
+
+class PrefixTrie:
+    """
+    Case-insensitive trie of words, every node keeps the words, which start
+    with its prefix, so a lookup costs only a walk by the prefix.
+    """
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._root = _TrieNode()
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        node = self._root
+        node.words.append(word)
+        for character in word.lower():
+            node = node.children.setdefault(character, _TrieNode())
+            node.words.append(word)
+
+    def find(self, prefix: str) -> List[str]:
+        """
+        Returns:
+            words, which start with the prefix, in the order of addition
+        """
+        node = self._root
+        for character in prefix.lower():
+            node = node.children.get(character)
+            if node is None:
+                return []
+        return node.words
+
+
+class TaskIndex:
+    """
+    IDs and texts of the tasks of a storage, which are sorted for the search
+    by prefixes.
+    """
+
+    def __init__(self):
+        self._texts: Dict[int, str] = {}
+        # IDs as strings, so the IDs with the same prefix go together
+        self._sorted_ids: List[str] = []
+        # Texts in lower case with IDs of their tasks
+        self._sorted_texts: List[Tuple[str, int]] = []
+        self._tasks_manager: Optional["BaseTasksManager"] = None
+        self._version: Any = None
+
+    def sync(self, tasks_manager: "BaseTasksManager") -> None:
+        """
+        Applies the changes of the storage since the previous synchronization
+        (all tasks are read, if the storage is another one).
+        """
+        if tasks_manager is not self._tasks_manager:
+            self._tasks_manager = tasks_manager
+            self._version = None
+        self._version, texts, is_complete = tasks_manager.get_text_changes(
+            self._version
+        )
+        if is_complete or len(texts) > MAX_INCREMENTAL_CHANGES:
+            if is_complete:
+                self._texts.clear()
+            for task_id, text in texts.items():
+                if text is None:
+                    self._texts.pop(task_id, None)
+                else:
+                    self._texts[task_id] = text
+            self._sorted_ids = sorted(map(str, self._texts))
+            self._sorted_texts = sorted(
+                zip(map(str.lower, self._texts.values()), self._texts)
+            )
+            return
+        for task_id, text in texts.items():
+            old_text = self._texts.pop(task_id, None)
+            if old_text is not None:
+                del self._sorted_ids[
+                    bisect.bisect_left(self._sorted_ids, str(task_id))
+                ]
+                del self._sorted_texts[bisect.bisect_left(
+                    self._sorted_texts, (old_text.lower(), task_id)
+                )]
+            if text is not None:
+                self._texts[task_id] = text
+                bisect.insort(self._sorted_ids, str(task_id))
+                bisect.insort(self._sorted_texts, (text.lower(), task_id))
+
+    def get_text(self, task_id: int) -> str:
+        return self._texts[task_id]
+
+    def find_by_id_prefix(self, prefix: str, limit: int) -> List[int]:
+        start = bisect.bisect_left(self._sorted_ids, prefix)
+        return [
+            int(task_id) for task_id in itertools.takewhile(
+                lambda task_id: task_id.startswith(prefix),
+                self._sorted_ids[start:start + limit]
+            )
+        ]
+
+    def find_by_text_prefix(self, prefix: str, limit: int) -> List[int]:
+        """
+        Returns:
+            IDs of the tasks, texts of which start with the prefix (case
+            doesn't matter), in the alphabetical order of the texts
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._sorted_texts, (prefix,))
+        return [
+            task_id for _, task_id in itertools.takewhile(
+                lambda text_and_id: text_and_id[0].startswith(prefix),
+                self._sorted_texts[start:start + limit]
+            )
+        ]
+
+
+def _is_task_argument(arg_type: BaseArgType) -> bool:
+    if isinstance(arg_type, arg_implementations.SequenceArgType):
+        arg_type = arg_type.element_type
+    return isinstance(arg_type, (
+        arg_implementations.IntArgType, arg_implementations.OptionalIntArgType
+    ))
+
+
+class Completer:
+    """
+    Completer for readline, which completes the whole line (the delimiters of
+    readline must be empty), so names of several words are completed too.
+    """
+
+    def __init__(
+            self, commands: Sequence[Command],
+            get_tasks_manager: Callable[[], "BaseTasksManager"]):
+        """
+        Args:
+            commands: commands of the program
+            get_tasks_manager:
+                function, which returns the storage of the current workspace
+        """
+        self._get_tasks_manager = get_tasks_manager
+        self._names = PrefixTrie(
+            name for command in commands for name in command.names
+        )
+        self._commands_by_name = {
+            name.lower(): command
+            for command in commands for name in command.names
+        }
+        # Longer names go first, so a name isn't cut by a shorter one
+        self._sorted_names = sorted(
+            self._commands_by_name, key=len, reverse=True
+        )
+        # Patterns of the arguments of the commands before the one, which is
+        # completed, for every argument, by the first names of the commands
+        self._argument_patterns: Dict[str, List[Pattern]] = {}
+        self.task_index = TaskIndex()
+        self._is_index_outdated = True
+        self._completions: List[str] = []
+        # Lines, which are shown instead of the current completions
+        self.descriptions: List[str] = []
+
+    def mark_tasks_as_changed(self) -> None:
+        """
+        Makes the index of the tasks be synchronized, when the completion of
+        a task is requested next time. It's called after every command.
+        """
+        self._is_index_outdated = True
+
+    def complete(self, line: str, state: int) -> Optional[str]:
+        """
+        The function for readline.set_completer.
+        """
+        if not state:
+            self._completions = self.get_completions(line)
+        if state < len(self._completions):
+            return self._completions[state]
+        return None
+
+    def get_completions(self, line: str) -> List[str]:
+        """
+        Returns:
+            lines, which can be the completed line
+        """
+        self.descriptions = []
+        lowered_line = line.lower()
+        for name in self._sorted_names:
+            if lowered_line.startswith(f"{name} "):
+                return self._complete_argument(
+                    self._commands_by_name[name], line, len(name) + 1
+                )
+        completions = self._names.find(line)[:MAX_COMPLETIONS]
+        self.descriptions = completions
+        return completions
+
+    def _get_argument_patterns(self, command: Command) -> List[Pattern]:
+        try:
+            return self._argument_patterns[command.names[0]]
+        except KeyError:
+            pass
+        patterns = []
+        for index, argument in enumerate(command.arguments):
+            previous_arguments = "".join(
+                f"(?:{previous_argument.type.regex}) "
+                for previous_argument in command.arguments[:index]
+            )
+            # Completed elements of the sequence go before the completed one
+            previous_elements = (
+                f"(?:(?:{argument.type.element_type.regex})"
+                f"{argument.type.separator})*"
+                if isinstance(
+                    argument.type, arg_implementations.SequenceArgType
+                ) else ""
+            )
+            patterns.append(re.compile(
+                f"{previous_arguments}{previous_elements}"
+                f"(?P<fragment>[^ ,]*)",
+                re.IGNORECASE
+            ))
+        self._argument_patterns[command.names[0]] = patterns
+        return patterns
+
+    def _complete_argument(
+            self, command: Command, line: str,
+            arguments_start: int) -> List[str]:
+        """
+        Completes the ID of a task by its beginning or by the beginning of
+        the text of the task.
+        """
+        for argument, pattern in zip(
+            command.arguments, self._get_argument_patterns(command)
+        ):
+            match = pattern.fullmatch(line, arguments_start)
+            if match is not None:
+                break
+        else:
+            return []
+        fragment = match.group("fragment")
+        if not fragment or not _is_task_argument(argument.type):
+            return []
+        if self._is_index_outdated:
+            self.task_index.sync(self._get_tasks_manager())
+            self._is_index_outdated = False
+        task_ids = (
+            self.task_index.find_by_id_prefix(fragment, MAX_COMPLETIONS)
+            if fragment.isdigit() else
+            self.task_index.find_by_text_prefix(fragment, MAX_COMPLETIONS)
+        )
+        self.descriptions = [
+            f"[ID: {task_id}] {self.task_index.get_text(task_id)}"
+            for task_id in task_ids
+        ]
+        if len(task_ids) > 1 and not fragment.isdigit():
+            # Readline replaces the line with the common beginning of the
+            # completions, and the IDs don't start with the typed text, so
+            # the line is kept (the completions differ only by the space at
+            # the end) and the found tasks are only shown
+            return [line, f"{line} "]
+        line_start = line[:match.start("fragment")]
+        return [f"{line_start}{task_id}" for task_id in task_ids]
@@ -1,7 +1,7 @@
 import re
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Tuple, Any, Callable, Optional, Type, Dict, List
+from dataclasses import dataclass, field
+from typing import Tuple, Any, Callable, Optional, Type, Dict, List, Pattern
 
 from lexer import exceptions
 
@@ -87,6 +87,32 @@ class Command:
     metadata: Tuple[Type[BaseMetadata], ...] = ()
     constant_metadata: Tuple[Type[BaseConstantMetadata], ...] = ()
     arguments: Tuple[Arg, ...] = ()
+    # Compiled patterns for every amount of arguments, keys are separators
+    _patterns: Dict[str, List[Pattern]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def _get_patterns(self, separator: str) -> List[Pattern]:
+        try:
+            return self._patterns[separator]
+        except KeyError:
+            pass
+        names = '|'.join(re.escape(name) for name in self.names)
+        patterns = [
+            re.compile(
+                separator.join(
+                    [
+                        f"(?i)({names})", *[
+                            f"({arg.type.regex})"
+                            for arg in self.arguments[:args_num]
+                        ]  # Something like (\d\d)
+                    ]  # Something like (?i)(command) (\d\d)
+                ) + ("$" if args_num == len(self.arguments) else "")
+            )
+            for args_num in range(len(self.arguments) + 1)
+        ]
+        self._patterns[separator] = patterns
+        return patterns
 
     def convert_command_to_args(
             self, command: str, separator: str = " ") -> ConvertedCommand:
@@ -102,22 +128,12 @@ class Command:
         Returns:
             tuple of some values, which are converted arguments from string
         """
-        for args_num in range(len(self.arguments) + 1):
-            names = '|'.join(re.escape(name) for name in self.names)
-            pattern = separator.join(
-                [
-                    f"(?i)({names})", *[
-                        f"({arg.type.regex})"
-                        for arg in self.arguments[:args_num]
-                    ]  # Something like (\d\d)
-                ]  # Something like (?i)(command) (\d\d)
-            ) + ("$" if args_num == len(self.arguments) else "")
-            rgx_result = re.match(pattern, command)
+        for args_num, pattern in enumerate(self._get_patterns(separator)):
+            rgx_result = pattern.match(command)
             if rgx_result is None:
                 raise exceptions.ParsingError(args_num)
         # noinspection PyUnboundLocalVariable
-        # because range(len(self.arguments) + 1) will be at least with length of
-        # 1
+        # because there are len(self.arguments) + 1 patterns, so at least one
         rgx_groups = rgx_result.groups()
         # noinspection PyArgumentList
         # because IDK why it thinks that `arg` argument is already filled
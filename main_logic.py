@@ -1,15 +1,92 @@
+import atexit
 import functools
+import sys
+import time
 from configparser import ConfigParser
-from typing import NoReturn, Dict, List, Callable
+from typing import NoReturn, Dict, List, Callable, Tuple, TYPE_CHECKING
 
 from config.ini_worker import MyINIWorker
 from handlers.handler_helpers import BooleanTaskFields, HandlingResult
 from handlers.handlers import Handlers
+from instrumentation import metrics, profiling
 from lexer import (
     arg_implementations, constant_metadata_implementations, lexer_classes,
-    exceptions
+    exceptions, completion
 )
-from orm import db_apis
+from orm.exceptions import ConcurrentModificationError
+
+if TYPE_CHECKING:
+    from orm.base_tasks_manager import BaseTasksManager
+
+# Binary snapshot of the tree for the first rendering of the REPL lies next
+# to the database of the workspace
+TREE_SNAPSHOT_SUFFIX = ".tree"
+CONFIG_FILE_PATH = "config/declarative_config_files/tree_of_tasks_config.ini"
+# Amount of the last entered commands, which are kept in the history file
+HISTORY_LENGTH = 1000
+
+
+def get_tasks_manager(
+        ini_worker: MyINIWorker, database_path: str) -> "BaseTasksManager":
+    """
+    Opens the storage, which is chosen in the config. SQLAlchemy is imported
+    here, so the launch doesn't wait for it until some command needs the
+    tasks (and the in-memory storage doesn't need it at all).
+
+    Args:
+        ini_worker: config of the program
+        database_path:
+            path to the SQLite database of the workspace (other storages
+            ignore it)
+    """
+    if ini_worker.get_storage() == "memory":
+        from orm import memory_storage
+        snapshot_path = ini_worker.get_memory_snapshot_path()
+        if snapshot_path is None:
+            return memory_storage.MemoryTasksManager()
+        tasks_manager = memory_storage.MemoryTasksManager.from_snapshot(
+            snapshot_path
+        )
+        atexit.register(tasks_manager.save_snapshot, snapshot_path)
+        return tasks_manager
+    if ini_worker.get_storage() == "event_log":
+        from orm import event_log_storage
+        tasks_manager = event_log_storage.EventLogTasksManager(
+            ini_worker.get_event_log_path(),
+            fsync=ini_worker.get_event_log_fsync_state()
+        )
+        atexit.register(tasks_manager.close)
+        return tasks_manager
+    from instrumentation import sql_metrics
+    from orm import db_apis
+    db_session = db_apis.get_sqlalchemy_db_session(
+        f"sqlite:///{database_path}"
+    )
+    write_behind_window = ini_worker.get_write_behind_window()
+    if write_behind_window is not None:
+        from orm import write_behind_storage
+        # The session was only needed to create or migrate the database
+        db_session.close()
+        db_session.get_bind().dispose()
+        tasks_manager = write_behind_storage.WriteBehindTasksManager(
+            database_path, write_behind_window
+        )
+        atexit.register(tasks_manager.close)
+        return tasks_manager
+    sql_metrics.track_sql_statements(db_session.get_bind(), metrics.registry)
+    return db_apis.TasksManager(db_session)
+
+
+def save_history(file_path: str) -> None:
+    # Is called only if readline is available
+    import readline
+    try:
+        readline.write_history_file(file_path)
+    except OSError as error:
+        print(
+            f"Не удалось сохранить историю команд в файл \"{file_path}\": "
+            f"{error}", file=sys.stderr
+        )
 
 
 class MainLogic:
@@ -19,13 +96,53 @@ class MainLogic:
     def __init__(self, ini_worker: MyINIWorker, handlers: Handlers):
         ini_worker.load(default_contents=(
             "[DEFAULT]\n"
-            "auto_showing = True"
+            "auto_showing = True\n"
+            "backup_directory = backups\n"
+            "backup_interval = \n"
+            "backup_retention = \n"
+            "event_log = tree_of_tasks.events\n"
+            "event_log_fsync = False\n"
+            "history_file = tree_of_tasks.history\n"
+            "memory_snapshot = \n"
+            "metrics_file = \n"
+            "profiling = off\n"
+            "session_log = \n"
+            "storage = sqlite\n"
+            "undo_journal = \n"
+            "worker_processes = \n"
+            "workspace = main\n"
+            "workspace_pool_size = 4\n"
+            "write_behind_window = \n"
+            "\n"
+            "[workspaces]\n"
+            "main = tree_of_tasks.db\n"
         ))
         self.ini_worker = ini_worker
         self.handlers = handlers
-        if self.ini_worker.get_auto_showing_state():
-            print(self.handlers.get_tasks_as_string().message)
-        self.commands = (
+        # Name of the last handled command, the rendering of the tree after
+        # the command is counted for it
+        self.last_command_name = None
+        metrics_file_path = ini_worker.get_metrics_file_path()
+        if metrics_file_path:
+            atexit.register(metrics.registry.dump, metrics_file_path)
+        profiling_mode = ini_worker.get_profiling_mode()
+        if profiling_mode is not profiling.ProfilingMode.OFF:
+            profiling.profiler.set_mode(profiling_mode)
+        backup_interval = ini_worker.get_backup_interval()
+        if backup_interval is not None and ini_worker.get_storage() == "sqlite":
+            from orm import backups
+            backup_scheduler = backups.BackupScheduler(
+                list(dict.fromkeys(ini_worker.get_workspaces().values())),
+                ini_worker.get_backup_directory(),
+                backup_interval * 60, ini_worker.get_backup_retention()
+            )
+            backup_scheduler.start()
+            atexit.register(backup_scheduler.stop)
+
+    @functools.cached_property
+    def commands(self) -> Tuple[lexer_classes.Command, ...]:
+        handlers = self.handlers
+        return (
             lexer_classes.Command(
                 names=("автопоказ", "autoshowing"),
                 description=(
@@ -235,6 +352,50 @@ class MainLogic:
                     )
                 )
             ),
+            lexer_classes.Command(
+                names=("поставить перед", "before"),
+                description=(
+                    "ставит задачу перед другой задачей (задача становится "
+                    "соседней для нее, если она была в другом месте)"
+                ),
+                handler=functools.partial(
+                    handlers.place_task_next_to_sibling, False
+                ),
+                arguments=(
+                    lexer_classes.Arg(
+                        "ID задачи",
+                        arg_implementations.IntArgType(is_signed=False),
+                        "что переставляется"
+                    ),
+                    lexer_classes.Arg(
+                        "ID соседней задачи",
+                        arg_implementations.IntArgType(is_signed=False),
+                        "перед чем ставится"
+                    )
+                )
+            ),
+            lexer_classes.Command(
+                names=("поставить после", "after"),
+                description=(
+                    "ставит задачу после другой задачи (задача становится "
+                    "соседней для нее, если она была в другом месте)"
+                ),
+                handler=functools.partial(
+                    handlers.place_task_next_to_sibling, True
+                ),
+                arguments=(
+                    lexer_classes.Arg(
+                        "ID задачи",
+                        arg_implementations.IntArgType(is_signed=False),
+                        "что переставляется"
+                    ),
+                    lexer_classes.Arg(
+                        "ID соседней задачи",
+                        arg_implementations.IntArgType(is_signed=False),
+                        "после чего ставится"
+                    )
+                )
+            ),
             lexer_classes.Command(
                 names=("дата", "date", "time", "время"),
                 description="показывает дату (и время) создания задачи",
@@ -245,8 +406,240 @@ class MainLogic:
                         arg_implementations.IntArgType(is_signed=False)
                     ),
                 )
+            ),
+            lexer_classes.Command(
+                names=("найти", "поиск", "search", "find"),
+                description=(
+                    "ищет задачи, в тексте которых есть все указанные слова "
+                    "(последнее слово может быть началом слова); выводит ID "
+                    "найденных задач и путь к ним, самые подходящие задачи "
+                    "идут первыми"
+                ),
+                handler=handlers.search_tasks,
+                arguments=(
+                    lexer_classes.Arg(
+                        "слова для поиска",
+                        arg_implementations.StringArgType()
+                    ),
+                )
+            ),
+            lexer_classes.Command(
+                names=("статистика", "stats"),
+                description=(
+                    "показывает количество всех задач и выполненных задач"
+                ),
+                handler=handlers.show_stats
+            ),
+            lexer_classes.Command(
+                names=("отчет", "report"),
+                description=(
+                    "показывает отчет по всему дереву: выполнение самых "
+                    "больших корневых задач, количество задач на уровнях "
+                    "вложенности, ветвление и возраст задач"
+                ),
+                handler=handlers.show_report
+            ),
+            lexer_classes.Command(
+                names=("метрики", "metrics"),
+                description=(
+                    "показывает, сколько времени заняли разбор, обработка и "
+                    "показ дерева для каждой команды, и сколько SQL-запросов "
+                    "было сделано"
+                ),
+                handler=handlers.show_metrics
+            ),
+            lexer_classes.Command(
+                names=("профилирование", "profile"),
+                description=(
+                    "включает профилирование каждой команды: под cProfile "
+                    "(профиль каждой команды в отдельном .prof файле) или "
+                    "трассировку (разбор, обработка, SQL-запросы и показ "
+                    "дерева записываются в один файл в формате Chrome trace)"
+                ),
+                handler=handlers.change_profiling_mode,
+                arguments=(
+                    lexer_classes.Arg(
+                        "режим",
+                        arg_implementations.ChoiceArgType(
+                            profiling.MODE_NAMES
+                        )
+                    ),
+                )
+            ),
+            lexer_classes.Command(
+                names=("пересчитать", "recount"),
+                description=(
+                    "проверяет счетчики выполненных подзадач (выполнено/всего) "
+                    "у всех задач и исправляет неправильные"
+                ),
+                handler=handlers.rebuild_subtree_counters
+            ),
+            lexer_classes.Command(
+                names=("экспорт", "export"),
+                description=(
+                    "сохраняет все задачи в файл: если файл заканчивается на "
+                    ".jsonl - по одному JSON-объекту на строку, иначе - в "
+                    "виде дерева, как при показе (но со свернутыми задачами)"
+                ),
+                handler=handlers.export_tasks,
+                arguments=(
+                    lexer_classes.Arg(
+                        "путь к файлу",
+                        arg_implementations.StringArgType()
+                    ),
+                )
+            ),
+            lexer_classes.Command(
+                names=("импорт", "import"),
+                description=(
+                    "добавляет задачи из файла, сделанного командой экспорта "
+                    "(формат определяется так же, как при экспорте); задачи "
+                    "получают новые ID"
+                ),
+                handler=handlers.import_tasks,
+                arguments=(
+                    lexer_classes.Arg(
+                        "ID родителя",
+                        arg_implementations.OptionalIntArgType(is_signed=False),
+                        (
+                            "ID задачи, в которую будут вложены "
+                            "импортированные задачи"
+                        )
+                    ),
+                    lexer_classes.Arg(
+                        "путь к файлу",
+                        arg_implementations.StringArgType()
+                    )
+                )
+            ),
+            lexer_classes.Command(
+                names=("отменить", "undo"),
+                description=(
+                    "отменяет последнее изменение задач (команду или "
+                    "транзакцию целиком); можно отменить несколько изменений "
+                    "подряд"
+                ),
+                handler=handlers.undo_change
+            ),
+            lexer_classes.Command(
+                names=("вернуть", "redo"),
+                description=(
+                    "возвращает последнее отмененное изменение, если после "
+                    "отмены задачи не менялись"
+                ),
+                handler=handlers.redo_change
+            ),
+            lexer_classes.Command(
+                names=("начать", "begin"),
+                description=(
+                    "открывает транзакцию: следующие команды не сохраняют "
+                    "изменения (и дерево не показывается после них), пока "
+                    "не будет введена команда \"зафиксировать\" или "
+                    "\"откатить\"; несохраненные изменения теряются при "
+                    "выходе, а другие копии программы не могут изменять "
+                    "задачи, пока транзакция открыта"
+                ),
+                handler=handlers.begin_transaction
+            ),
+            lexer_classes.Command(
+                names=("зафиксировать", "commit"),
+                description="сохраняет все изменения открытой транзакции",
+                handler=handlers.commit_transaction
+            ),
+            lexer_classes.Command(
+                names=("откатить", "rollback"),
+                description="отменяет все изменения открытой транзакции",
+                handler=handlers.rollback_transaction
+            ),
+            lexer_classes.Command(
+                names=("синхронизировать", "sync"),
+                description=(
+                    "дожидается, пока все изменения будут записаны на диск "
+                    "(нужно, если изменения записываются в фоне)"
+                ),
+                handler=handlers.sync
+            ),
+            lexer_classes.Command(
+                names=("бэкап", "backup"),
+                description=(
+                    "сохраняет резервную копию базы данных SQLite в папку "
+                    "из настройки backup_directory, не останавливая работу "
+                    "с задачами; если задана настройка backup_retention, "
+                    "хранится только столько последних копий"
+                ),
+                handler=handlers.backup_database
+            ),
+            lexer_classes.Command(
+                names=("восстановить", "restore"),
+                description=(
+                    "заменяет все задачи задачами из резервной копии, если "
+                    "она не повреждена; историю изменений после этого "
+                    "отменить нельзя"
+                ),
+                handler=handlers.restore_database,
+                arguments=(
+                    lexer_classes.Arg(
+                        "путь к файлу",
+                        arg_implementations.StringArgType()
+                    ),
+                )
+            ),
+            lexer_classes.Command(
+                names=("пространство", "workspace"),
+                description=(
+                    "открывает рабочее пространство - отдельное дерево "
+                    "задач из секции [workspaces] настроек (название = путь "
+                    "к базе данных SQLite); недавно открытые пространства "
+                    "остаются открытыми, поэтому возврат к ним мгновенный"
+                ),
+                handler=handlers.switch_workspace,
+                arguments=(
+                    lexer_classes.Arg(
+                        "название",
+                        arg_implementations.StringArgType()
+                    ),
+                )
+            ),
+            lexer_classes.Command(
+                names=("пространства", "workspaces"),
+                description=(
+                    "показывает все рабочие пространства, текущее отмечено "
+                    "звездочкой"
+                ),
+                handler=handlers.show_workspaces
+            ),
+            lexer_classes.Command(
+                names=("искать везде", "search-all"),
+                description=(
+                    "ищет задачи, как команда \"найти\", сразу во всех "
+                    "рабочих пространствах (параллельно)"
+                ),
+                handler=handlers.search_all_workspaces,
+                arguments=(
+                    lexer_classes.Arg(
+                        "слова для поиска",
+                        arg_implementations.StringArgType()
+                    ),
+                )
+            ),
+            lexer_classes.Command(
+                names=("выгрузить все", "export-all"),
+                description=(
+                    "сохраняет задачи всех рабочих пространств (параллельно) "
+                    "в указанную папку, каждое - в файл <название>.jsonl"
+                ),
+                handler=handlers.export_all_workspaces,
+                arguments=(
+                    lexer_classes.Arg(
+                        "путь к папке",
+                        arg_implementations.StringArgType()
+                    ),
+                )
             )
         )
+
+    @functools.cached_property
+    def constant_context(self) -> lexer_classes.ConstantContext:
         commands_description: Dict[str, List[Callable]] = {}
         for command in self.commands:
             for name in command.names:
@@ -258,22 +651,183 @@ class MainLogic:
                     commands_description[name] = [
                         command.get_full_description
                     ]
-        self.constant_context = lexer_classes.ConstantContext(
+        return lexer_classes.ConstantContext(
             self.commands, commands_description
         )
 
+    def get_initial_tree(self) -> str:
+        """
+        Renders the tree for the start of the REPL. The SQLite storage is
+        rendered from the memory-mapped binary snapshot, if it was made from
+        the current version of the database, so the database isn't opened
+        until the first command. Otherwise the snapshot is rebuilt on exit.
+        """
+        if self.ini_worker.get_storage() != "sqlite":
+            return self.handlers.get_tasks_as_string().message
+        from orm import binary_snapshot
+        atexit.register(self.update_tree_snapshot)
+        database_path = self.handlers.workspace_path
+        snapshot = binary_snapshot.open_snapshot(
+            database_path + TREE_SNAPSHOT_SUFFIX,
+            binary_snapshot.get_database_version(database_path)
+        )
+        if snapshot is None:
+            return self.handlers.get_tasks_as_string().message
+        lines = snapshot.render()
+        snapshot.close()
+        return "\n".join(lines) if lines else "<дерево пустое>"
+
+    def update_tree_snapshot(self) -> None:
+        """
+        Rebuilds the binary snapshot of the tree of the current workspace, if
+        it's stale. The tasks are read by a separate connection, so only the
+        committed ones get into the snapshot.
+        """
+        from orm import binary_snapshot, tree_queries
+        database_path = self.handlers.workspace_path
+        snapshot_path = database_path + TREE_SNAPSHOT_SUFFIX
+        # The version is taken before the tasks are read, so if the database
+        # is changed in between, the snapshot is just considered stale
+        database_version = binary_snapshot.get_database_version(database_path)
+        snapshot = binary_snapshot.open_snapshot(
+            snapshot_path, database_version
+        )
+        if snapshot is not None:
+            snapshot.close()
+        elif database_version is not None:
+            connection = tree_queries.connect_read_only(database_path)
+            try:
+                binary_snapshot.write_snapshot(
+                    map(tree_queries.make_exported_task, connection.execute(
+                        tree_queries.get_pre_order_query("parent_id IS NULL")
+                    )), snapshot_path, database_version
+                )
+            finally:
+                connection.close()
+
+    def set_up_line_editing(self) -> completion.Completer:
+        """
+        Turns on the history of the entered commands and the completion of
+        the names of the commands and IDs of the tasks by Tab.
+
+        Returns:
+            the completer, which is used by readline
+        """
+        completer = completion.Completer(
+            self.commands, lambda: self.handlers.tasks_manager
+        )
+        try:
+            import readline
+        except ImportError:
+            # There's no readline on Windows, the commands are entered
+            # without line editing then
+            return completer
+        history_file_path = self.ini_worker.get_history_file_path()
+        if history_file_path is not None:
+            try:
+                readline.read_history_file(history_file_path)
+            except OSError:
+                # There's no history yet
+                pass
+            readline.set_history_length(HISTORY_LENGTH)
+            atexit.register(save_history, history_file_path)
+        # Whole lines are completed, because names of the commands can
+        # contain spaces
+        readline.set_completer_delims("")
+        readline.set_completer(completer.complete)
+
+        def display_completions(
+                substitution: str, completions: List[str],
+                longest_completion_length: int) -> None:
+            print()
+            for description in completer.descriptions:
+                print(description)
+            print(f">>> {readline.get_line_buffer()}", end="", flush=True)
+        readline.set_completion_display_matches_hook(display_completions)
+        if "libedit" in (readline.__doc__ or ""):
+            # readline of macOS
+            readline.parse_and_bind("bind ^I rl_complete")
+        else:
+            readline.parse_and_bind("tab: complete")
+        return completer
+
     def listen_for_commands_infinitely(self) -> NoReturn:
+        completer = self.set_up_line_editing()
+        if self.ini_worker.get_auto_showing_state():
+            print(self.get_initial_tree())
+        session_log_path = self.ini_worker.get_session_log_path()
+        # Every entered command is written as "<UNIX time>\t<command>", so the
+        # session can be replayed by benchmarks.replay
+        session_log = (
+            open(session_log_path, "a", encoding="utf-8")
+            if session_log_path else None
+        )
         while True:
             entered_command = input(">>> ")
+            if session_log is not None:
+                session_log.write(f"{time.time():.6f}\t{entered_command}\n")
+                session_log.flush()
             result: HandlingResult = self.handle_command(entered_command)
+            completer.mark_tasks_as_changed()
+            # Inside a transaction the tree is shown after the commit
             if (
                 result.whether_to_print_a_tree
                 and self.ini_worker.get_auto_showing_state()
+                and not self.handlers.is_in_transaction
             ):
-                print(self.handlers.get_tasks_as_string().message)
+                print(self.render_tree())
             print(result.message)
 
+    def render_tree(self) -> str:
+        """
+        Gets the tree as string and measures it for the last handled command.
+        """
+        rendering_start = time.perf_counter()
+        statements_before = metrics.registry.get_counter(
+            metrics.SQL_STATEMENTS_COUNTER
+        )
+        tree = self.handlers.get_tasks_as_string().message
+        if profiling.profiler.is_tracing:
+            profiling.profiler.record_span(
+                "render", rendering_start, time.perf_counter()
+            )
+        if self.last_command_name is not None:
+            metrics.registry.observe(
+                f"command.{self.last_command_name}.rendering_seconds",
+                time.perf_counter() - rendering_start
+            )
+            metrics.registry.observe(
+                f"command.{self.last_command_name}.rendering_sql_statements",
+                metrics.registry.get_counter(metrics.SQL_STATEMENTS_COUNTER)
+                - statements_before
+            )
+        return tree
+
+    def handle_single_command(self, command: str) -> int:
+        """
+        Handles one command and prints the result without the tree, for
+        running the program from scripts.
+
+        Returns:
+            exit status of the program: 0 if the command succeeded, else 1
+        """
+        result = self.handle_command(command)
+        print(result.message)
+        return 0 if result.is_successful else 1
+
     def handle_command(self, command: str) -> HandlingResult:
+        if profiling.profiler.mode is profiling.ProfilingMode.CPROFILE:
+            return profiling.profiler.run_profiled(
+                self._handle_command, command
+            )
+        return self._handle_command(command)
+
+    def _handle_command(self, command: str) -> HandlingResult:
+        # Other processes could change the config and the tasks
+        self.ini_worker.reload_if_changed()
+        self.handlers.refresh_tasks()
+        parsing_start = time.perf_counter()
+        self.last_command_name = None
         error_args_amount = 0
         for command_ in self.commands:
             try:
@@ -282,38 +836,78 @@ class MainLogic:
                 if parsing_error.args_num > error_args_amount:
                     error_args_amount = parsing_error.args_num
             else:
-                return command_.handler(
-                    *command_.get_all_constant_metadata_as_converted(
-                        self.constant_context
-                    ),
-                    *converted_command.arguments
+                command_name = command_.names[0]
+                handling_start = time.perf_counter()
+                statements_before = metrics.registry.get_counter(
+                    metrics.SQL_STATEMENTS_COUNTER
                 )
+                try:
+                    result = command_.handler(
+                        # Help tables are built only when some command needs
+                        # them
+                        *(
+                            command_.get_all_constant_metadata_as_converted(
+                                self.constant_context
+                            ) if command_.constant_metadata else ()
+                        ),
+                        *converted_command.arguments
+                    )
+                except ConcurrentModificationError:
+                    result = HandlingResult(
+                        (
+                            "Задачи были изменены другой копией программы, "
+                            "пока выполнялась команда, поэтому она отменена! "
+                            "Повторите ее"
+                        ) + self.handlers.discard_changes(),
+                        whether_to_print_a_tree=True, is_successful=False
+                    )
+                metrics.registry.observe(
+                    f"command.{command_name}.parsing_seconds",
+                    handling_start - parsing_start
+                )
+                metrics.registry.observe(
+                    f"command.{command_name}.handling_seconds",
+                    time.perf_counter() - handling_start
+                )
+                metrics.registry.observe(
+                    f"command.{command_name}.handling_sql_statements",
+                    metrics.registry.get_counter(
+                        metrics.SQL_STATEMENTS_COUNTER
+                    ) - statements_before
+                )
+                if profiling.profiler.is_tracing:
+                    handling_end = time.perf_counter()
+                    profiling.profiler.record_span(
+                        "parse", parsing_start, handling_start
+                    )
+                    profiling.profiler.record_span(
+                        "handler", handling_start, handling_end,
+                        command=command
+                    )
+                self.last_command_name = command_name
+                return result
         if error_args_amount == 0:
             return HandlingResult(
                 "Ошибка обработки команды на её названии!",
-                whether_to_print_a_tree=False
+                whether_to_print_a_tree=False, is_successful=False
             )
         else:
             return HandlingResult(
                 (
                     f"Ошибка обработки команды на аргументе номер "
                     f"{error_args_amount} (он неправильный или пропущен)"
-                ), whether_to_print_a_tree=False
+                ), whether_to_print_a_tree=False, is_successful=False
             )
 
 
 if __name__ == '__main__':
-    ini_worker = MyINIWorker(
-        ConfigParser(),
-        "config/declarative_config_files/tree_of_tasks_config.ini"
-    )
-    main_logic = MainLogic(
-        ini_worker,
-        Handlers(
-            ini_worker,
-            db_apis.TasksManager(
-                db_apis.get_sqlalchemy_db_session("sqlite:///tree_of_tasks.db")
-            )
-        )
-    )
-    main_logic.listen_for_commands_infinitely()
+    ini_worker = MyINIWorker(ConfigParser(), CONFIG_FILE_PATH)
+    main_logic = MainLogic(ini_worker, Handlers(
+        ini_worker, functools.partial(get_tasks_manager, ini_worker)
+    ))
+    if len(sys.argv) > 1:
+        # Like `python main_logic.py add - "some text"`, the shell has
+        # already removed the quotes, the spaces inside them are kept
+        sys.exit(main_logic.handle_single_command(" ".join(sys.argv[1:])))
+    else:
+        main_logic.listen_for_commands_infinitely()
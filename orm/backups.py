@@ -0,0 +1,276 @@
+"""
+Online backups of the SQLite database.
+
+Backups are made with the backup API of SQLite by small batches of pages with
+pauses between them, so other connections (the REPL, the server, other copies
+of the program) keep working while a big database is copied, and the copy is
+always consistent.
+"""
+import glob
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from orm import tree_queries
+
+# Pages, which are copied in one step (the database is locked only for the
+# step), and the pause between the steps in seconds
+PAGES_PER_STEP = 256
+STEP_PAUSE = 0.005
+BACKUP_NAME_DATE_FORMAT = "%Y%m%d-%H%M%S-%f"
+# Glob of the date in the names of the backups, it matches only the digits of
+# the date, so backups of the databases, which names start with the name of
+# the database and "-", aren't matched
+_BACKUP_DATE_GLOB = re.sub(
+    r"\d", "[0-9]", datetime(2000, 1, 1).strftime(BACKUP_NAME_DATE_FORMAT)
+)
+# Amount of the problems of the integrity check, which are reported
+MAX_PROBLEMS_AMOUNT = 10
+
+
+class BackupIntegrityError(Exception):
+
+    def __init__(self, problems: List[str]):
+        super().__init__(problems)
+        self.problems = problems
+
+
+def _pause(status: int, remaining: int, total: int) -> None:
+    time.sleep(STEP_PAUSE)
+
+
+def _get_backup_pattern(database_path: str, directory: str) -> str:
+    name = os.path.splitext(os.path.basename(database_path))[0]
+    return os.path.join(
+        directory, f"{glob.escape(name)}-{_BACKUP_DATE_GLOB}.db"
+    )
+
+
+def get_backups(database_path: str, directory: str) -> List[str]:
+    """
+    Returns:
+        paths to the backups of the database from the oldest to the newest
+    """
+    # Names end with the date, so they are sorted by the date
+    return sorted(glob.glob(_get_backup_pattern(database_path, directory)))
+
+
+def make_backup(
+        database_path: str, directory: str,
+        retention: Optional[int] = None) -> str:
+    """
+    Copies the database to a new file in the directory. The file appears only
+    when the copy is complete and synced to the disk.
+
+    Args:
+        database_path: path to the SQLite database
+        directory: directory of the backups, it's created if it's needed
+        retention:
+            amount of the newest backups, which are kept (the older ones are
+            deleted), None means that all backups are kept
+
+    Returns:
+        path to the backup
+
+    Raises:
+        ValueError: if the retention is negative
+        OSError: if the database can't be read or the backup can't be written
+    """
+    if retention is not None and retention < 0:
+        raise ValueError(f"Negative retention: {retention}")
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.splitext(os.path.basename(database_path))[0]
+    backup_path = os.path.join(
+        directory,
+        f"{name}-{datetime.now().strftime(BACKUP_NAME_DATE_FORMAT)}.db"
+    )
+    temporary_file_path = f"{backup_path}.tmp"
+    try:
+        source = sqlite3.connect(database_path)
+        try:
+            target = sqlite3.connect(temporary_file_path)
+            try:
+                source.backup(
+                    target, pages=PAGES_PER_STEP, progress=_pause
+                )
+            finally:
+                target.close()
+        finally:
+            source.close()
+    except sqlite3.Error as error:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+        raise OSError(str(error)) from error
+    with open(temporary_file_path, "rb+") as file:
+        os.fsync(file.fileno())
+    os.replace(temporary_file_path, backup_path)
+    if retention is not None:
+        for old_backup_path in get_backups(database_path, directory)[
+            :-retention
+        ]:
+            os.remove(old_backup_path)
+    return backup_path
+
+
+def check_integrity(backup_path: str) -> List[str]:
+    """
+    Opens the backup read-only and checks, that it's a whole database of tasks.
+
+    Returns:
+        found problems, an empty list means that the backup is fine
+
+    Raises:
+        FileNotFoundError: if the backup doesn't exist
+    """
+    if not os.path.isfile(backup_path):
+        raise FileNotFoundError(backup_path)
+    try:
+        connection = tree_queries.connect_read_only(backup_path)
+        try:
+            problems = [
+                row[0] for row in connection.execute(
+                    f"PRAGMA integrity_check({MAX_PROBLEMS_AMOUNT})"
+                )
+            ]
+            if problems == ["ok"]:
+                problems = []
+                connection.execute("SELECT count(*) FROM tasks").fetchone()
+        finally:
+            connection.close()
+    except sqlite3.Error as error:
+        problems = [str(error)]
+    return problems
+
+
+def restore_backup(backup_path: str, database_path: str) -> None:
+    """
+    Replaces the contents of the database with the backup, after the
+    integrity of the backup is checked. The database is replaced in one
+    step, so other connections see either the old or the restored tasks, and
+    all restored tasks are marked as changed, so other copies of the program
+    load them again.
+
+    Raises:
+        BackupIntegrityError: if the backup is damaged
+        OSError: if the backup can't be read or the database can't be written
+    """
+    problems = check_integrity(backup_path)
+    if problems:
+        raise BackupIntegrityError(problems)
+    try:
+        target = sqlite3.connect(database_path)
+        try:
+            try:
+                old_ids = [
+                    row[0] for row in target.execute("SELECT id FROM tasks")
+                ]
+                last_change_seq = target.execute(
+                    "SELECT value FROM change_sequence"
+                ).fetchone()[0]
+            except sqlite3.OperationalError:
+                # The database isn't created or migrated yet
+                old_ids, last_change_seq = [], 0
+            source = sqlite3.connect(backup_path)
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+            _mark_as_changed(target, old_ids, last_change_seq)
+        finally:
+            target.close()
+    except sqlite3.Error as error:
+        raise OSError(str(error)) from error
+
+
+def _mark_as_changed(
+        connection: sqlite3.Connection, old_ids: List[int],
+        last_change_seq: int) -> None:
+    """
+    Gives all restored tasks the same new number of change, which is bigger
+    than any number before the restoration, and records the tasks, which
+    aren't in the backup, as deleted.
+    """
+    try:
+        with connection:
+            change_seq = max(
+                last_change_seq,
+                connection.execute(
+                    "SELECT value FROM change_sequence"
+                ).fetchone()[0]
+            ) + 1
+            connection.execute(
+                "UPDATE change_sequence SET value = ?", (change_seq,)
+            )
+            # The trigger doesn't count the update, because change_seq is
+            # changed by it
+            connection.execute("UPDATE tasks SET change_seq = ?", (change_seq,))
+            connection.execute("DELETE FROM deleted_tasks")
+            connection.execute(
+                "CREATE TEMPORARY TABLE old_ids (id INTEGER PRIMARY KEY)"
+            )
+            connection.executemany(
+                "INSERT INTO old_ids (id) VALUES (?)",
+                ((task_id,) for task_id in old_ids)
+            )
+            connection.execute(
+                "INSERT INTO deleted_tasks (id, change_seq) "
+                "SELECT id, ? FROM old_ids "
+                "WHERE id NOT IN (SELECT id FROM tasks)", (change_seq,)
+            )
+            connection.execute("DROP TABLE old_ids")
+    except sqlite3.OperationalError:
+        # The backup was made before the change tracking appeared, the
+        # database is migrated when it is opened
+        pass
+
+
+class BackupScheduler:
+    """
+    Makes backups of the databases in a background thread every interval.
+    Only the changes, which are already written to the databases, get into
+    the backups.
+    """
+
+    def __init__(
+            self, database_paths: Sequence[str], directory: str,
+            interval: float, retention: Optional[int] = None):
+        """
+        Args:
+            database_paths: paths to the SQLite databases
+            directory: directory of the backups
+            interval: time between the backups in seconds
+            retention: see make_backup, it's applied to every database
+        """
+        self.database_paths = database_paths
+        self.directory = directory
+        self.interval = interval
+        self.retention = retention
+        self._is_stopped = threading.Event()
+        # A daemon, so the program can exit even if the scheduler isn't
+        # stopped (an unfinished backup never appears anyway)
+        self._thread = threading.Thread(
+            target=self._make_backups_infinitely, name="backups", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _make_backups_infinitely(self) -> None:
+        while not self._is_stopped.wait(self.interval):
+            for database_path in self.database_paths:
+                try:
+                    make_backup(database_path, self.directory, self.retention)
+                except OSError as error:
+                    print(
+                        f"Не удалось сделать резервную копию базы данных "
+                        f"\"{database_path}\": {error}", file=sys.stderr
+                    )
+
+    def stop(self) -> None:
+        self._is_stopped.set()
+        self._thread.join()
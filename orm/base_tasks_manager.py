@@ -0,0 +1,297 @@
+from abc import ABC, abstractmethod
+from typing import (
+    List, Tuple, Optional, Iterator, TextIO, Any, Iterable, Dict,
+    TYPE_CHECKING
+)
+
+from orm import tree_formats
+
+if TYPE_CHECKING:
+    from orm import tree_arrays
+
+# Distance between positions of neighbouring siblings, when a task is added to
+# the end or when the siblings are renumbered
+POSITION_GAP = 1024.0
+# If the siblings are closer than that, there's no space to put a task between
+# them, so they should be renumbered
+MIN_POSITION_GAP = 1e-6
+
+
+class BaseTasksManager(ABC):
+    """
+    Storage of the tree of tasks, which is used by the handlers.
+
+    Tasks, which are returned by the storage, have the same fields as
+    models.Task (id, text, is_checked, is_collapsed, parent_id, creation_date,
+    descendant_count, checked_descendant_count, position, nested_tasks) and
+    the methods of TreeNodeMixin. The fields shouldn't be changed directly,
+    only through the methods of the storage, so the storage can keep the
+    counters and indexes up to date.
+    """
+
+    @staticmethod
+    def _get_subtree_size(task: Any) -> Tuple[int, int]:
+        """
+        Returns:
+            amount of tasks and amount of checked tasks in the subtree of the
+            specified task (including the task itself)
+        """
+        return (
+            1 + (task.descendant_count or 0),
+            bool(task.is_checked) + (task.checked_descendant_count or 0)
+        )
+
+    @abstractmethod
+    def get_root_tasks(self) -> List[Any]:
+        """
+        Returns:
+            all tasks without a parent, ordered by position
+        """
+        pass
+
+    @abstractmethod
+    def get_task_by_id(self, task_id: int) -> Any:
+        """
+        Raises:
+            TaskNotFoundError
+        """
+        pass
+
+    @abstractmethod
+    def task_exists(self, task_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    def add_task(self, text: str, parent_id: Optional[int]) -> Any:
+        """
+        Creates a task after the last child of the parent (or after the last
+        root task, if parent_id is None). The task gets its ID right away.
+        """
+        pass
+
+    @abstractmethod
+    def restore_tasks(
+            self, tasks: Iterable[tree_formats.ExportedTask]) -> None:
+        """
+        Adds the tasks with their IDs, every task after the last child of its
+        parent. Parents must go before their children. Doesn't commit.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, *tasks: Any) -> None:
+        """
+        Deletes the tasks with their subtrees.
+        """
+        pass
+
+    @abstractmethod
+    def edit(self, task: Any, text: str) -> None:
+        pass
+
+    @abstractmethod
+    def set_collapsed(self, task: Any, is_collapsed: bool) -> None:
+        pass
+
+    @abstractmethod
+    def set_checked(self, task: Any, is_checked: bool) -> bool:
+        """
+        Changes is_checked attribute of the task and all of its nested tasks.
+
+        Returns:
+            bool: something is changed or not
+        """
+        pass
+
+    @abstractmethod
+    def move(self, task: Any, parent_id: Optional[int]) -> None:
+        """
+        Makes the task the last child of the task with the specified ID (or the
+        last root task, if parent_id is None).
+        """
+        pass
+
+    @abstractmethod
+    def place_next_to_sibling(
+            self, task: Any, sibling: Any, after: bool) -> None:
+        """
+        Puts the task right before or right after the sibling (and makes it a
+        child of the sibling's parent, if it's needed).
+        """
+        pass
+
+    @abstractmethod
+    def get_neighbours(self, task: Any) -> Tuple[Optional[Any], Optional[Any]]:
+        """
+        Returns:
+            siblings right before and right after the task (None if the task
+            is the first or the last one)
+        """
+        pass
+
+    @abstractmethod
+    def get_ancestors(self, task: Any) -> List[Any]:
+        """
+        Returns:
+            ancestors of the task from the root task to the direct parent
+        """
+        pass
+
+    @abstractmethod
+    def search(self, text: str, limit: int = 50) -> List[Tuple[Any, List[Any]]]:
+        """
+        Searches for tasks, which contain all the words from the specified
+        text (the last word can be a beginning of a word).
+
+        Returns:
+            found tasks with their ancestors (from the root task to the parent),
+            the most relevant tasks go first
+        """
+        pass
+
+    @abstractmethod
+    def get_stats(self) -> Tuple[int, int, int]:
+        """
+        Returns:
+            amount of root tasks, amount of all tasks and amount of checked
+            tasks
+        """
+        pass
+
+    @abstractmethod
+    def rebuild_subtree_counters(self, processes: int = 1) -> int:
+        """
+        Checks subtree counters of all tasks and fixes the wrong ones. Doesn't
+        commit.
+
+        Args:
+            processes:
+                amount of worker processes, which recount the subtrees (only
+                the committed tasks are recounted then), storages, which
+                can't be read by other processes, ignore it
+
+        Returns:
+            amount of tasks, which had wrong counters
+        """
+        pass
+
+    @abstractmethod
+    def get_tree_arrays(self) -> "tree_arrays.TreeArrays":
+        """
+        Returns:
+            all tasks as flat arrays for the analytics
+        """
+        pass
+
+    @abstractmethod
+    def get_text_changes(
+            self, version: Any
+    ) -> Tuple[Any, Dict[int, Optional[str]], bool]:
+        """
+        Gets the changes of the texts of the tasks for an index, which is kept
+        in sync with the storage without reading all tasks every time.
+
+        Args:
+            version:
+                version, which was returned by the previous call, or None
+
+        Returns:
+            the current version, texts of the tasks, which were added or
+            changed since the version, by their IDs (None for the deleted
+            tasks), and whether these are the texts of all tasks (the index
+            must be replaced with them, the version is None or too old)
+        """
+        pass
+
+    @abstractmethod
+    def iterate_tasks_in_pre_order(
+            self, root_id: Optional[int] = None
+    ) -> Iterator[tree_formats.ExportedTask]:
+        """
+        Yields all tasks (or the subtree of the task with the specified ID,
+        depths are counted from it) in the same order, in which they are
+        shown (every task goes right before its subtree).
+        """
+        pass
+
+    @abstractmethod
+    def import_tasks(
+            self, file: TextIO, file_format: tree_formats.TreeFileFormat,
+            parent_id: Optional[int] = None,
+            batch_size: int = 1000) -> Tuple[int, List[int]]:
+        """
+        Reads tasks from the file (in the format of export_tasks) and adds
+        them as children of the specified task, new IDs are given to the
+        imported tasks. Doesn't commit.
+
+        Returns:
+            amount of imported tasks and new IDs of the imported root tasks
+
+        Raises:
+            tree_formats.ImportFormatError:
+                if some line is malformed or isn't in pre-order
+        """
+        pass
+
+    @abstractmethod
+    def commit(self) -> None:
+        pass
+
+    @abstractmethod
+    def rollback(self) -> None:
+        """
+        Discards all changes since the last commit.
+        """
+        pass
+
+    def refresh(self) -> bool:
+        """
+        Picks up the changes, which other processes made in the storage (only
+        storages, which can be shared by processes, have something to do).
+
+        Returns:
+            True if something was changed since the last refresh, else False
+        """
+        return False
+
+    def sync(self) -> None:
+        """
+        Waits until all committed changes are on the disk (storages, which
+        write them on commit, have nothing to wait for).
+
+        Raises:
+            OSError: if the changes can't be written
+        """
+        pass
+
+    def get_database_path(self) -> Optional[str]:
+        """
+        Returns:
+            path to the SQLite database, in which the storage keeps the tasks,
+            or None if it keeps them elsewhere
+        """
+        return None
+
+    def close(self) -> None:
+        """
+        Releases the files and connections of the storage (it can't be used
+        after that).
+        """
+        pass
+
+    def export_tasks(
+            self, file: TextIO,
+            file_format: tree_formats.TreeFileFormat) -> int:
+        """
+        Writes all tasks to the file line by line, parents go before their
+        children.
+
+        Returns:
+            amount of exported tasks
+        """
+        tasks_amount = 0
+        for task in self.iterate_tasks_in_pre_order():
+            file.write(tree_formats.format_exported_task(task, file_format))
+            file.write("\n")
+            tasks_amount += 1
+        return tasks_amount
@@ -0,0 +1,194 @@
+"""
+Binary snapshot of the tree, which is rendered right from the memory-mapped
+file, without parsing it and without opening the database.
+
+Layout of the file:
+    header (HEADER)
+    records of the tasks in pre-order (RECORD each)
+    heap with UTF-8 texts of the tasks
+"""
+import mmap
+import os
+import struct
+from typing import Iterable, Optional, List, Dict
+
+from orm import tree_formats
+
+# Magic, format version, version of the database, amount of the tasks
+HEADER = struct.Struct("<4sH2xQQ")
+MAGIC = b"TOTS"
+FORMAT_VERSION = 1
+# ID, index of the parent record (-1 for root tasks), index of the record
+# after the subtree, flags, descendants, checked descendants, offset and
+# length of the text in the heap
+RECORD = struct.Struct("<qiIB3xIIQI")
+# Offset of the "index of the record after the subtree" field in RECORD, it's
+# known only after the subtree is written
+SUBTREE_END_OFFSET = 12
+IS_CHECKED_FLAG = 1
+IS_COLLAPSED_FLAG = 2
+
+# "File change counter" of the SQLite database header, it is incremented by
+# every committed transaction (in the rollback journal mode)
+CHANGE_COUNTER = struct.Struct(">I")
+CHANGE_COUNTER_OFFSET = 24
+
+
+def get_database_version(database_path: str) -> Optional[int]:
+    """
+    Returns:
+        the change counter of the SQLite database, or None if it can't be
+        trusted (the database doesn't exist or has a write-ahead log with
+        changes, which aren't in the main file yet)
+    """
+    try:
+        if os.path.getsize(f"{database_path}-wal"):
+            return None
+    except OSError:
+        pass
+    try:
+        with open(database_path, "rb") as file:
+            file.seek(CHANGE_COUNTER_OFFSET)
+            counter_bytes = file.read(CHANGE_COUNTER.size)
+    except OSError:
+        return None
+    if len(counter_bytes) != CHANGE_COUNTER.size:
+        return None
+    return CHANGE_COUNTER.unpack(counter_bytes)[0]
+
+
+def write_snapshot(
+        tasks: Iterable[tree_formats.ExportedTask], snapshot_path: str,
+        database_version: int) -> int:
+    """
+    Writes the tasks (they must go in pre-order with depths) to the snapshot,
+    the file is replaced atomically.
+
+    Returns:
+        amount of the written tasks
+    """
+    records = bytearray()
+    heap = bytearray()
+    # Indexes and depths of the records, which subtrees aren't finished yet
+    open_records: List[List[int]] = []
+    tasks_amount = 0
+
+    def close_last_record() -> None:
+        index = open_records.pop()[0]
+        struct.pack_into(
+            "<I", records,
+            index * RECORD.size + SUBTREE_END_OFFSET, tasks_amount
+        )
+
+    for task in tasks:
+        while open_records and open_records[-1][1] >= task.depth:
+            close_last_record()
+        text = task.text.encode("utf-8")
+        records += RECORD.pack(
+            task.id, open_records[-1][0] if open_records else -1, 0,
+            (
+                (IS_CHECKED_FLAG if task.is_checked else 0)
+                | (IS_COLLAPSED_FLAG if task.is_collapsed else 0)
+            ),
+            task.descendant_count, task.checked_descendant_count,
+            len(heap), len(text)
+        )
+        heap += text
+        open_records.append([tasks_amount, task.depth])
+        tasks_amount += 1
+    while open_records:
+        close_last_record()
+    temporary_file_path = f"{snapshot_path}.tmp"
+    with open(temporary_file_path, "wb") as file:
+        file.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, database_version, tasks_amount
+        ))
+        file.write(records)
+        file.write(heap)
+    os.replace(temporary_file_path, snapshot_path)
+    return tasks_amount
+
+
+class TreeSnapshot:
+
+    def __init__(self, file_path: str):
+        """
+        Maps the snapshot into the memory.
+
+        Raises:
+            OSError: if the file can't be opened
+            ValueError: if the file isn't a snapshot of the current format
+        """
+        with open(file_path, "rb") as file:
+            self._buffer = mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        magic, format_version, self.database_version, self.tasks_amount = (
+            HEADER.unpack_from(self._buffer)
+        )
+        self._heap_offset = HEADER.size + self.tasks_amount * RECORD.size
+        if (
+            magic != MAGIC
+            or format_version != FORMAT_VERSION
+            or len(self._buffer) < self._heap_offset
+        ):
+            self._buffer.close()
+            raise ValueError(f"{file_path} isn't a tree snapshot")
+
+    def render(
+            self, indent_size: int = 4,
+            indentation_symbol: str = " ") -> List[str]:
+        """
+        Returns:
+            lines of the tree, like handler_helpers.get_tasks_as_strings makes
+            them (subtrees of collapsed tasks are skipped without reading)
+        """
+        lines = []
+        # Depths of the rendered records by their indexes
+        depths: Dict[int, int] = {}
+        index = 0
+        while index < self.tasks_amount:
+            (
+                task_id, parent_index, subtree_end, flags, descendant_count,
+                checked_descendant_count, text_offset, text_length
+            ) = RECORD.unpack_from(
+                self._buffer, HEADER.size + index * RECORD.size
+            )
+            depth = 0 if parent_index < 0 else depths[parent_index] + 1
+            depths[index] = depth
+            text_start = self._heap_offset + text_offset
+            is_collapsed = bool(flags & IS_COLLAPSED_FLAG)
+            lines.append(tree_formats.format_task_line(
+                task_id,
+                self._buffer[text_start:text_start + text_length].decode(
+                    "utf-8"
+                ),
+                bool(flags & IS_CHECKED_FLAG), is_collapsed,
+                descendant_count, checked_descendant_count,
+                depth, indent_size, indentation_symbol
+            ))
+            index = subtree_end if is_collapsed else index + 1
+        return lines
+
+    def close(self) -> None:
+        self._buffer.close()
+
+
+def open_snapshot(
+        snapshot_path: str,
+        database_version: Optional[int]) -> Optional[TreeSnapshot]:
+    """
+    Returns:
+        the snapshot, if it exists and was made from the specified version of
+        the database, else None
+    """
+    if database_version is None:
+        return None
+    try:
+        snapshot = TreeSnapshot(snapshot_path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if snapshot.database_version != database_version:
+        snapshot.close()
+        return None
+    return snapshot
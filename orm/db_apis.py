@@ -1,47 +1,389 @@
-from typing import List, Any
+from datetime import datetime
+from typing import (
+    List, Any, Tuple, Optional, Iterator, TextIO, Dict, Iterable,
+    TYPE_CHECKING
+)
 
 import sqlalchemy.orm
 from sqlalchemy import create_engine
 
-from orm import models
+from orm import (
+    models, migrations, subtree_counters, tree_formats, tree_queries
+)
+from orm.base_tasks_manager import (
+    BaseTasksManager, POSITION_GAP, MIN_POSITION_GAP
+)
+from orm.exceptions import TaskNotFoundError, ConcurrentModificationError
+
+if TYPE_CHECKING:
+    from orm import tree_arrays
+
+
+class TasksSession(sqlalchemy.orm.Session):
+    """
+    Session, which reports conflicts of the optimistic concurrency as
+    ConcurrentModificationError, so they can be caught without importing
+    SQLAlchemy.
+    """
+
+    def flush(self, objects: Optional[Any] = None) -> None:
+        try:
+            super().flush(objects)
+        except sqlalchemy.orm.exc.StaleDataError as error:
+            raise ConcurrentModificationError() from error
 
 
 def get_sqlalchemy_db_session(path_to_db: str) -> sqlalchemy.orm.Session:
-    sql_engine = create_engine(path_to_db)
-    models.DeclarativeBase.metadata.create_all(sql_engine)
-    return sqlalchemy.orm.Session(sql_engine)
+    # Storages of the workspaces are used by different threads (one thread at
+    # a time), see Handlers._fan_out
+    sql_engine = create_engine(
+        path_to_db, connect_args={"check_same_thread": False}
+    )
+    # Schema of an up-to-date database doesn't need to be checked table by
+    # table on every launch
+    if not migrations.is_up_to_date(sql_engine):
+        models.DeclarativeBase.metadata.create_all(sql_engine)
+        migrations.migrate(sql_engine)
+    # Only the changed tasks are expired, see TasksManager.refresh
+    return TasksSession(sql_engine, expire_on_commit=False)
 
 
-class TasksManager:
+class TasksManager(BaseTasksManager):
 
     def __init__(self, db_session: sqlalchemy.orm.Session):
         self.db_session = db_session
+        # Number of the last change of the tasks, which the session knows
+        # about, and the number, up to which the deleted tasks are forgotten
+        self._last_change_seq, self._pruned_change_seq = (
+            self._get_change_sequence()
+        )
+        # Numbers of changes of a rolled back transaction are used again, so
+        # the versions of get_text_changes before a rollback are too old
+        self._rollbacks_amount = 0
+
+    def _get_change_sequence(self) -> Tuple[int, int]:
+        """
+        Returns:
+            number of the last change and the number, up to which the deleted
+            tasks are forgotten
+        """
+        return tuple(self.db_session.connection().exec_driver_sql(
+            "SELECT value, pruned_value FROM change_sequence"
+        ).one())
 
     def _get_query(self) -> sqlalchemy.orm.Query:
         return (
             self.db_session
             .query(models.Task)
-            .order_by(models.Task.creation_date)
+            .order_by(models.Task.position, models.Task.id)
         )
 
     def get_tasks(self) -> List[models.Task]:
+        return self._get_query().all()
+
+    def _get_siblings_query(
+            self, parent_id: Optional[int]) -> sqlalchemy.orm.Query:
         return (
             self.db_session
             .query(models.Task)
-            .order_by(models.Task.creation_date)
-            .all()
+            .filter(models.Task.parent_id.is_(parent_id))
+            if parent_id is None else
+            self.db_session
+            .query(models.Task)
+            .filter(models.Task.parent_id == parent_id)
+        )
+
+    def _get_position_after_last_child(self, parent_id: Optional[int]) -> float:
+        last_position = (
+            self._get_siblings_query(parent_id)
+            .with_entities(sqlalchemy.func.max(models.Task.position))
+            .scalar()
         )
+        return (last_position or 0) + POSITION_GAP
+
+    def _renumber_children(self, parent_id: Optional[int]) -> None:
+        """
+        Spreads positions of the children of the task evenly, so there's
+        enough space between them again.
+        """
+        for index, task in enumerate(
+            self._get_siblings_query(parent_id)
+            .order_by(models.Task.position, models.Task.id),
+            start=1
+        ):
+            task.position = index * POSITION_GAP
+
+    def _change_counters_of_ancestors(
+            self, parent_id: Optional[int], descendants_difference: int,
+            checked_descendants_difference: int) -> None:
+        """
+        Adds the specified differences to the subtree counters of the task with
+        the specified ID and all of its ancestors.
+        """
+        while parent_id is not None:
+            parent = self.db_session.get(models.Task, parent_id)
+            parent.descendant_count += descendants_difference
+            parent.checked_descendant_count += checked_descendants_difference
+            parent_id = parent.parent_id
 
     def add(self, *tasks: models.Task) -> None:
-        self.db_session.add_all(tasks)
+        for task in tasks:
+            if task.position is None:
+                task.position = self._get_position_after_last_child(
+                    task.parent_id
+                )
+            self.db_session.add(task)
+            self._change_counters_of_ancestors(
+                task.parent_id, *self._get_subtree_size(task)
+            )
+
+    def add_task(self, text: str, parent_id: Optional[int]) -> models.Task:
+        task = models.Task(text=text, parent_id=parent_id)
+        self.add(task)
+        # The ID is given by the database
+        self.db_session.flush()
+        return task
+
+    def restore_tasks(
+            self, tasks: Iterable[tree_formats.ExportedTask]) -> None:
+        for exported_task in tasks:
+            self.add(models.Task(
+                id=exported_task.id, text=exported_task.text,
+                is_checked=exported_task.is_checked,
+                is_collapsed=exported_task.is_collapsed,
+                parent_id=exported_task.parent_id,
+                creation_date=(
+                    None if exported_task.creation_date is None else
+                    datetime.strptime(
+                        exported_task.creation_date, tree_formats.DATE_FORMAT
+                    )
+                ),
+                descendant_count=0, checked_descendant_count=0
+            ))
 
     def commit(self) -> None:
         self.db_session.commit()
+        # Tasks, which were changed by raw SQL, must be loaded again
+        self.refresh()
+        if (
+            self._last_change_seq - self._pruned_change_seq
+            >= tree_queries.RETAINED_CHANGES + tree_queries.PRUNING_STEP
+        ):
+            self._pruned_change_seq = tree_queries.prune_deleted_tasks(
+                self.db_session.connection().connection
+            )
+            self.db_session.commit()
+
+    def refresh(self) -> bool:
+        """
+        Expires the loaded tasks, which were changed (by any process) since
+        the last refresh, so they are loaded again when they are used, and
+        removes the deleted ones from the session. If nothing is changed, it
+        costs one query. If the deleted tasks, which the session didn't see,
+        are already forgotten, all tasks are removed from the session.
+
+        Returns:
+            True if something was changed since the last refresh, else False
+        """
+        # Changes of an open transaction mustn't be lost by the expiration
+        self.db_session.flush()
+        last_change_seq, self._pruned_change_seq = self._get_change_sequence()
+        if last_change_seq == self._last_change_seq:
+            return False
+        if self._last_change_seq < self._pruned_change_seq:
+            self.db_session.expunge_all()
+            self._last_change_seq = last_change_seq
+            return True
+        connection = self.db_session.connection()
+        changed_ids = [
+            row[0] for row in connection.exec_driver_sql(
+                "SELECT id FROM tasks WHERE change_seq > ?",
+                (self._last_change_seq,)
+            )
+        ]
+        deleted_ids = {
+            row[0] for row in connection.exec_driver_sql(
+                "SELECT id FROM deleted_tasks WHERE change_seq > ?",
+                (self._last_change_seq,)
+            )
+        }
+        identity_map = self.db_session.identity_map
+        for task_id in [*changed_ids, *deleted_ids]:
+            task = identity_map.get(
+                self.db_session.identity_key(models.Task, task_id)
+            )
+            if task is None:
+                continue
+            # The task could be moved or deleted, so the children of its
+            # parent are loaded again (the new parent is changed anyway,
+            # because of its counters)
+            parent_id = sqlalchemy.inspect(task).dict.get("parent_id")
+            if parent_id is not None:
+                parent = identity_map.get(
+                    self.db_session.identity_key(models.Task, parent_id)
+                )
+                if parent is not None:
+                    self.db_session.expire(parent, ["nested_tasks"])
+            if task_id in deleted_ids:
+                self.db_session.expunge(task)
+            else:
+                self.db_session.expire(task)
+        self._last_change_seq = last_change_seq
+        return True
+
+    def rollback(self) -> None:
+        self.db_session.rollback()
+        self._rollbacks_amount += 1
+
+    def get_database_path(self) -> Optional[str]:
+        return self.db_session.get_bind().url.database
+
+    def close(self) -> None:
+        self.db_session.close()
+        self.db_session.get_bind().dispose()
+
+    def edit(self, task: models.Task, text: str) -> None:
+        task.text = text
+
+    def set_collapsed(self, task: models.Task, is_collapsed: bool) -> None:
+        task.is_collapsed = is_collapsed
 
     def delete(self, *tasks: models.Task) -> None:
         for task in tasks:
+            tasks_amount, checked_tasks_amount = self._get_subtree_size(task)
+            self._change_counters_of_ancestors(
+                task.parent_id, -tasks_amount, -checked_tasks_amount
+            )
             self.db_session.delete(task)
 
+    def move(self, task: models.Task, parent_id: Optional[int]) -> None:
+        """
+        Makes the task a child of the task with the specified ID (or a root
+        task, if parent_id is None).
+        """
+        tasks_amount, checked_tasks_amount = self._get_subtree_size(task)
+        self._change_counters_of_ancestors(
+            task.parent_id, -tasks_amount, -checked_tasks_amount
+        )
+        task.position = self._get_position_after_last_child(parent_id)
+        task.parent_id = parent_id
+        self._change_counters_of_ancestors(
+            parent_id, tasks_amount, checked_tasks_amount
+        )
+
+    def place_next_to_sibling(
+            self, task: models.Task, sibling: models.Task,
+            after: bool) -> None:
+        """
+        Puts the task right before or right after the sibling (and makes it a
+        child of the sibling's parent, if it's needed). Usually only the
+        position of the task is changed, the siblings are renumbered only
+        when there's no space between the positions of the neighbours.
+
+        Args:
+            task: task to be moved
+            sibling: task, next to which the task will be put
+            after: put the task after the sibling (True) or before it (False)
+        """
+        if task.parent_id != sibling.parent_id:
+            self.move(task, sibling.parent_id)
+        for _ in range(2):
+            neighbours_query = (
+                self._get_siblings_query(sibling.parent_id)
+                .filter(models.Task.id != task.id)
+            )
+            if after:
+                neighbour_position = (
+                    neighbours_query
+                    .filter(models.Task.position > sibling.position)
+                    .with_entities(sqlalchemy.func.min(models.Task.position))
+                    .scalar()
+                )
+                if neighbour_position is None:
+                    neighbour_position = (
+                        sibling.position + 2 * POSITION_GAP
+                    )
+            else:
+                neighbour_position = (
+                    neighbours_query
+                    .filter(models.Task.position < sibling.position)
+                    .with_entities(sqlalchemy.func.max(models.Task.position))
+                    .scalar()
+                ) or 0
+            if abs(neighbour_position - sibling.position) >= (
+                MIN_POSITION_GAP
+            ):
+                task.position = (neighbour_position + sibling.position) / 2
+                return
+            self._renumber_children(sibling.parent_id)
+
+    def set_checked(self, task: models.Task, is_checked: bool) -> bool:
+        """
+        Changes is_checked attribute of the task and all of its nested tasks.
+
+        Returns:
+            bool: something is changed or not
+        """
+        old_checked_tasks_amount = self._get_subtree_size(task)[1]
+        something_is_changed = task.change_state_recursively(is_checked)
+        if something_is_changed:
+            self._change_counters_of_ancestors(
+                task.parent_id, 0,
+                self._get_subtree_size(task)[1] - old_checked_tasks_amount
+            )
+        return something_is_changed
+
+    def get_stats(self) -> Tuple[int, int, int]:
+        """
+        Counts the tasks using the subtree counters of the root tasks, so the
+        whole tree isn't walked.
+
+        Returns:
+            amount of root tasks, amount of all tasks and amount of checked
+            tasks
+        """
+        root_tasks_amount, tasks_amount, checked_tasks_amount = (
+            self.db_session.query(
+                sqlalchemy.func.count(),
+                sqlalchemy.func.sum(1 + models.Task.descendant_count),
+                sqlalchemy.func.sum(
+                    sqlalchemy.cast(models.Task.is_checked, sqlalchemy.Integer)
+                    + models.Task.checked_descendant_count
+                )
+            )
+            .filter(models.Task.parent_id.is_(None))
+            .one()
+        )
+        return root_tasks_amount, tasks_amount or 0, checked_tasks_amount or 0
+
+    def rebuild_subtree_counters(self, processes: int = 1) -> int:
+        """
+        Checks subtree counters of all tasks and fixes the wrong ones. Doesn't
+        commit.
+
+        Args:
+            processes:
+                amount of worker processes, see
+                parallel_jobs.find_wrong_counters
+
+        Returns:
+            amount of tasks, which had wrong counters
+        """
+        self.db_session.flush()
+        if processes == 1:
+            return subtree_counters.rebuild_subtree_counters(
+                self.db_session.connection()
+            )
+        # Multiprocessing is imported only when it's needed
+        from orm import parallel_jobs
+        wrong_counters = parallel_jobs.find_wrong_counters(
+            self.get_database_path(), processes
+        )
+        subtree_counters.write_counters(
+            self.db_session.connection(), wrong_counters
+        )
+        return len(wrong_counters)
+
     def get_filtered_tasks(self, *filters: Any) -> List[models.Task]:
         """
         Gets tasks, which passed the filter(s).
@@ -94,6 +436,9 @@ class TasksManager:
             .first()
         ) is not None
 
+    def task_exists(self, task_id: int) -> bool:
+        return self.check_existence(models.Task.id == task_id)
+
     def get_task_by_id(self, task_id: int) -> models.Task:
         """
         Gets task by id, if no tasks are found - raises an exception.
@@ -102,10 +447,293 @@ class TasksManager:
             found task
 
         Raises:
-            sqlalchemy.orm.exc.NoResultFound
+            TaskNotFoundError
         """
-        return (
-            self._get_query()
-            .filter_by(id=task_id)
-            .one()
+        task = self.db_session.get(models.Task, task_id)
+        if task is None:
+            raise TaskNotFoundError(task_id)
+        return task
+
+    def get_neighbours(
+            self, task: models.Task
+    ) -> Tuple[Optional[models.Task], Optional[models.Task]]:
+        """
+        Finds the neighbours by the index of positions, so the other siblings
+        aren't loaded.
+        """
+        siblings_query = self._get_siblings_query(task.parent_id)
+        previous_sibling = (
+            siblings_query
+            .filter(sqlalchemy.or_(
+                models.Task.position < task.position,
+                sqlalchemy.and_(
+                    models.Task.position == task.position,
+                    models.Task.id < task.id
+                )
+            ))
+            .order_by(models.Task.position.desc(), models.Task.id.desc())
+            .first()
+        )
+        next_sibling = (
+            siblings_query
+            .filter(sqlalchemy.or_(
+                models.Task.position > task.position,
+                sqlalchemy.and_(
+                    models.Task.position == task.position,
+                    models.Task.id > task.id
+                )
+            ))
+            .order_by(models.Task.position, models.Task.id)
+            .first()
+        )
+        return previous_sibling, next_sibling
+
+    def get_ancestors(self, task: models.Task) -> List[models.Task]:
+        """
+        Gets all ancestors of the specified task, from the root task to the
+        direct parent of the specified task.
+
+        Parents are taken from the identity map of the session when possible,
+        so only the ancestors which weren't loaded yet are queried.
+        """
+        ancestors = []
+        parent_id = task.parent_id
+        while parent_id is not None:
+            parent = self.db_session.get(models.Task, parent_id)
+            ancestors.append(parent)
+            parent_id = parent.parent_id
+        ancestors.reverse()
+        return ancestors
+
+    def search(
+            self, text: str,
+            limit: int = 50) -> List[Tuple[models.Task, List[models.Task]]]:
+        """
+        Searches for tasks, which contain all the words from the specified
+        text (the last word can be a beginning of a word), using the full-text
+        index of task texts.
+
+        Args:
+            text: words to search for, separated by whitespace
+            limit: maximum amount of found tasks
+
+        Returns:
+            found tasks with their ancestors (from the root task to the parent),
+            the most relevant tasks go first
+        """
+        words = text.split()
+        if not words:
+            return []
+        # Every word is quoted, so the user can't accidentally use the FTS5
+        # query syntax
+        fts_query = " ".join(
+            '"{}"'.format(word.replace('"', '""')) for word in words
+        ) + "*"
+        found_ids = [
+            row[0] for row in self.db_session.execute(
+                sqlalchemy.text(
+                    "SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH :query "
+                    "ORDER BY rank LIMIT :limit"
+                ), {"query": fts_query, "limit": limit}
+            )
+        ]
+        tasks_by_id = {
+            task.id: task for task in (
+                self.db_session
+                .query(models.Task)
+                .filter(models.Task.id.in_(found_ids))
+            )
+        }
+        return [
+            (tasks_by_id[task_id], self.get_ancestors(tasks_by_id[task_id]))
+            for task_id in found_ids
+        ]
+
+    def get_tree_arrays(self) -> "tree_arrays.TreeArrays":
+        # The arrays are needed only by the report
+        from orm import tree_arrays
+        self.db_session.flush()
+        # Rows are read by the cursor of the driver, because wrapping every
+        # row by SQLAlchemy takes as long as reading it. Dates are turned
+        # into timestamps (without fractions of seconds) by SQLite, it's much
+        # faster than parsing them
+        return tree_arrays.make_tree_arrays(
+            self.db_session.connection().connection.cursor().execute(
+                "SELECT id, parent_id, is_checked, is_collapsed, "
+                "CAST(strftime('%s', creation_date) AS INTEGER) "
+                "FROM tasks"
+            )
+        )
+
+    def get_text_changes(
+            self, version: Any
+    ) -> Tuple[Any, Dict[int, Optional[str]], bool]:
+        """
+        The version is the amount of rollbacks and the number of the last
+        change, so only the tasks with newer numbers of changes are read.
+        """
+        self.db_session.flush()
+        connection = self.db_session.connection()
+        last_change_seq, self._pruned_change_seq = self._get_change_sequence()
+        if (
+            version is None or version[0] != self._rollbacks_amount
+            # The deleted tasks after the version could be forgotten
+            or version[1] < self._pruned_change_seq
+        ):
+            return (
+                (self._rollbacks_amount, last_change_seq),
+                dict(connection.exec_driver_sql(
+                    "SELECT id, text FROM tasks"
+                ).fetchall()), True
+            )
+        texts: Dict[int, Optional[str]] = dict.fromkeys(
+            row[0] for row in connection.exec_driver_sql(
+                "SELECT id FROM deleted_tasks WHERE change_seq > ?",
+                (version[1],)
+            )
+        )
+        texts.update(connection.exec_driver_sql(
+            "SELECT id, text FROM tasks WHERE change_seq > ?", (version[1],)
+        ).fetchall())
+        return (self._rollbacks_amount, last_change_seq), texts, False
+
+    def iterate_tasks_in_pre_order(
+            self, root_id: Optional[int] = None
+    ) -> Iterator[tree_formats.ExportedTask]:
+        """
+        Streams all tasks (or the subtree of the task with the specified ID,
+        depths are counted from it) in the same order, in which they are
+        shown (every task goes right before its subtree), see
+        tree_queries.get_pre_order_query.
+        """
+        self.db_session.flush()
+        rows = self.db_session.connection().exec_driver_sql(
+            tree_queries.get_pre_order_query(
+                "parent_id IS NULL" if root_id is None else "id = ?"
+            ), None if root_id is None else (root_id,)
+        )
+        for row in rows:
+            yield tree_queries.make_exported_task(row)
+
+    def import_tasks(
+            self, file: TextIO, file_format: tree_formats.TreeFileFormat,
+            parent_id: Optional[int] = None,
+            batch_size: int = 1000) -> Tuple[int, List[int]]:
+        """
+        Reads tasks from the file (in the format of export_tasks) and inserts
+        them in batches as children of the specified task, new IDs are given to
+        the imported tasks. Doesn't commit.
+
+        Only the chain of ancestors of the current line is kept in memory, so
+        tasks must go in pre-order (every task goes before its subtree).
+
+        Args:
+            file: file with the tasks, it is read line by line
+            file_format: format of the file
+            parent_id:
+                ID of the task, which will contain the imported root tasks,
+                None means the imported root tasks will be root tasks
+            batch_size: amount of rows in one executemany call
+
+        Returns:
+            amount of imported tasks and new IDs of the imported root tasks
+
+        Raises:
+            tree_formats.ImportFormatError:
+                if some line is malformed or isn't in pre-order
+        """
+        self.db_session.flush()
+        connection = self.db_session.connection()
+        last_id = connection.exec_driver_sql(
+            "SELECT ifnull(max(id), 0) FROM tasks"
+        ).scalar()
+        insert_statement = (
+            "INSERT INTO tasks (id, text, is_checked, is_collapsed, parent_id, "
+            "creation_date, position, descendant_count, "
+            "checked_descendant_count) "
+            "VALUES (:id, :text, :is_checked, :is_collapsed, :parent_id, "
+            ":creation_date, :position, 0, 0)"
+        )
+        update_statement = (
+            "UPDATE tasks SET descendant_count = :descendant_count, "
+            "checked_descendant_count = :checked_descendant_count "
+            "WHERE id = :id"
+        )
+        insertions: List[Dict[str, Any]] = []
+        counter_updates: List[Dict[str, Any]] = []
+        # Chain of ancestors of the current line, every element is [new ID, is
+        # checked, descendants, checked descendants, position of the last
+        # child]. The first element stands for the task, which receives the
+        # imported root tasks
+        ancestors: List[list] = [[
+            parent_id, False, 0, 0,
+            self._get_position_after_last_child(parent_id)
+            - POSITION_GAP
+        ]]
+        imported_tasks_amount = 0
+        root_ids = []
+
+        def close_last_ancestor() -> None:
+            new_id, is_checked, descendants, checked_descendants = (
+                ancestors.pop()[:4]
+            )
+            if descendants:
+                counter_updates.append({
+                    "id": new_id,
+                    "descendant_count": descendants,
+                    "checked_descendant_count": checked_descendants
+                })
+            ancestors[-1][2] += 1 + descendants
+            ancestors[-1][3] += is_checked + checked_descendants
+
+        def write_batches(force: bool) -> None:
+            # Counters are updated only for already inserted tasks, so both
+            # batches are always written together
+            if (
+                force
+                or max(len(insertions), len(counter_updates)) >= batch_size
+            ):
+                if insertions:
+                    connection.exec_driver_sql(insert_statement, insertions)
+                    insertions.clear()
+                if counter_updates:
+                    connection.exec_driver_sql(
+                        update_statement, counter_updates
+                    )
+                    counter_updates.clear()
+
+        for task in tree_formats.read_tasks(file, file_format):
+            while len(ancestors) > task.depth + 1:
+                close_last_ancestor()
+            last_id += 1
+            ancestors[-1][4] += POSITION_GAP
+            insertions.append({
+                "id": last_id,
+                "text": task.text,
+                "is_checked": task.is_checked,
+                "is_collapsed": task.is_collapsed,
+                "parent_id": ancestors[-1][0],
+                "position": ancestors[-1][4],
+                "creation_date": (
+                    task.creation_date
+                    or datetime.now().strftime(tree_formats.DATE_FORMAT)
+                )
+            })
+            ancestors.append([last_id, task.is_checked, 0, 0, 0])
+            if not task.depth:
+                root_ids.append(last_id)
+            imported_tasks_amount += 1
+            write_batches(force=False)
+        while len(ancestors) > 1:
+            close_last_ancestor()
+        write_batches(force=True)
+        self._change_counters_of_ancestors(
+            parent_id, ancestors[0][2], ancestors[0][3]
         )
+        if parent_id is not None:
+            # The loaded children of the parent don't know about the rows,
+            # which were inserted by raw SQL
+            self.db_session.expire(
+                self.db_session.get(models.Task, parent_id), ["nested_tasks"]
+            )
+        return imported_tasks_amount, root_ids
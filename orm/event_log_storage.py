@@ -0,0 +1,274 @@
+import contextlib
+import json
+import os
+import threading
+from typing import Iterator, Dict, Any, List, Optional, Sequence
+
+from orm import tree_formats
+from orm.memory_storage import MemoryTasksManager, MemoryTask
+
+# The snapshot and the log, which is being compacted, lie next to the log
+SNAPSHOT_SUFFIX = ".snapshot"
+COMPACTED_LOG_SUFFIX = ".compacting"
+# Size of the log in bytes, after which it is compacted into the snapshot
+COMPACTION_THRESHOLD = 16 * 1024 * 1024
+
+Event = Dict[str, Any]
+# Events of one commit: {"number": number of the last event, "events": [...]}
+Record = Dict[str, Any]
+
+
+def read_records(log_path: str) -> Iterator[Record]:
+    """
+    Reads the records of the log. If the program was killed in the middle of
+    writing, the last line is incomplete, it is cut off from the file, so a
+    commit is either replayed entirely or not at all.
+    """
+    try:
+        file = open(log_path, "rb")
+    except FileNotFoundError:
+        return
+    with file:
+        contents = file.read()
+    complete_length = contents.rfind(b"\n") + 1
+    if complete_length != len(contents):
+        os.truncate(log_path, complete_length)
+    for line in contents[:complete_length].splitlines():
+        yield json.loads(line)
+
+
+def apply_event(tasks_manager: MemoryTasksManager, event: Event) -> None:
+    event_type = event["type"]
+    if event_type == "add":
+        tasks_manager.restore_task(tree_formats.ExportedTask(
+            id=event["id"], parent_id=event["parent_id"], depth=0,
+            text=event["text"], is_checked=event["is_checked"],
+            is_collapsed=event["is_collapsed"],
+            creation_date=event["creation_date"]
+        ))
+        return
+    task = tasks_manager.get_task_by_id(event["id"])
+    if event_type == "edit":
+        tasks_manager.edit(task, event["text"])
+    elif event_type == "collapse":
+        tasks_manager.set_collapsed(task, event["is_collapsed"])
+    elif event_type == "check":
+        tasks_manager.set_checked(task, event["is_checked"])
+    elif event_type == "move":
+        tasks_manager.move(task, event["parent_id"])
+    elif event_type == "place":
+        tasks_manager.place_next_to_sibling(
+            task, tasks_manager.get_task_by_id(event["sibling_id"]),
+            event["after"]
+        )
+    elif event_type == "delete":
+        tasks_manager.delete(task)
+    else:
+        raise ValueError(f"Unknown event type: {event_type}")
+
+
+def load_state(
+        tasks_manager: MemoryTasksManager, log_path: str,
+        log_paths: Sequence[str]) -> int:
+    """
+    Loads the snapshot of the log into the empty storage and replays the
+    events from the specified logs, which aren't in the snapshot yet.
+
+    Returns:
+        number of the last applied event
+    """
+    last_event_number = 0
+    try:
+        file = open(log_path + SNAPSHOT_SUFFIX, "r", encoding="utf-8")
+    except FileNotFoundError:
+        pass
+    else:
+        with file:
+            last_event_number = json.loads(file.readline())["last_event"]
+            tasks_manager.load_tasks(file)
+    for path in log_paths:
+        for record in read_records(path):
+            # The log could be compacted into the snapshot, but not deleted
+            # yet, when the program was killed
+            if record["number"] > last_event_number:
+                for event in record["events"]:
+                    apply_event(tasks_manager, event)
+                last_event_number = record["number"]
+    tasks_manager.commit()
+    return last_event_number
+
+
+def write_snapshot(
+        tasks_manager: MemoryTasksManager, log_path: str,
+        last_event_number: int) -> None:
+    """
+    Atomically replaces the snapshot of the log with the tree of the storage.
+    The first line of the snapshot is the number of the last event in it, the
+    other lines are the tasks in the format of save_snapshot.
+    """
+    snapshot_path = log_path + SNAPSHOT_SUFFIX
+    temporary_file_path = f"{snapshot_path}.tmp"
+    with open(temporary_file_path, "w", encoding="utf-8") as file:
+        file.write(json.dumps({"last_event": last_event_number}) + "\n")
+        tasks_manager.export_tasks(
+            file, tree_formats.TreeFileFormat.JSON_LINES
+        )
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_file_path, snapshot_path)
+
+
+def compact(log_path: str) -> None:
+    """
+    Applies the log, which is being compacted, to the snapshot, then deletes
+    that log. The tree is rebuilt in a separate storage, so it can be done in
+    a background thread.
+    """
+    compacted_log_path = log_path + COMPACTED_LOG_SUFFIX
+    tasks_manager = MemoryTasksManager()
+    last_event_number = load_state(
+        tasks_manager, log_path, (compacted_log_path,)
+    )
+    write_snapshot(tasks_manager, log_path, last_event_number)
+    os.remove(compacted_log_path)
+
+
+class EventLogTasksManager(MemoryTasksManager):
+    """
+    Storage, which keeps the tree in memory and persists it as an append-only
+    log of events (add, edit, collapse, check, move, place, delete). Events of
+    a command are appended as one line by one write on commit, so a change
+    costs an append instead of updates of the table and its indexes.
+
+    On start the tree is rebuilt from the snapshot and the events after it.
+    When the log grows bigger than compaction_threshold, it is renamed and
+    compacted into the snapshot in a background thread, while new events go
+    to a new log.
+    """
+
+    def __init__(
+            self, log_path: str, fsync: bool = False,
+            compaction_threshold: int = COMPACTION_THRESHOLD):
+        """
+        Args:
+            log_path: path to the log, it's created if it doesn't exist
+            fsync: whether the log should be synced to the disk on commit
+            compaction_threshold: size of the log in bytes
+        """
+        super().__init__()
+        self.log_path = log_path
+        self.fsync = fsync
+        self.compaction_threshold = compaction_threshold
+        # Events of the changes since the last commit
+        self._pending_events: List[Event] = []
+        self._compaction_thread: Optional[threading.Thread] = None
+        compacted_log_path = log_path + COMPACTED_LOG_SUFFIX
+        self._is_replaying = True
+        self._last_event_number = load_state(
+            self, log_path, (compacted_log_path, log_path)
+        )
+        self._is_replaying = False
+        if os.path.exists(compacted_log_path):
+            # The previous compaction was interrupted, but the whole tree is
+            # already loaded, so it is just saved
+            write_snapshot(self, log_path, self._last_event_number)
+            for path in (compacted_log_path, log_path):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+        self._log_file = open(log_path, "a", encoding="utf-8")
+
+    def _log_event(self, event_type: str, task_id: int, **fields: Any) -> None:
+        if not self._is_replaying:
+            self._pending_events.append(
+                {"type": event_type, "id": task_id, **fields}
+            )
+
+    def _add(self, task: MemoryTask, parent_id: Optional[int]) -> None:
+        super()._add(task, parent_id)
+        self._log_event(
+            "add", task.id, parent_id=parent_id, text=task.text,
+            is_checked=task.is_checked, is_collapsed=task.is_collapsed,
+            creation_date=task.creation_date.strftime(
+                tree_formats.DATE_FORMAT
+            )
+        )
+
+    def delete(self, *tasks: MemoryTask) -> None:
+        super().delete(*tasks)
+        for task in tasks:
+            self._log_event("delete", task.id)
+
+    def edit(self, task: MemoryTask, text: str) -> None:
+        super().edit(task, text)
+        self._log_event("edit", task.id, text=text)
+
+    def set_collapsed(self, task: MemoryTask, is_collapsed: bool) -> None:
+        super().set_collapsed(task, is_collapsed)
+        self._log_event("collapse", task.id, is_collapsed=is_collapsed)
+
+    def set_checked(self, task: MemoryTask, is_checked: bool) -> bool:
+        something_is_changed = super().set_checked(task, is_checked)
+        if something_is_changed:
+            self._log_event("check", task.id, is_checked=is_checked)
+        return something_is_changed
+
+    def move(self, task: MemoryTask, parent_id: Optional[int]) -> None:
+        super().move(task, parent_id)
+        self._log_event("move", task.id, parent_id=parent_id)
+
+    def place_next_to_sibling(
+            self, task: MemoryTask, sibling: MemoryTask, after: bool) -> None:
+        super().place_next_to_sibling(task, sibling, after)
+        self._log_event(
+            "place", task.id, sibling_id=sibling.id, after=after
+        )
+
+    def commit(self) -> None:
+        super().commit()
+        if not self._pending_events:
+            return
+        self._last_event_number += len(self._pending_events)
+        record = {
+            "number": self._last_event_number, "events": self._pending_events
+        }
+        self._log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._pending_events = []
+        self._log_file.flush()
+        if self.fsync:
+            os.fsync(self._log_file.fileno())
+        if self._log_file.tell() >= self.compaction_threshold:
+            self._start_compaction()
+
+    def rollback(self) -> None:
+        super().rollback()
+        self._pending_events.clear()
+
+    def sync(self) -> None:
+        os.fsync(self._log_file.fileno())
+
+    def _start_compaction(self) -> None:
+        if (
+            self._compaction_thread is not None
+            and self._compaction_thread.is_alive()
+        ):
+            return
+        compacted_log_path = self.log_path + COMPACTED_LOG_SUFFIX
+        # If the file is left by the previous compaction, which failed, it is
+        # compacted again, the current log is compacted next time
+        if not os.path.exists(compacted_log_path):
+            self._log_file.close()
+            os.replace(self.log_path, compacted_log_path)
+            self._log_file = open(self.log_path, "a", encoding="utf-8")
+        # Not a daemon, so the program waits for the compaction on exit
+        self._compaction_thread = threading.Thread(
+            target=compact, args=(self.log_path,), name="log-compaction"
+        )
+        self._compaction_thread.start()
+
+    def close(self) -> None:
+        """
+        Waits for the compaction and closes the log.
+        """
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        self._log_file.close()
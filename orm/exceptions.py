@@ -0,0 +1,19 @@
+class TaskNotFoundError(LookupError):
+
+    def __init__(self, task_id: int):
+        super().__init__(task_id)
+        self.task_id = task_id
+
+
+class ConcurrentModificationError(Exception):
+    """
+    Some task was changed by another process after it was loaded, so the
+    changes of the current command can't be saved.
+    """
+
+
+class JournalMismatchError(Exception):
+    """
+    The tasks were changed bypassing the undo journal (for example, by another
+    process), so an operation of the journal can't be applied.
+    """
@@ -0,0 +1,489 @@
+import os
+import re
+from datetime import datetime
+from typing import (
+    List, Tuple, Optional, Iterator, TextIO, Dict, Callable, Iterable, Any,
+    TYPE_CHECKING
+)
+
+from orm import tree_formats
+from orm.base_tasks_manager import (
+    BaseTasksManager, POSITION_GAP, MIN_POSITION_GAP
+)
+from orm.exceptions import TaskNotFoundError
+
+if TYPE_CHECKING:
+    from orm import tree_arrays
+from orm.tree_node import TreeNodeMixin
+
+# Words are split the same way as the default tokenizer of FTS5 does it
+WORD_REGEX = re.compile(r"\w+")
+
+
+class MemoryTask(TreeNodeMixin):
+    """
+    Task of MemoryTasksManager, it has the same fields as models.Task.
+    """
+
+    __slots__ = (
+        "id", "text", "is_checked", "is_collapsed", "parent_id",
+        "creation_date", "descendant_count", "checked_descendant_count",
+        "position", "nested_tasks"
+    )
+
+    def __init__(
+            self, task_id: int, text: str, parent_id: Optional[int],
+            is_checked: bool = False, is_collapsed: bool = False,
+            creation_date: Optional[datetime] = None):
+        self.id = task_id
+        self.text = text
+        self.is_checked = is_checked
+        self.is_collapsed = is_collapsed
+        self.parent_id = parent_id
+        self.creation_date = creation_date or datetime.now()
+        self.descendant_count = 0
+        self.checked_descendant_count = 0
+        self.position = 0.0
+        # Ordered by position
+        self.nested_tasks: List["MemoryTask"] = []
+
+
+class MemoryTasksManager(BaseTasksManager):
+    """
+    Storage, which keeps the whole tree in memory and doesn't need a database.
+    The tree is lost on exit, unless it is saved with save_snapshot.
+
+    Every change registers an action, which reverts it, so rollback undoes
+    the changes since the last commit in the reverse order.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, MemoryTask] = {}
+        # Ordered by position
+        self._root_tasks: List[MemoryTask] = []
+        self._last_id = 0
+        self._undo_actions: List[Callable[[], None]] = []
+        # Is changed, when a task is added, deleted or its text is changed
+        self._texts_version = 0
+
+    @classmethod
+    def from_snapshot(cls, file_path: str) -> "MemoryTasksManager":
+        """
+        Loads the tree, which was saved by save_snapshot, IDs of the tasks are
+        kept. If the file doesn't exist, the tree is empty.
+
+        Raises:
+            tree_formats.ImportFormatError: if the file is malformed
+        """
+        tasks_manager = cls()
+        try:
+            file = open(file_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return tasks_manager
+        with file:
+            tasks_manager.load_tasks(file)
+        tasks_manager.commit()
+        return tasks_manager
+
+    def load_tasks(self, file: TextIO) -> None:
+        """
+        Adds the tasks from the file in the format of save_snapshot, IDs of the
+        tasks are kept. Doesn't commit.
+
+        Raises:
+            tree_formats.ImportFormatError: if the file is malformed
+        """
+        for exported_task in tree_formats.read_tasks(
+            file, tree_formats.TreeFileFormat.JSON_LINES
+        ):
+            self.restore_task(exported_task)
+
+    def restore_task(
+            self, exported_task: tree_formats.ExportedTask) -> MemoryTask:
+        """
+        Adds the task after the last child of its parent, its ID and parent
+        ID are kept.
+        """
+        task = self._make_task(exported_task.id, exported_task)
+        self._add(task, exported_task.parent_id)
+        return task
+
+    def restore_tasks(
+            self, tasks: Iterable[tree_formats.ExportedTask]) -> None:
+        for exported_task in tasks:
+            self.restore_task(exported_task)
+
+    def save_snapshot(self, file_path: str) -> None:
+        """
+        Saves the tree to the file in JSON Lines format (it can also be
+        imported to another storage). The file is replaced atomically.
+        """
+        temporary_file_path = f"{file_path}.tmp"
+        with open(temporary_file_path, "w", encoding="utf-8") as file:
+            self.export_tasks(file, tree_formats.TreeFileFormat.JSON_LINES)
+        os.replace(temporary_file_path, file_path)
+
+    def _make_task(
+            self, task_id: int,
+            exported_task: tree_formats.ExportedTask) -> MemoryTask:
+        return MemoryTask(
+            task_id, exported_task.text, None,
+            is_checked=exported_task.is_checked,
+            is_collapsed=exported_task.is_collapsed,
+            creation_date=(
+                None if exported_task.creation_date is None else
+                datetime.strptime(
+                    exported_task.creation_date, tree_formats.DATE_FORMAT
+                )
+            )
+        )
+
+    def _get_siblings(self, parent_id: Optional[int]) -> List[MemoryTask]:
+        """
+        Returns:
+            children of the task with the specified ID (or root tasks, if
+            parent_id is None), the list itself, not a copy
+        """
+        if parent_id is None:
+            return self._root_tasks
+        return self._tasks[parent_id].nested_tasks
+
+    @staticmethod
+    def _iterate_subtree(task: MemoryTask) -> Iterator[MemoryTask]:
+        stack = [task]
+        while stack:
+            task = stack.pop()
+            yield task
+            stack.extend(task.nested_tasks)
+
+    def _change_counters_of_ancestors(
+            self, parent_id: Optional[int], descendants_difference: int,
+            checked_descendants_difference: int) -> None:
+        while parent_id is not None:
+            parent = self._tasks[parent_id]
+            parent.descendant_count += descendants_difference
+            parent.checked_descendant_count += checked_descendants_difference
+            parent_id = parent.parent_id
+
+    def _attach(
+            self, task: MemoryTask, parent_id: Optional[int],
+            index: Optional[int] = None) -> None:
+        """
+        Puts the task (already registered one) to the children of the task with
+        the specified ID, at the specified index or to the end.
+        """
+        siblings = self._get_siblings(parent_id)
+        if index is None:
+            index = len(siblings)
+        siblings.insert(index, task)
+        task.parent_id = parent_id
+        self._change_counters_of_ancestors(
+            parent_id, *self._get_subtree_size(task)
+        )
+        self._undo_actions.append(lambda: self._detach(task))
+
+    def _detach(self, task: MemoryTask) -> None:
+        siblings = self._get_siblings(task.parent_id)
+        index = siblings.index(task)
+        del siblings[index]
+        tasks_amount, checked_tasks_amount = self._get_subtree_size(task)
+        self._change_counters_of_ancestors(
+            task.parent_id, -tasks_amount, -checked_tasks_amount
+        )
+        parent_id, position = task.parent_id, task.position
+
+        def undo() -> None:
+            task.position = position
+            self._attach(task, parent_id, index)
+        self._undo_actions.append(undo)
+
+    def _register(self, tasks: Iterable[MemoryTask]) -> None:
+        tasks = list(tasks)
+        last_id = self._last_id
+        for task in tasks:
+            self._tasks[task.id] = task
+            self._last_id = max(self._last_id, task.id)
+        self._texts_version += 1
+
+        def undo() -> None:
+            self._unregister(tasks)
+            self._last_id = last_id
+        self._undo_actions.append(undo)
+
+    def _unregister(self, tasks: Iterable[MemoryTask]) -> None:
+        tasks = list(tasks)
+        for task in tasks:
+            del self._tasks[task.id]
+        self._texts_version += 1
+        self._undo_actions.append(lambda: self._register(tasks))
+
+    def _set_field(self, task: MemoryTask, name: str, value: Any) -> None:
+        old_value = getattr(task, name)
+        setattr(task, name, value)
+        if name == "text":
+            self._texts_version += 1
+        self._undo_actions.append(lambda: setattr(task, name, old_value))
+
+    def _add(self, task: MemoryTask, parent_id: Optional[int]) -> None:
+        """
+        Registers the task and puts it after the last child of the task with
+        the specified ID.
+        """
+        siblings = self._get_siblings(parent_id)
+        task.position = (
+            siblings[-1].position if siblings else 0
+        ) + POSITION_GAP
+        self._register((task,))
+        self._attach(task, parent_id)
+
+    def get_root_tasks(self) -> List[MemoryTask]:
+        return list(self._root_tasks)
+
+    def get_task_by_id(self, task_id: int) -> MemoryTask:
+        try:
+            return self._tasks[task_id]
+        except KeyError:
+            raise TaskNotFoundError(task_id)
+
+    def task_exists(self, task_id: int) -> bool:
+        return task_id in self._tasks
+
+    def add_task(self, text: str, parent_id: Optional[int]) -> MemoryTask:
+        task = MemoryTask(self._last_id + 1, text, None)
+        self._add(task, parent_id)
+        return task
+
+    def delete(self, *tasks: MemoryTask) -> None:
+        for task in tasks:
+            self._detach(task)
+            self._unregister(self._iterate_subtree(task))
+
+    def edit(self, task: MemoryTask, text: str) -> None:
+        self._set_field(task, "text", text)
+
+    def set_collapsed(self, task: MemoryTask, is_collapsed: bool) -> None:
+        self._set_field(task, "is_collapsed", is_collapsed)
+
+    def set_checked(self, task: MemoryTask, is_checked: bool) -> bool:
+        old_states = [
+            (subtask, subtask.is_checked, subtask.checked_descendant_count)
+            for subtask in self._iterate_subtree(task)
+        ]
+        old_checked_tasks_amount = self._get_subtree_size(task)[1]
+        something_is_changed = task.change_state_recursively(is_checked)
+        if something_is_changed:
+            checked_tasks_difference = (
+                self._get_subtree_size(task)[1] - old_checked_tasks_amount
+            )
+            self._change_counters_of_ancestors(
+                task.parent_id, 0, checked_tasks_difference
+            )
+
+            def undo() -> None:
+                for subtask, subtask_is_checked, checked_descendants in (
+                    old_states
+                ):
+                    subtask.is_checked = subtask_is_checked
+                    subtask.checked_descendant_count = checked_descendants
+                self._change_counters_of_ancestors(
+                    task.parent_id, 0, -checked_tasks_difference
+                )
+            self._undo_actions.append(undo)
+        return something_is_changed
+
+    def move(self, task: MemoryTask, parent_id: Optional[int]) -> None:
+        self._detach(task)
+        siblings = self._get_siblings(parent_id)
+        task.position = (
+            siblings[-1].position if siblings else 0
+        ) + POSITION_GAP
+        self._attach(task, parent_id)
+
+    def place_next_to_sibling(
+            self, task: MemoryTask, sibling: MemoryTask, after: bool) -> None:
+        """
+        Puts the task right before or right after the sibling. The task gets
+        a position between the positions of its new neighbours, the siblings
+        are renumbered only when there's no space between them.
+        """
+        self._detach(task)
+        siblings = self._get_siblings(sibling.parent_id)
+        index = siblings.index(sibling) + after
+        if after:
+            neighbour_position = (
+                siblings[index].position if index < len(siblings) else
+                sibling.position + 2 * POSITION_GAP
+            )
+        else:
+            neighbour_position = siblings[index - 1].position if index else 0
+        if abs(neighbour_position - sibling.position) < MIN_POSITION_GAP:
+            for position_index, renumbered_task in enumerate(siblings):
+                self._set_field(
+                    renumbered_task, "position",
+                    (position_index + 1 + (position_index >= index))
+                    * POSITION_GAP
+                )
+            task.position = (index + 1) * POSITION_GAP
+        else:
+            task.position = (neighbour_position + sibling.position) / 2
+        self._attach(task, sibling.parent_id, index)
+
+    def get_neighbours(
+            self, task: MemoryTask
+    ) -> Tuple[Optional[MemoryTask], Optional[MemoryTask]]:
+        siblings = self._get_siblings(task.parent_id)
+        index = siblings.index(task)
+        return (
+            siblings[index - 1] if index else None,
+            siblings[index + 1] if index + 1 < len(siblings) else None
+        )
+
+    def get_ancestors(self, task: MemoryTask) -> List[MemoryTask]:
+        ancestors = []
+        parent_id = task.parent_id
+        while parent_id is not None:
+            parent = self._tasks[parent_id]
+            ancestors.append(parent)
+            parent_id = parent.parent_id
+        ancestors.reverse()
+        return ancestors
+
+    def search(
+            self, text: str,
+            limit: int = 50) -> List[Tuple[MemoryTask, List[MemoryTask]]]:
+        """
+        Scans all tasks, the task is found if it contains all the words (the
+        last one - as a beginning of a word), case-insensitively. Tasks with
+        shorter texts go first, as the most relevant.
+        """
+        words = WORD_REGEX.findall(text.lower())
+        if not words:
+            return []
+        *whole_words, last_word = words
+        found_tasks = []
+        for task in self._tasks.values():
+            task_words = WORD_REGEX.findall(task.text.lower())
+            if all(word in task_words for word in whole_words) and any(
+                task_word.startswith(last_word) for task_word in task_words
+            ):
+                found_tasks.append(task)
+        found_tasks.sort(key=lambda task: (len(task.text), task.id))
+        return [
+            (task, self.get_ancestors(task)) for task in found_tasks[:limit]
+        ]
+
+    def get_stats(self) -> Tuple[int, int, int]:
+        tasks_amount = 0
+        checked_tasks_amount = 0
+        for task in self._root_tasks:
+            subtree_size = self._get_subtree_size(task)
+            tasks_amount += subtree_size[0]
+            checked_tasks_amount += subtree_size[1]
+        return len(self._root_tasks), tasks_amount, checked_tasks_amount
+
+    def rebuild_subtree_counters(self, processes: int = 1) -> int:
+        wrong_counters_amount = 0
+        # Children go after their parents in pre-order, so in the reversed
+        # order every task is counted after its subtree
+        for task in reversed(list(
+            subtask for root_task in self._root_tasks
+            for subtask in self._iterate_subtree(root_task)
+        )):
+            descendant_count = 0
+            checked_descendant_count = 0
+            for nested_task in task.nested_tasks:
+                subtree_size = self._get_subtree_size(nested_task)
+                descendant_count += subtree_size[0]
+                checked_descendant_count += subtree_size[1]
+            if (task.descendant_count, task.checked_descendant_count) != (
+                descendant_count, checked_descendant_count
+            ):
+                wrong_counters_amount += 1
+                task.descendant_count = descendant_count
+                task.checked_descendant_count = checked_descendant_count
+        return wrong_counters_amount
+
+    def get_tree_arrays(self) -> "tree_arrays.TreeArrays":
+        # The arrays are needed only by the report
+        from orm import tree_arrays
+        return tree_arrays.make_tree_arrays(
+            (
+                task.id, task.parent_id, task.is_checked, task.is_collapsed,
+                tree_arrays.get_timestamp(task.creation_date)
+            )
+            for task in self._tasks.values()
+        )
+
+    def get_text_changes(
+            self, version: Any
+    ) -> Tuple[Any, Dict[int, Optional[str]], bool]:
+        # Changes aren't recorded, texts of all tasks are taken right from
+        # memory, when something is changed
+        if version == self._texts_version:
+            return version, {}, False
+        return (
+            self._texts_version,
+            {task.id: task.text for task in self._tasks.values()}, True
+        )
+
+    def iterate_tasks_in_pre_order(
+            self, root_id: Optional[int] = None
+    ) -> Iterator[tree_formats.ExportedTask]:
+        stack = (
+            [(task, 0) for task in reversed(self._root_tasks)]
+            if root_id is None else
+            [(self._tasks[root_id], 0)]
+        )
+        while stack:
+            task, depth = stack.pop()
+            yield tree_formats.ExportedTask(
+                id=task.id, parent_id=task.parent_id, depth=depth,
+                text=task.text, is_checked=task.is_checked,
+                is_collapsed=task.is_collapsed,
+                creation_date=task.creation_date.strftime(
+                    tree_formats.DATE_FORMAT
+                ),
+                descendant_count=task.descendant_count,
+                checked_descendant_count=task.checked_descendant_count
+            )
+            stack.extend(
+                (nested_task, depth + 1)
+                for nested_task in reversed(task.nested_tasks)
+            )
+
+    def import_tasks(
+            self, file: TextIO, file_format: tree_formats.TreeFileFormat,
+            parent_id: Optional[int] = None,
+            batch_size: int = 1000) -> Tuple[int, List[int]]:
+        """
+        Reads tasks from the file (in the format of export_tasks) and adds
+        them as children of the specified task, new IDs are given to the
+        imported tasks. Doesn't commit. batch_size isn't used, there's nothing
+        to batch in memory.
+        """
+        # New IDs of the ancestors of the current line, the first one is the
+        # task, which receives the imported root tasks
+        ancestor_ids: List[Optional[int]] = [parent_id]
+        imported_tasks_amount = 0
+        root_ids = []
+        for exported_task in tree_formats.read_tasks(file, file_format):
+            del ancestor_ids[exported_task.depth + 1:]
+            task = self._make_task(self._last_id + 1, exported_task)
+            self._add(task, ancestor_ids[-1])
+            ancestor_ids.append(task.id)
+            if not exported_task.depth:
+                root_ids.append(task.id)
+            imported_tasks_amount += 1
+        return imported_tasks_amount, root_ids
+
+    def commit(self) -> None:
+        self._undo_actions.clear()
+
+    def rollback(self) -> None:
+        undo_actions, self._undo_actions = self._undo_actions, []
+        for undo_action in reversed(undo_actions):
+            undo_action()
+        # Old texts are restored without _set_field
+        self._texts_version += 1
+        # Reverting actions register their own reverting actions
+        self._undo_actions.clear()
@@ -0,0 +1,216 @@
+from typing import Callable, Tuple
+
+from sqlalchemy.engine import Connection, Engine
+
+from orm import subtree_counters
+from orm.base_tasks_manager import POSITION_GAP
+
+
+def add_column_if_missing(
+        connection: Connection, table_name: str, column_name: str,
+        column_definition: str) -> None:
+    """
+    Adds the column to the table, if the table doesn't have it yet (tables,
+    which were created by create_all after the column was added to the model,
+    already have it).
+    """
+    existing_columns = [
+        row[1] for row in
+        connection.exec_driver_sql(f"PRAGMA table_info({table_name})")
+    ]
+    if column_name not in existing_columns:
+        connection.exec_driver_sql(
+            f"ALTER TABLE {table_name} "
+            f"ADD COLUMN {column_name} {column_definition}"
+        )
+
+
+def create_full_text_search_index(connection: Connection) -> None:
+    """
+    Creates an FTS5 index over the texts of the tasks, keeps it in sync with
+    the "tasks" table through triggers and fills it with the already existing
+    tasks.
+    """
+    connection.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+        "text, content='tasks', content_rowid='id'"
+        ")"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_after_insert "
+        "AFTER INSERT ON tasks BEGIN "
+        "INSERT INTO tasks_fts(rowid, text) VALUES (new.id, new.text); "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_after_delete "
+        "AFTER DELETE ON tasks BEGIN "
+        "INSERT INTO tasks_fts(tasks_fts, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS tasks_fts_after_update "
+        "AFTER UPDATE OF text ON tasks BEGIN "
+        "INSERT INTO tasks_fts(tasks_fts, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        "INSERT INTO tasks_fts(rowid, text) VALUES (new.id, new.text); "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"
+    )
+
+
+def add_subtree_counters(connection: Connection) -> None:
+    add_column_if_missing(
+        connection, "tasks", "descendant_count",
+        "INTEGER NOT NULL DEFAULT 0"
+    )
+    add_column_if_missing(
+        connection, "tasks", "checked_descendant_count",
+        "INTEGER NOT NULL DEFAULT 0"
+    )
+    subtree_counters.rebuild_subtree_counters(connection)
+
+
+def add_sibling_positions(connection: Connection) -> None:
+    """
+    Adds the position column and numbers the existing siblings in the order
+    of their creation dates (they were sorted this way before).
+    """
+    add_column_if_missing(
+        connection, "tasks", "position", "FLOAT NOT NULL DEFAULT 0"
+    )
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_tasks_parent_id_position "
+        "ON tasks (parent_id, position)"
+    )
+    positions = []
+    last_parent_id = None
+    position = 0
+    for task_id, parent_id in connection.exec_driver_sql(
+        "SELECT id, parent_id FROM tasks "
+        "ORDER BY parent_id, creation_date, id"
+    ):
+        if parent_id != last_parent_id:
+            last_parent_id = parent_id
+            position = 0
+        position += POSITION_GAP
+        positions.append({"id": task_id, "position": position})
+    if positions:
+        connection.exec_driver_sql(
+            "UPDATE tasks SET position = :position WHERE id = :id", positions
+        )
+
+
+def add_change_tracking(connection: Connection) -> None:
+    """
+    Adds the version column for optimistic concurrency and the tracking of
+    changes: every inserted or updated task gets the next number of the
+    change sequence in its change_seq column, every deleted task is written to
+    deleted_tasks with such number. So a process can find out, which tasks
+    were changed since the number it saw last time.
+    """
+    add_column_if_missing(
+        connection, "tasks", "version", "INTEGER NOT NULL DEFAULT 1"
+    )
+    add_column_if_missing(
+        connection, "tasks", "change_seq", "INTEGER NOT NULL DEFAULT 0"
+    )
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_tasks_change_seq ON tasks (change_seq)"
+    )
+    connection.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS change_sequence (value INTEGER NOT NULL)"
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO change_sequence (value) "
+        "SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM change_sequence)"
+    )
+    connection.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS deleted_tasks ("
+        "id INTEGER NOT NULL, change_seq INTEGER NOT NULL"
+        ")"
+    )
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_deleted_tasks_change_seq "
+        "ON deleted_tasks (change_seq)"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS tasks_change_seq_after_insert "
+        "AFTER INSERT ON tasks BEGIN "
+        "UPDATE change_sequence SET value = value + 1; "
+        "UPDATE tasks SET change_seq = (SELECT value FROM change_sequence) "
+        "WHERE id = new.id; "
+        "END"
+    )
+    # The update of change_seq itself doesn't fire the trigger again
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS tasks_change_seq_after_update "
+        "AFTER UPDATE ON tasks WHEN new.change_seq IS old.change_seq BEGIN "
+        "UPDATE change_sequence SET value = value + 1; "
+        "UPDATE tasks SET change_seq = (SELECT value FROM change_sequence) "
+        "WHERE id = new.id; "
+        "END"
+    )
+    connection.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS tasks_change_seq_after_delete "
+        "AFTER DELETE ON tasks BEGIN "
+        "UPDATE change_sequence SET value = value + 1; "
+        "INSERT INTO deleted_tasks (id, change_seq) "
+        "SELECT old.id, value FROM change_sequence; "
+        "END"
+    )
+
+
+def add_change_pruning(connection: Connection) -> None:
+    """
+    Adds the number of the last change, up to which the deleted tasks are
+    forgotten (see tree_queries.prune_deleted_tasks).
+    """
+    add_column_if_missing(
+        connection, "change_sequence", "pruned_value",
+        "INTEGER NOT NULL DEFAULT 0"
+    )
+
+
+# Every migration is applied only once, the number of applied migrations is
+# stored in the "user_version" pragma of the database. New migrations should be
+# appended to the end, already released ones should never be changed
+MIGRATIONS: Tuple[Callable[[Connection], None], ...] = (
+    create_full_text_search_index,
+    add_subtree_counters,
+    add_sibling_positions,
+    add_change_tracking,
+    add_change_pruning,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection: Connection) -> int:
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def is_up_to_date(sql_engine: Engine) -> bool:
+    with sql_engine.connect() as connection:
+        return get_schema_version(connection) == SCHEMA_VERSION
+
+
+def migrate(sql_engine: Engine) -> None:
+    """
+    Applies all migrations, which weren't applied to the database yet.
+
+    Args:
+        sql_engine: engine of the database, which should be migrated
+    """
+    with sql_engine.begin() as connection:
+        schema_version = get_schema_version(connection)
+        for migration in MIGRATIONS[schema_version:]:
+            migration(connection)
+        if schema_version != SCHEMA_VERSION:
+            # PRAGMA doesn't support bound parameters
+            connection.exec_driver_sql(
+                f"PRAGMA user_version = {SCHEMA_VERSION}"
+            )
@@ -1,16 +1,23 @@
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import Column, String, Boolean, Integer, ForeignKey, DateTime
+from sqlalchemy import (
+    Column, String, Boolean, Integer, ForeignKey, DateTime, Float, Index
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
+from orm.tree_node import TreeNodeMixin
+
 DeclarativeBase = declarative_base()
 
 
-class Task(DeclarativeBase):
+class Task(TreeNodeMixin, DeclarativeBase):
 
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_parent_id_position", "parent_id", "position"),
+    )
 
     id = Column(Integer, primary_key=True)
     text = Column(String, nullable=False)
@@ -18,36 +25,20 @@ class Task(DeclarativeBase):
     is_collapsed = Column(Boolean, default=False, nullable=False)
     parent_id = Column(Integer, ForeignKey("tasks.id"), default=None)
     creation_date = Column(DateTime, default=datetime.now)
+    # Denormalized sizes of the subtree (without the task itself), they are
+    # updated by TasksManager on every change of the tree
+    descendant_count = Column(Integer, default=0, nullable=False)
+    checked_descendant_count = Column(Integer, default=0, nullable=False)
+    # Sort key among the siblings, TasksManager leaves gaps between the keys,
+    # so a task can be put between two other tasks by changing only its key
+    position = Column(Float, default=0, nullable=False)
+    # Incremented by every update through the ORM, which fails if the row was
+    # updated by another process since it was loaded (optimistic concurrency)
+    version = Column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     nested_tasks: List["Task"] = relationship(
-        "Task", cascade="save-update, delete"
+        "Task", cascade="save-update, delete",
+        order_by=lambda: (Task.position, Task.id)
     )
-
-    def change_state_recursively(self, is_checked: bool) -> bool:
-        """
-        Changes is_checked attribute of the current task and all of its nested
-        tasks to the specified value.
-
-        Args:
-            is_checked: state of the current task and nested tasks
-
-        Returns:
-            bool: something is changed or not
-        """
-        something_is_changed_in_subtasks = False
-        for task in self.nested_tasks:
-            something_is_changed_in_subtasks = task.change_state_recursively(
-                is_checked
-            )
-        if self.is_checked != is_checked:
-            self.is_checked = is_checked
-            return True
-        return something_is_changed_in_subtasks
-
-    def check_for_subtask(self, subtask_id: int) -> bool:
-        if subtask_id in (task.id for task in self.nested_tasks):
-            return True
-        for task in self.nested_tasks:
-            if task.check_for_subtask(subtask_id):
-                return True
-        return False
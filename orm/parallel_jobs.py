@@ -0,0 +1,206 @@
+"""
+Jobs over the whole tree, which are split between worker processes.
+
+The root tasks are split into groups of whole subtrees with about the same
+amount of tasks, every worker process reads its groups through its own
+read-only connection to the SQLite database, and the results are merged in
+the order of the groups. So the jobs see only the committed tasks, and the
+changes, which other programs commit during a job, can get only into the
+groups, which are read after them.
+"""
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, TextIO
+
+from orm import subtree_counters, tree_formats, tree_queries
+
+# For smaller trees the start of the processes costs more than it saves
+MIN_PARALLEL_TASKS = 200_000
+# Every process gets that many groups on average, so the processes, which got
+# small subtrees, take the next groups, while the big ones are handled
+GROUPS_PER_PROCESS = 4
+
+ROOTS_OF_GROUP_CONDITION = "id IN (SELECT value FROM json_each(?))"
+
+
+def _create_executor(processes: int) -> ProcessPoolExecutor:
+    # The processes are spawned, not forked, because the program can have
+    # background threads (write-behind, backups), which can't be forked safely
+    return ProcessPoolExecutor(
+        max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def split_root_tasks(
+        connection: sqlite3.Connection, groups_amount: int,
+        include_orphans: bool = False) -> List[List[int]]:
+    """
+    Splits the root tasks (in the order, in which they are shown) into
+    contiguous groups, subtrees of which have about the same amount of tasks
+    by their counters. A subtree is never split, so a group can be bigger.
+
+    Args:
+        connection: connection to the database
+        groups_amount: desired amount of the groups
+        include_orphans:
+            whether the tasks with a missing parent are root ones too
+
+    Returns:
+        IDs of the root tasks of every group
+    """
+    root_condition = "parent_id IS NULL" + (
+        " OR parent_id NOT IN (SELECT id FROM tasks)" if include_orphans
+        else ""
+    )
+    rows = connection.execute(
+        f"SELECT id, descendant_count FROM tasks WHERE {root_condition} "
+        f"ORDER BY position, id"
+    ).fetchall()
+    group_size = max(
+        sum(1 + descendant_count for _, descendant_count in rows)
+        / groups_amount, 1
+    )
+    groups: List[List[int]] = []
+    tasks_amount = 0
+    for task_id, descendant_count in rows:
+        if not groups or tasks_amount >= group_size:
+            groups.append([])
+            tasks_amount = 0
+        groups[-1].append(task_id)
+        tasks_amount += 1 + descendant_count
+    return groups
+
+
+def _split_root_tasks_of_database(
+        database_path: str, processes: int,
+        include_orphans: bool = False) -> List[List[int]]:
+    connection = tree_queries.connect_read_only(database_path)
+    try:
+        return split_root_tasks(
+            connection, processes * GROUPS_PER_PROCESS, include_orphans
+        )
+    finally:
+        connection.close()
+
+
+def _export_group(
+        database_path: str, root_ids: List[int],
+        file_format: tree_formats.TreeFileFormat, part_path: str) -> int:
+    """
+    Runs in a worker process.
+
+    Returns:
+        amount of exported tasks
+    """
+    connection = tree_queries.connect_read_only(database_path)
+    try:
+        rows = connection.execute(
+            tree_queries.get_pre_order_query(ROOTS_OF_GROUP_CONDITION),
+            (json.dumps(root_ids),)
+        )
+        tasks_amount = 0
+        with open(part_path, "w", encoding="utf-8") as file:
+            for row in rows:
+                file.write(tree_formats.format_exported_task(
+                    tree_queries.make_exported_task(row), file_format
+                ))
+                file.write("\n")
+                tasks_amount += 1
+        return tasks_amount
+    finally:
+        connection.close()
+
+
+def export_tasks(
+        database_path: str, file: TextIO,
+        file_format: tree_formats.TreeFileFormat, processes: int) -> int:
+    """
+    Writes all tasks to the file like BaseTasksManager.export_tasks. Every
+    group is written by a worker process to a temporary file, and the files
+    are appended to the file in order.
+
+    Returns:
+        amount of exported tasks
+
+    Raises:
+        OSError: if the database can't be read or the files can't be written
+    """
+    try:
+        groups = _split_root_tasks_of_database(database_path, processes)
+        with tempfile.TemporaryDirectory() as directory, \
+                _create_executor(processes) as executor:
+            part_paths = [
+                os.path.join(directory, f"{group_number}.part")
+                for group_number in range(len(groups))
+            ]
+            futures = [
+                executor.submit(
+                    _export_group, database_path, root_ids, file_format,
+                    part_path
+                )
+                for root_ids, part_path in zip(groups, part_paths)
+            ]
+            tasks_amount = 0
+            for future, part_path in zip(futures, part_paths):
+                tasks_amount += future.result()
+                with open(part_path, "r", encoding="utf-8") as part_file:
+                    shutil.copyfileobj(part_file, file)
+                os.remove(part_path)
+            return tasks_amount
+    except sqlite3.Error as error:
+        raise OSError(str(error)) from error
+
+
+def _find_wrong_counters_of_group(
+        database_path: str, root_ids: List[int]) -> List[Dict[str, int]]:
+    """
+    Runs in a worker process.
+    """
+    connection = tree_queries.connect_read_only(database_path)
+    try:
+        return subtree_counters.find_wrong_counters(connection.execute(
+            "WITH RECURSIVE subtree(id) AS ("
+            "SELECT value FROM json_each(?) "
+            "UNION ALL "
+            "SELECT tasks.id FROM tasks "
+            "JOIN subtree ON tasks.parent_id = subtree.id"
+            ") "
+            f"SELECT {subtree_counters.COUNTERS_COLUMNS} "
+            "FROM tasks JOIN subtree USING (id)",
+            (json.dumps(root_ids),)
+        ).fetchall())
+    finally:
+        connection.close()
+
+
+def find_wrong_counters(
+        database_path: str, processes: int) -> List[Dict[str, int]]:
+    """
+    Recalculates the subtree counters of all tasks like
+    subtree_counters.find_wrong_counters, every group of subtrees is counted
+    by a worker process.
+
+    Raises:
+        OSError: if the database can't be read
+    """
+    try:
+        groups = _split_root_tasks_of_database(
+            database_path, processes, include_orphans=True
+        )
+        with _create_executor(processes) as executor:
+            return [
+                counters
+                for group_counters in executor.map(
+                    _find_wrong_counters_of_group,
+                    itertools.repeat(database_path), groups
+                )
+                for counters in group_counters
+            ]
+    except sqlite3.Error as error:
+        raise OSError(str(error)) from error
@@ -0,0 +1,98 @@
+from typing import Dict, List, Tuple, Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection
+
+# Columns of the rows, which find_wrong_counters takes
+COUNTERS_COLUMNS = (
+    "id, parent_id, is_checked, descendant_count, checked_descendant_count"
+)
+
+
+def rebuild_subtree_counters(connection: "Connection") -> int:
+    """
+    Recalculates descendant_count and checked_descendant_count of every task
+    from scratch and writes the values, which differ from the stored ones.
+
+    Args:
+        connection: connection to the database with the "tasks" table
+
+    Returns:
+        amount of tasks, which had wrong counters
+    """
+    wrong_counters = find_wrong_counters(connection.exec_driver_sql(
+        f"SELECT {COUNTERS_COLUMNS} FROM tasks"
+    ).fetchall())
+    write_counters(connection, wrong_counters)
+    return len(wrong_counters)
+
+
+def find_wrong_counters(
+        rows: Iterable[Tuple[int, int, bool, int, int]]
+) -> List[Dict[str, int]]:
+    """
+    Recalculates the counters of the tasks from scratch. The rows can be only
+    a part of the tree, if they contain whole subtrees.
+
+    Args:
+        rows: tasks with the columns from COUNTERS_COLUMNS
+
+    Returns:
+        right counters of the tasks, which have wrong stored counters
+    """
+    children: Dict[int, List[int]] = {}
+    stored_counters: Dict[int, Tuple[int, int]] = {}
+    is_checked: Dict[int, bool] = {}
+    for task_id, parent_id, checked, descendants, checked_descendants in rows:
+        children.setdefault(parent_id, []).append(task_id)
+        stored_counters[task_id] = (descendants, checked_descendants)
+        is_checked[task_id] = bool(checked)
+    # Tasks with a missing parent are counted as the root ones, so the orphaned
+    # subtrees are fixed too
+    order = [
+        task_id
+        for parent_id, task_ids in children.items()
+        if parent_id not in stored_counters
+        for task_id in task_ids
+    ]
+    # Parents always go before their children in this order, so reversing it
+    # gives the bottom-up order
+    for task_id in order:
+        order.extend(children.get(task_id, ()))
+    counters: Dict[int, Tuple[int, int]] = {}
+    for task_id in reversed(order):
+        descendants = 0
+        checked_descendants = 0
+        for child_id in children.get(task_id, ()):
+            child_descendants, child_checked_descendants = counters[child_id]
+            descendants += 1 + child_descendants
+            checked_descendants += (
+                is_checked[child_id] + child_checked_descendants
+            )
+        counters[task_id] = (descendants, checked_descendants)
+    return [
+        {
+            "id": task_id,
+            "descendant_count": task_counters[0],
+            "checked_descendant_count": task_counters[1]
+        }
+        for task_id, task_counters in counters.items()
+        if stored_counters[task_id] != task_counters
+    ]
+
+
+def write_counters(
+        connection: "Connection",
+        wrong_counters: List[Dict[str, int]]) -> None:
+    """
+    Args:
+        connection: connection to the database with the "tasks" table
+        wrong_counters: result of find_wrong_counters
+    """
+    if wrong_counters:
+        connection.exec_driver_sql(
+            "UPDATE tasks SET descendant_count = :descendant_count, "
+            "checked_descendant_count = :checked_descendant_count "
+            "WHERE id = :id",
+            wrong_counters
+        )
@@ -0,0 +1,225 @@
+"""
+The tree as flat arrays for the analytics over the whole tree.
+
+Tasks are stored level by level (breadth-first): every depth is a contiguous
+slice of the arrays, and the children of the tasks of a level go in the next
+level in the order of their parents. So a bottom-up pass is a loop over the
+levels, not over the tasks: the sums of the children of a whole level are
+taken from the prefix sums of the next level. All per-task work is done by
+the C-level builtins (map, itertools, sorting), not by Python loops.
+"""
+import bisect
+import collections
+import itertools
+import operator
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+IS_CHECKED_FLAG = 1
+IS_COLLAPSED_FLAG = 2
+
+# Creation dates are naive local dates, they are turned into seconds since
+# this date without a time zone
+EPOCH = datetime(1970, 1, 1)
+
+# ID, ID of the parent, whether the task is checked, whether it's collapsed,
+# creation date as a timestamp (see get_timestamp)
+Row = Tuple[int, Optional[int], bool, bool, float]
+
+
+def get_timestamp(date: datetime) -> float:
+    return (date - EPOCH).total_seconds()
+
+
+@dataclass
+class TreeArrays:
+    """
+    Tasks are identified by their indexes in the arrays.
+    """
+    ids: array
+    # -1 for the root tasks
+    parent_indexes: array
+    depths: array
+    # IS_CHECKED_FLAG and IS_COLLAPSED_FLAG
+    flags: array
+    creation_timestamps: array
+    children_amounts: array
+    # Index of the first task of every level and the amount of the tasks at
+    # the end, so level_starts[depth + 1] - level_starts[depth] is the amount
+    # of the tasks of the depth
+    level_starts: array
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def make_tree_arrays(rows: Iterable[Row]) -> TreeArrays:
+    """
+    Args:
+        rows:
+            tasks in any order, tasks with a missing parent are counted as
+            the root ones
+
+    Returns:
+        the tree, tasks, which aren't reachable from the root ones (cycles),
+        are skipped
+    """
+    rows = list(rows)
+    # Unpacking the rows with zip(*rows) is much slower
+    ids, parent_ids, checked_states, collapsed_states, timestamps = (
+        list(map(operator.itemgetter(column), rows)) for column in range(5)
+    )
+    index_by_id = dict(zip(ids, itertools.count()))
+    raw_parent_indexes = list(
+        map(index_by_id.get, parent_ids, itertools.repeat(-1))
+    )
+    children_amounts = collections.Counter(raw_parent_indexes)
+    raw_children_amounts = list(map(
+        children_amounts.get, range(len(ids)), itertools.repeat(0)
+    ))
+    # The root tasks go first, then the children of every task go together
+    # in the order of the indexes of their parents
+    by_parents = sorted(range(len(ids)), key=raw_parent_indexes.__getitem__)
+    children_starts = list(itertools.accumulate(
+        raw_children_amounts, initial=children_amounts[-1]
+    ))
+    children_ends = children_starts[1:]
+    order: List[int] = []
+    depths = array("l")
+    level_starts = array("q")
+    level = by_parents[:children_amounts[-1]]
+    while level:
+        level_starts.append(len(order))
+        depths.extend(itertools.repeat(len(level_starts) - 1, len(level)))
+        order.extend(level)
+        level = list(itertools.chain.from_iterable(map(
+            by_parents.__getitem__, map(
+                slice, map(children_starts.__getitem__, level),
+                map(children_ends.__getitem__, level)
+            )
+        )))
+    level_starts.append(len(order))
+    new_index_by_old = dict(zip(order, itertools.count()))
+    return TreeArrays(
+        ids=array("q", map(ids.__getitem__, order)),
+        parent_indexes=array("q", map(
+            new_index_by_old.get,
+            map(raw_parent_indexes.__getitem__, order),
+            itertools.repeat(-1)
+        )),
+        depths=depths,
+        flags=array("B", map(
+            operator.or_,
+            map(checked_states.__getitem__, order),
+            map(
+                operator.mul, map(collapsed_states.__getitem__, order),
+                itertools.repeat(IS_COLLAPSED_FLAG)
+            )
+        )),
+        creation_timestamps=array("d", map(timestamps.__getitem__, order)),
+        children_amounts=array(
+            "q", map(raw_children_amounts.__getitem__, order)
+        ),
+        level_starts=level_starts
+    )
+
+
+def get_subtree_sums(tree: TreeArrays, values: Iterable[int]) -> array:
+    """
+    Args:
+        tree: the tree
+        values: value of every task
+
+    Returns:
+        sum of the values of the subtree (with the task itself) of every task
+    """
+    sums = array("q", values)
+    # From the level above the deepest one to the roots
+    for depth in reversed(range(len(tree.level_starts) - 2)):
+        start, children_start, children_end = (
+            tree.level_starts[depth:depth + 3]
+        )
+        # prefix_sums[i] is the sum of the first i tasks of the next level
+        prefix_sums = array("q", [0])
+        prefix_sums.extend(
+            itertools.accumulate(sums[children_start:children_end])
+        )
+        children_ends = list(
+            itertools.accumulate(tree.children_amounts[start:children_start])
+        )
+        sums[start:children_start] = array("q", map(
+            operator.add, sums[start:children_start],
+            map(
+                operator.sub, map(prefix_sums.__getitem__, children_ends),
+                map(
+                    prefix_sums.__getitem__,
+                    itertools.chain((0,), children_ends)
+                )
+            )
+        ))
+    return sums
+
+
+def get_subtree_sizes(tree: TreeArrays) -> Tuple[array, array]:
+    """
+    Returns:
+        amount of the tasks and amount of the checked tasks of the subtree
+        (with the task itself) of every task
+    """
+    return (
+        get_subtree_sums(tree, itertools.repeat(1, len(tree))),
+        get_subtree_sums(tree, map(IS_CHECKED_FLAG.__and__, tree.flags))
+    )
+
+
+def get_depth_histogram(tree: TreeArrays) -> List[int]:
+    """
+    Returns:
+        amount of the tasks of every depth
+    """
+    return list(map(
+        operator.sub, tree.level_starts[1:], tree.level_starts[:-1]
+    ))
+
+
+def get_branching_factor(tree: TreeArrays) -> Tuple[float, int]:
+    """
+    Returns:
+        average amount of the children of the tasks, which have children, and
+        the maximum amount of the children of a task
+    """
+    parents_amount = len(tree) - tree.children_amounts.count(0)
+    if not parents_amount:
+        return 0.0, 0
+    return (
+        sum(tree.children_amounts) / parents_amount,
+        max(tree.children_amounts)
+    )
+
+
+def get_age_histogram(
+        tree: TreeArrays, now: float, bounds: Sequence[float]) -> List[int]:
+    """
+    Args:
+        tree: the tree
+        now: current timestamp
+        bounds: ages in seconds in the ascending order
+
+    Returns:
+        amount of the tasks, which are younger than the first bound, younger
+        than the second one (and not younger than the first one) and so on,
+        and amount of the tasks, which are older than all bounds, at the end
+    """
+    timestamps = sorted(tree.creation_timestamps)
+    # Tasks, which were created after the bound time, are younger
+    younger_amounts = [
+        len(timestamps) - bisect.bisect_right(timestamps, now - bound)
+        for bound in bounds
+    ]
+    return list(map(
+        operator.sub,
+        younger_amounts + [len(timestamps)],
+        [0] + younger_amounts
+    ))
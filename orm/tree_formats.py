@@ -0,0 +1,186 @@
+import json
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum, auto
+from typing import Optional, Iterator, TextIO, List
+
+# The same format as the one, which is used by the SQLite dialect of
+# SQLAlchemy to store DateTime columns
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+TASK_LINE_REGEX = re.compile(
+    r"(?P<indentation> *)"
+    r"\[(?P<is_collapsed>[+-])\]"
+    r"\[(?P<is_checked>[ X])\]"
+    r"\[ID: (?P<id>\d+)\]"
+    r"(?:\[\d+/\d+\])?"
+    r" (?P<text>.*)"
+)
+
+
+class TreeFileFormat(Enum):
+    # One JSON object per task, parents go before their children
+    JSON_LINES = auto()
+    # The same indented tree, that is shown to the user
+    OUTLINE = auto()
+
+    @classmethod
+    def from_file_name(cls, file_name: str) -> "TreeFileFormat":
+        if file_name.lower().endswith((".jsonl", ".ndjson")):
+            return cls.JSON_LINES
+        return cls.OUTLINE
+
+
+class ImportFormatError(Exception):
+
+    def __init__(self, line_number: int):
+        super().__init__(line_number)
+        self.line_number = line_number
+
+
+@dataclass
+class ExportedTask:
+    id: int
+    parent_id: Optional[int]
+    depth: int
+    text: str
+    is_checked: bool
+    is_collapsed: bool
+    creation_date: Optional[str]
+    descendant_count: int = 0
+    checked_descendant_count: int = 0
+
+
+def format_task_line(
+        task_id: int, text: str, is_checked: bool, is_collapsed: bool,
+        descendant_count: int, checked_descendant_count: int,
+        indentation_level: int = 0, indent_size: int = 4,
+        indentation_symbol: str = " ") -> str:
+    """
+    Formats one task as a line of the indented tree outline (that's how the
+    tree is shown to the user).
+    """
+    return (
+        f"{indentation_symbol * (indentation_level * indent_size)}"
+        f"[{'+' if is_collapsed else '-'}]"
+        f"[{'X' if is_checked else ' '}]"
+        f"[ID: {task_id}]"
+        + (
+            f"[{checked_descendant_count}/{descendant_count}]"
+            if descendant_count else ""
+        )
+        + f" {text}"
+    )
+
+
+def parse_task_line(
+        line: str, line_number: int, indent_size: int = 4) -> ExportedTask:
+    """
+    Parses a line of the indented tree outline. The parent ID isn't known from
+    one line, so it's always None.
+
+    Raises:
+        ImportFormatError: if the line isn't a task line
+    """
+    match = TASK_LINE_REGEX.fullmatch(line.rstrip("\r\n"))
+    if match is None or len(match.group("indentation")) % indent_size:
+        raise ImportFormatError(line_number)
+    return ExportedTask(
+        id=int(match.group("id")),
+        parent_id=None,
+        depth=len(match.group("indentation")) // indent_size,
+        text=match.group("text"),
+        is_checked=match.group("is_checked") == "X",
+        is_collapsed=match.group("is_collapsed") == "+",
+        creation_date=None
+    )
+
+
+def format_json_line(task: ExportedTask) -> str:
+    return json.dumps({
+        "id": task.id,
+        "parent_id": task.parent_id,
+        "text": task.text,
+        "is_checked": task.is_checked,
+        "is_collapsed": task.is_collapsed,
+        "creation_date": task.creation_date
+    }, ensure_ascii=False)
+
+
+def format_exported_task(
+        task: ExportedTask, file_format: TreeFileFormat) -> str:
+    """
+    Formats the task as a line of the export (without the line break).
+    """
+    if file_format is TreeFileFormat.JSON_LINES:
+        return format_json_line(task)
+    return format_task_line(
+        task.id, task.text, task.is_checked, task.is_collapsed,
+        task.descendant_count, task.checked_descendant_count,
+        indentation_level=task.depth
+    )
+
+
+def parse_json_line(line: str, line_number: int) -> ExportedTask:
+    """
+    Parses a line of the JSON Lines export. The depth isn't stored in this
+    format, so it's always 0.
+
+    Raises:
+        ImportFormatError: if the line isn't a valid exported task
+    """
+    try:
+        fields = json.loads(line)
+        creation_date = fields.get("creation_date")
+        return ExportedTask(
+            id=int(fields["id"]),
+            parent_id=(
+                None if fields.get("parent_id") is None else
+                int(fields["parent_id"])
+            ),
+            depth=0,
+            text=str(fields["text"]),
+            is_checked=bool(fields.get("is_checked", False)),
+            is_collapsed=bool(fields.get("is_collapsed", False)),
+            creation_date=(
+                None if creation_date is None else
+                datetime.fromisoformat(creation_date).strftime(DATE_FORMAT)
+            )
+        )
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ImportFormatError(line_number)
+
+
+def read_tasks(
+        file: TextIO, file_format: TreeFileFormat) -> Iterator[ExportedTask]:
+    """
+    Reads the tasks from the file line by line, tasks must go in pre-order
+    (every task goes before its subtree). The depth is filled for both
+    formats, the parent ID - only for JSON Lines.
+
+    Raises:
+        ImportFormatError: if some line is malformed or isn't in pre-order
+    """
+    # IDs (from the file) of the ancestors of the current line
+    ancestor_ids: List[int] = []
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        if file_format is TreeFileFormat.JSON_LINES:
+            task = parse_json_line(line, line_number)
+            if task.parent_id is not None:
+                task.depth = len(ancestor_ids)
+                while task.depth and ancestor_ids[task.depth - 1] != (
+                    task.parent_id
+                ):
+                    task.depth -= 1
+                if not task.depth:
+                    raise ImportFormatError(line_number)
+        else:
+            task = parse_task_line(line, line_number)
+            if task.depth > len(ancestor_ids):
+                raise ImportFormatError(line_number)
+        del ancestor_ids[task.depth:]
+        ancestor_ids.append(task.id)
+        yield task
@@ -0,0 +1,38 @@
+class TreeNodeMixin:
+    """
+    Methods of a task, which only need its fields and its nested_tasks, so
+    tasks of every storage can share them.
+    """
+
+    __slots__ = ()
+
+    def change_state_recursively(self, is_checked: bool) -> bool:
+        """
+        Changes is_checked attribute of the current task and all of its nested
+        tasks to the specified value.
+
+        Args:
+            is_checked: state of the current task and nested tasks
+
+        Returns:
+            bool: something is changed or not
+        """
+        something_is_changed_in_subtasks = False
+        for task in self.nested_tasks:
+            if task.change_state_recursively(is_checked):
+                something_is_changed_in_subtasks = True
+        self.checked_descendant_count = (
+            self.descendant_count if is_checked else 0
+        )
+        if self.is_checked != is_checked:
+            self.is_checked = is_checked
+            return True
+        return something_is_changed_in_subtasks
+
+    def check_for_subtask(self, subtask_id: int) -> bool:
+        if subtask_id in (task.id for task in self.nested_tasks):
+            return True
+        for task in self.nested_tasks:
+            if task.check_for_subtask(subtask_id):
+                return True
+        return False
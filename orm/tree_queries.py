@@ -0,0 +1,102 @@
+"""
+Raw SQL queries of the tree, which are shared by the SQLite storage and the
+worker processes (they read the database without SQLAlchemy).
+"""
+import pathlib
+import sqlite3
+from typing import Tuple, Any
+
+from orm import tree_formats
+
+# Deleted tasks are remembered for that many last changes, processes, which
+# saw only older changes, load all tasks again
+RETAINED_CHANGES = 100_000
+# Deleted tasks are forgotten by batches of that many changes, not on every
+# commit
+PRUNING_STEP = 10_000
+
+
+def connect_read_only(database_path: str) -> sqlite3.Connection:
+    """
+    Raises:
+        sqlite3.Error: if the database can't be opened
+    """
+    return sqlite3.connect(
+        pathlib.Path(database_path).resolve().as_uri() + "?mode=ro", uri=True
+    )
+
+
+def get_pre_order_query(root_condition: str) -> str:
+    """
+    The recursive CTE uses a priority queue ordered by the path of sort keys,
+    so SQLite walks the tree depth-first and only keeps the frontier of the
+    walk in memory, not the whole tree.
+
+    Args:
+        root_condition:
+            SQL condition on the "tasks" table, which chooses the roots of
+            the walk (their depth is 0)
+
+    Returns:
+        query of the tasks in the order, in which they are shown (every task
+        goes right before its subtree), rows are taken by make_exported_task
+    """
+    return (
+        "WITH RECURSIVE subtree("
+        "id, parent_id, depth, text, is_checked, is_collapsed, "
+        "creation_date, descendant_count, checked_descendant_count, path"
+        ") AS ("
+        "SELECT id, parent_id, 0, text, is_checked, is_collapsed, "
+        "creation_date, descendant_count, checked_descendant_count, "
+        "printf('%025.9f%010d', position, id) "
+        f"FROM tasks WHERE {root_condition} "
+        "UNION ALL "
+        "SELECT tasks.id, tasks.parent_id, subtree.depth + 1, tasks.text, "
+        "tasks.is_checked, tasks.is_collapsed, tasks.creation_date, "
+        "tasks.descendant_count, tasks.checked_descendant_count, "
+        "subtree.path || '/' || printf("
+        "'%025.9f%010d', tasks.position, tasks.id"
+        ") "
+        "FROM tasks JOIN subtree ON tasks.parent_id = subtree.id "
+        "ORDER BY 10"
+        ") "
+        "SELECT id, parent_id, depth, text, is_checked, is_collapsed, "
+        "creation_date, descendant_count, checked_descendant_count "
+        "FROM subtree"
+    )
+
+
+def make_exported_task(row: Tuple[Any, ...]) -> tree_formats.ExportedTask:
+    return tree_formats.ExportedTask(
+        id=row[0], parent_id=row[1], depth=row[2], text=row[3],
+        is_checked=bool(row[4]), is_collapsed=bool(row[5]),
+        creation_date=row[6], descendant_count=row[7],
+        checked_descendant_count=row[8]
+    )
+
+
+def prune_deleted_tasks(connection: sqlite3.Connection) -> int:
+    """
+    Forgets the tasks, which were deleted before the last RETAINED_CHANGES
+    changes, if there are at least PRUNING_STEP changes to forget. Doesn't
+    commit.
+
+    Returns:
+        number of the last change, up to which the deleted tasks are
+        forgotten
+    """
+    last_change_seq, pruned_change_seq = connection.execute(
+        "SELECT value, pruned_value FROM change_sequence"
+    ).fetchone()
+    if last_change_seq - pruned_change_seq < RETAINED_CHANGES + PRUNING_STEP:
+        return pruned_change_seq
+    pruned_change_seq = last_change_seq - RETAINED_CHANGES
+    connection.execute(
+        "DELETE FROM deleted_tasks WHERE change_seq <= ?", (pruned_change_seq,)
+    )
+    # Other processes could forget more already
+    connection.execute(
+        "UPDATE change_sequence "
+        "SET pruned_value = max(pruned_value, ?)", (pruned_change_seq,)
+    )
+    return pruned_change_seq
@@ -0,0 +1,418 @@
+"""
+Journal of the committed changes, which can be undone and redone.
+
+Every entry of the journal keeps only the operations, which revert one change
+(a command or a transaction): the old text of an edited task, the old place of
+a moved task, the rows of a deleted subtree and so on. The whole tree is never
+copied, so undoing a change costs as much as the change itself.
+
+Operations also keep the state, which the change left (the new text, place or
+states), and aren't applied, if the tasks aren't in that state anymore, so
+changes of other copies of the program aren't overwritten silently.
+"""
+import collections
+import json
+import os
+from typing import Any, Dict, List, Optional, Deque, Tuple
+
+from orm import tree_formats
+from orm.base_tasks_manager import BaseTasksManager
+from orm.exceptions import TaskNotFoundError, JournalMismatchError
+
+# The oldest entries are forgotten, when there are more entries or when their
+# total size in JSON (in characters) is bigger
+MAX_ENTRIES = 100
+MAX_SIZE = 4 * 1024 * 1024
+
+Operation = Dict[str, Any]
+# Operations in the order of recording (they are applied in the reverse
+# order) and their size in JSON
+Entry = Tuple[List[Operation], int]
+
+
+def get_placement(tasks_manager: BaseTasksManager, task: Any) -> Operation:
+    """
+    Returns:
+        parent and neighbours of the task, they stay valid even if the
+        positions of the siblings are renumbered
+    """
+    previous_sibling, next_sibling = tasks_manager.get_neighbours(task)
+    return {
+        "parent_id": task.parent_id,
+        "after_id": None if previous_sibling is None else previous_sibling.id,
+        "before_id": None if next_sibling is None else next_sibling.id
+    }
+
+
+def get_restored_placement(placement: Operation) -> Operation:
+    """
+    Returns:
+        the part of the placement, which restore_placement restores: the
+        parent and the neighbour, next to which the task is put
+    """
+    restored_placement = {"parent_id": placement["parent_id"]}
+    if placement["after_id"] is not None:
+        restored_placement["after_id"] = placement["after_id"]
+    elif placement["before_id"] is not None:
+        restored_placement["before_id"] = placement["before_id"]
+    return restored_placement
+
+
+def restore_placement(
+        tasks_manager: BaseTasksManager, task: Any,
+        placement: Operation) -> None:
+    """
+    Raises:
+        TaskNotFoundError: if the parent or a neighbour doesn't exist
+    """
+    if placement["after_id"] is not None:
+        tasks_manager.place_next_to_sibling(
+            task, tasks_manager.get_task_by_id(placement["after_id"]),
+            after=True
+        )
+    elif placement["before_id"] is not None:
+        tasks_manager.place_next_to_sibling(
+            task, tasks_manager.get_task_by_id(placement["before_id"]),
+            after=False
+        )
+    elif task.parent_id != placement["parent_id"]:
+        if not (
+            placement["parent_id"] is None
+            or tasks_manager.task_exists(placement["parent_id"])
+        ):
+            raise TaskNotFoundError(placement["parent_id"])
+        tasks_manager.move(task, placement["parent_id"])
+
+
+def make_deletion(task_id: int) -> Operation:
+    """
+    Returns:
+        operation, which reverts the creation of the task
+    """
+    return {"type": "delete", "id": task_id}
+
+
+def make_restoration(tasks_manager: BaseTasksManager, task: Any) -> Operation:
+    """
+    Returns:
+        operation, which reverts the deletion of the task, it must be made
+        before the deletion
+    """
+    return {
+        "type": "restore",
+        "tasks": [
+            tree_formats.format_json_line(subtask)
+            for subtask in tasks_manager.iterate_tasks_in_pre_order(task.id)
+        ],
+        **get_placement(tasks_manager, task)
+    }
+
+
+def make_relocation(
+        tasks_manager: BaseTasksManager, task: Any,
+        expected_placement: Operation) -> Operation:
+    """
+    Args:
+        tasks_manager: storage of the task
+        task: task, which is moved
+        expected_placement:
+            parent of the task after the moving and the neighbour, next to
+            which it is put (the "after_id" or "before_id" key, if any)
+
+    Returns:
+        operation, which reverts moving of the task, it must be made before
+        the moving
+    """
+    return {
+        "type": "place", "id": task.id, **get_placement(tasks_manager, task),
+        "expected_placement": expected_placement
+    }
+
+
+def make_edit(task: Any, new_text: str) -> Operation:
+    """
+    Returns:
+        operation, which reverts editing of the task, it must be made before
+        the editing
+    """
+    return {
+        "type": "edit", "id": task.id, "text": task.text,
+        "expected_text": new_text
+    }
+
+
+def make_collapse(task: Any) -> Operation:
+    """
+    Returns:
+        operation, which reverts collapsing or expanding of the task, it must
+        be made before the change
+    """
+    return {
+        "type": "collapse", "id": task.id, "is_collapsed": task.is_collapsed,
+        "expected_is_collapsed": not task.is_collapsed
+    }
+
+
+def get_check_states(
+        tasks_manager: BaseTasksManager, task: Any) -> List[List[Any]]:
+    """
+    Returns:
+        states of the subtree as the states, which should be set recursively
+        one after another: [task ID, state] of the task itself, then (in
+        pre-order) of the tasks, which differ from their parents
+    """
+    states: Dict[int, bool] = {}
+    recursive_states = []
+    for subtask in tasks_manager.iterate_tasks_in_pre_order(task.id):
+        states[subtask.id] = subtask.is_checked
+        if subtask.id == task.id or (
+            subtask.is_checked != states[subtask.parent_id]
+        ):
+            recursive_states.append([subtask.id, subtask.is_checked])
+    return recursive_states
+
+
+def make_check(
+        tasks_manager: BaseTasksManager, task: Any,
+        expected_states: List[List[Any]]) -> Operation:
+    """
+    Args:
+        tasks_manager: storage of the task
+        task: task, which is checked or unchecked
+        expected_states:
+            states of the subtree after the change in the format of
+            get_check_states
+
+    Returns:
+        operation, which reverts checking or unchecking of the task, it must
+        be made before the change
+    """
+    return {
+        "type": "check", "id": task.id,
+        "states": get_check_states(tasks_manager, task),
+        "expected_states": expected_states
+    }
+
+
+def apply_operation(
+        tasks_manager: BaseTasksManager, operation: Operation) -> Operation:
+    """
+    Applies the operation of the journal. Doesn't commit.
+
+    Returns:
+        operation, which reverts it
+
+    Raises:
+        JournalMismatchError:
+            if the tasks of the operation don't exist or already exist, or
+            aren't in the state, which the change of the operation left
+    """
+    operation_type = operation["type"]
+    try:
+        if operation_type == "restore":
+            exported_tasks = [
+                tree_formats.parse_json_line(line, line_number)
+                for line_number, line in enumerate(
+                    operation["tasks"], start=1
+                )
+            ]
+            root_task = exported_tasks[0]
+            if tasks_manager.task_exists(root_task.id) or not (
+                root_task.parent_id is None
+                or tasks_manager.task_exists(root_task.parent_id)
+            ):
+                raise JournalMismatchError()
+            tasks_manager.restore_tasks(exported_tasks)
+            task = tasks_manager.get_task_by_id(root_task.id)
+            restore_placement(tasks_manager, task, operation)
+            return make_deletion(task.id)
+        task = tasks_manager.get_task_by_id(operation["id"])
+        if operation_type == "delete":
+            reverting_operation = make_restoration(tasks_manager, task)
+            tasks_manager.delete(task)
+        elif operation_type == "place":
+            placement = get_placement(tasks_manager, task)
+            if any(
+                placement[key] != value
+                for key, value in operation["expected_placement"].items()
+            ):
+                raise JournalMismatchError()
+            reverting_operation = make_relocation(
+                tasks_manager, task, get_restored_placement(operation)
+            )
+            restore_placement(tasks_manager, task, operation)
+        elif operation_type == "edit":
+            if task.text != operation["expected_text"]:
+                raise JournalMismatchError()
+            reverting_operation = make_edit(task, operation["text"])
+            tasks_manager.edit(task, operation["text"])
+        elif operation_type == "collapse":
+            if task.is_collapsed != operation["expected_is_collapsed"]:
+                raise JournalMismatchError()
+            reverting_operation = make_collapse(task)
+            tasks_manager.set_collapsed(task, operation["is_collapsed"])
+        elif operation_type == "check":
+            if get_check_states(tasks_manager, task) != (
+                operation["expected_states"]
+            ):
+                raise JournalMismatchError()
+            reverting_operation = make_check(
+                tasks_manager, task, operation["states"]
+            )
+            for task_id, is_checked in operation["states"]:
+                tasks_manager.set_checked(
+                    tasks_manager.get_task_by_id(task_id), is_checked
+                )
+        else:
+            raise ValueError(f"Unknown operation type: {operation_type}")
+    except (TaskNotFoundError, tree_formats.ImportFormatError) as error:
+        raise JournalMismatchError() from error
+    return reverting_operation
+
+
+class UndoJournal:
+    """
+    Stacks of the changes, which can be undone and redone. Reverting
+    operations of a change are recorded before it is committed and become an
+    entry of the journal on commit (or are thrown away on rollback), so the
+    journal always matches the committed tree.
+    """
+
+    def __init__(
+            self, max_entries: int = MAX_ENTRIES, max_size: int = MAX_SIZE):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._undo_entries: Deque[Entry] = collections.deque()
+        self._redo_entries: Deque[Entry] = collections.deque()
+        # Reverting operations of the uncommitted change
+        self._pending_operations: List[Operation] = []
+        # Stack, to which the uncommitted change goes on commit, None means
+        # that it's a new change (it goes to the undo stack and makes the redo
+        # stack invalid)
+        self._pending_target: Optional[Deque[Entry]] = None
+        # Entry, which is being undone or redone, and its stack, it's put back
+        # if the change is discarded
+        self._applied_entry: Optional[Tuple[Deque[Entry], Entry]] = None
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "UndoJournal":
+        """
+        Loads the journal, which was saved by save. If the file doesn't exist
+        or is malformed, the journal is empty.
+        """
+        journal = cls()
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                contents = json.load(file)
+            for stack, name in (
+                (journal._undo_entries, "undo"),
+                (journal._redo_entries, "redo"),
+            ):
+                for operations in contents[name]:
+                    journal._push(stack, operations)
+        except (OSError, ValueError, KeyError, TypeError):
+            journal.clear()
+        return journal
+
+    def save(self, file_path: str) -> None:
+        """
+        Saves the committed entries, the file is replaced atomically.
+        """
+        temporary_file_path = f"{file_path}.tmp"
+        with open(temporary_file_path, "w", encoding="utf-8") as file:
+            json.dump({
+                "undo": [operations for operations, _ in self._undo_entries],
+                "redo": [operations for operations, _ in self._redo_entries]
+            }, file, ensure_ascii=False)
+        os.replace(temporary_file_path, file_path)
+
+    def _push(self, stack: Deque[Entry], operations: List[Operation]) -> None:
+        stack.append((
+            operations, len(json.dumps(operations, ensure_ascii=False))
+        ))
+        while len(stack) > self.max_entries or (
+            stack and sum(size for _, size in stack) > self.max_size
+        ):
+            stack.popleft()
+
+    def record(self, operation: Operation) -> None:
+        """
+        Records the operation, which reverts a part of the uncommitted change.
+        """
+        self._pending_operations.append(operation)
+
+    def commit(self) -> None:
+        """
+        Makes an entry from the recorded operations, it must be called after
+        the change is committed to the storage.
+        """
+        if self._pending_operations:
+            target = self._pending_target
+            if target is None:
+                self._redo_entries.clear()
+                target = self._undo_entries
+            self._push(target, self._pending_operations)
+        self._pending_operations = []
+        self._pending_target = None
+        self._applied_entry = None
+
+    def discard(self) -> None:
+        """
+        Forgets the recorded operations, it must be called after the change is
+        rolled back in the storage.
+        """
+        if self._applied_entry is not None:
+            stack, entry = self._applied_entry
+            stack.append(entry)
+        self._pending_operations = []
+        self._pending_target = None
+        self._applied_entry = None
+
+    def clear(self) -> None:
+        self._undo_entries.clear()
+        self._redo_entries.clear()
+        self._pending_operations = []
+        self._pending_target = None
+        self._applied_entry = None
+
+    def _apply_last_entry(
+            self, tasks_manager: BaseTasksManager, source: Deque[Entry],
+            target: Deque[Entry]) -> bool:
+        if not source:
+            return False
+        entry = source.pop()
+        self._applied_entry = (source, entry)
+        self._pending_target = target
+        for operation in reversed(entry[0]):
+            self.record(apply_operation(tasks_manager, operation))
+        return True
+
+    def undo(self, tasks_manager: BaseTasksManager) -> bool:
+        """
+        Reverts the last committed change. Doesn't commit.
+
+        Returns:
+            whether there was a change to undo
+
+        Raises:
+            JournalMismatchError: if the tasks were changed bypassing the
+            journal
+        """
+        return self._apply_last_entry(
+            tasks_manager, self._undo_entries, self._redo_entries
+        )
+
+    def redo(self, tasks_manager: BaseTasksManager) -> bool:
+        """
+        Applies the last undone change again. Doesn't commit.
+
+        Returns:
+            whether there was a change to redo
+
+        Raises:
+            JournalMismatchError: if the tasks were changed bypassing the
+            journal
+        """
+        return self._apply_last_entry(
+            tasks_manager, self._redo_entries, self._undo_entries
+        )
@@ -0,0 +1,114 @@
+"""
+Pool of the opened storages of the workspaces.
+
+Every workspace is a separate SQLite database. Opening a storage costs an
+engine, a session and a check of the schema, so the storages are kept opened
+after they are used, and switching back to a workspace is instant. Only the
+max_size most recently used storages are kept, the older idle ones are
+closed.
+"""
+import collections
+import contextlib
+import threading
+from typing import Callable, Dict, Iterator, OrderedDict
+
+from orm.base_tasks_manager import BaseTasksManager
+
+MAX_SIZE = 4
+
+
+class WorkspacePool:
+    """
+    LRU pool of the storages by the paths to their databases. A storage can be
+    used only by one thread at a time, the pool only guarantees, that a
+    storage isn't closed, while it's used.
+    """
+
+    def __init__(
+            self, open_storage: Callable[[str], BaseTasksManager],
+            max_size: int = MAX_SIZE):
+        """
+        Args:
+            open_storage: function, which opens the storage of the database
+            max_size:
+                amount of the storages, which are kept opened (more storages
+                are opened, if all of them are used)
+        """
+        self.open_storage = open_storage
+        self.max_size = max_size
+        # From the least to the most recently used
+        self._storages: OrderedDict[str, BaseTasksManager] = (
+            collections.OrderedDict()
+        )
+        # Amount of the users of every storage, which is used now
+        self._users_amounts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, database_path: str) -> BaseTasksManager:
+        """
+        Returns:
+            storage of the database, it isn't closed until it's released
+        """
+        with self._lock:
+            try:
+                self._storages.move_to_end(database_path)
+            except KeyError:
+                # Opened under the lock, so a storage is never opened twice
+                self._storages[database_path] = self.open_storage(
+                    database_path
+                )
+            self._users_amounts[database_path] = (
+                self._users_amounts.get(database_path, 0) + 1
+            )
+            self._close_extra_storages()
+            return self._storages[database_path]
+
+    def release(self, database_path: str) -> None:
+        """
+        Marks that the storage isn't used by the caller anymore.
+        """
+        with self._lock:
+            self._users_amounts[database_path] -= 1
+            if not self._users_amounts[database_path]:
+                del self._users_amounts[database_path]
+            self._close_extra_storages()
+
+    def _close_extra_storages(self) -> None:
+        """
+        Closes the least recently used idle storages, which don't fit into
+        the pool.
+        """
+        idle_paths = [
+            path for path in self._storages if path not in self._users_amounts
+        ]
+        for path in idle_paths[:max(len(self._storages) - self.max_size, 0)]:
+            self._storages.pop(path).close()
+
+    def discard(self, database_path: str) -> None:
+        """
+        Releases the storage and closes it right away, so the database is
+        opened again next time. The storage must not be used by anyone else.
+        """
+        with self._lock:
+            del self._users_amounts[database_path]
+            self._storages.pop(database_path).close()
+
+    def close_all(self) -> None:
+        """
+        Closes all storages of the pool, none of them must be used anymore.
+        """
+        with self._lock:
+            self._users_amounts.clear()
+            while self._storages:
+                self._storages.popitem()[1].close()
+
+    @contextlib.contextmanager
+    def using(self, database_path: str) -> Iterator[BaseTasksManager]:
+        storage = self.acquire(database_path)
+        try:
+            yield storage
+        finally:
+            self.release(database_path)
+
+    def is_opened(self, database_path: str) -> bool:
+        return database_path in self._storages
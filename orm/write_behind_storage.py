@@ -0,0 +1,274 @@
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Set, Tuple, Any, List, Iterable
+
+from orm import tree_formats, tree_queries
+from orm.memory_storage import MemoryTasksManager, MemoryTask
+
+# Values of a row of the "tasks" table, None means the row is deleted
+Row = Optional[Tuple[Any, ...]]
+
+UPSERT_STATEMENT = (
+    "INSERT INTO tasks (id, text, is_checked, is_collapsed, parent_id, "
+    "creation_date, position, descendant_count, checked_descendant_count) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET text = excluded.text, "
+    "is_checked = excluded.is_checked, is_collapsed = excluded.is_collapsed, "
+    "parent_id = excluded.parent_id, position = excluded.position, "
+    "descendant_count = excluded.descendant_count, "
+    "checked_descendant_count = excluded.checked_descendant_count, "
+    "version = version + 1"
+)
+
+
+class WriteBehindTasksManager(MemoryTasksManager):
+    """
+    Storage, which keeps the tree of the SQLite database in memory. Commit
+    applies nothing to the database, it only hands the changed rows to a
+    background thread, which writes all rows, that were committed during the
+    durability window, in one transaction (group commit). So commands don't
+    wait for the disk, but the changes of the last durability_window seconds
+    can be lost if the program is killed.
+
+    The database must already have the current schema.
+    """
+
+    def __init__(self, database_path: str, durability_window: float):
+        """
+        Args:
+            database_path: path to the SQLite database
+            durability_window:
+                maximum time in seconds, during which committed changes can be
+                only in memory
+        """
+        super().__init__()
+        self.database_path = database_path
+        self.durability_window = durability_window
+        # IDs of the tasks, which were changed since the last commit (rolled
+        # back tasks stay here, their restored rows are just written again)
+        self._changed_ids: Set[int] = set()
+        # Committed rows, which aren't written yet, by IDs of the tasks
+        self._unwritten_rows: Dict[int, Row] = {}
+        # When the oldest of the unwritten rows was committed
+        self._first_unwritten_commit_time: Optional[float] = None
+        self._is_sync_requested = False
+        self._is_closed = False
+        # Rows, which are being written by the background thread now
+        self._rows_in_writing: Dict[int, Row] = {}
+        self._writing_error: Optional[Exception] = None
+        self._condition = threading.Condition()
+        self._load()
+        self._writer_thread = threading.Thread(
+            target=self._write_rows_infinitely, name="write-behind",
+            daemon=True
+        )
+        self._writer_thread.start()
+
+    def _load(self) -> None:
+        connection = sqlite3.connect(self.database_path)
+        try:
+            rows = connection.execute(
+                "SELECT id, text, is_checked, is_collapsed, parent_id, "
+                "creation_date, position, descendant_count, "
+                "checked_descendant_count FROM tasks ORDER BY position, id"
+            ).fetchall()
+        finally:
+            connection.close()
+        rows_by_parent_id: Dict[Optional[int], List[tuple]] = {}
+        for row in rows:
+            rows_by_parent_id.setdefault(row[4], []).append(row)
+        stored_counters: Dict[int, Tuple[int, int]] = {}
+        parent_ids: List[Optional[int]] = [None]
+        while parent_ids:
+            for (
+                task_id, text, is_checked, is_collapsed, parent_id,
+                creation_date, position, descendant_count,
+                checked_descendant_count
+            ) in rows_by_parent_id.pop(parent_ids.pop(), ()):
+                task = MemoryTask(
+                    task_id, text, None, is_checked=bool(is_checked),
+                    is_collapsed=bool(is_collapsed),
+                    creation_date=(
+                        datetime.fromisoformat(creation_date)
+                        if creation_date else None
+                    )
+                )
+                task.position = position
+                self._register((task,))
+                self._attach(task, parent_id)
+                stored_counters[task_id] = (
+                    descendant_count, checked_descendant_count
+                )
+                parent_ids.append(task_id)
+        # Only the rows with wrong subtree counters are written back
+        self._changed_ids = {
+            task.id for task in self._tasks.values()
+            if stored_counters[task.id] != (
+                task.descendant_count, task.checked_descendant_count
+            )
+        }
+        self.commit()
+
+    def _mark_as_changed(self, task_id: int) -> None:
+        self._changed_ids.add(task_id)
+
+    def _change_counters_of_ancestors(
+            self, parent_id: Optional[int], descendants_difference: int,
+            checked_descendants_difference: int) -> None:
+        super()._change_counters_of_ancestors(
+            parent_id, descendants_difference, checked_descendants_difference
+        )
+        while parent_id is not None:
+            self._mark_as_changed(parent_id)
+            parent_id = self._tasks[parent_id].parent_id
+
+    def _attach(
+            self, task: MemoryTask, parent_id: Optional[int],
+            index: Optional[int] = None) -> None:
+        super()._attach(task, parent_id, index)
+        self._mark_as_changed(task.id)
+
+    def _unregister(self, tasks: Iterable[MemoryTask]) -> None:
+        tasks = list(tasks)
+        super()._unregister(tasks)
+        for task in tasks:
+            self._mark_as_changed(task.id)
+
+    def _set_field(self, task: MemoryTask, name: str, value: Any) -> None:
+        super()._set_field(task, name, value)
+        self._mark_as_changed(task.id)
+
+    def set_checked(self, task: MemoryTask, is_checked: bool) -> bool:
+        something_is_changed = super().set_checked(task, is_checked)
+        if something_is_changed:
+            for subtask in self._iterate_subtree(task):
+                self._mark_as_changed(subtask.id)
+        return something_is_changed
+
+    def _get_row(self, task_id: int) -> Row:
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        return (
+            task.id, task.text, task.is_checked, task.is_collapsed,
+            task.parent_id,
+            task.creation_date.strftime(tree_formats.DATE_FORMAT),
+            task.position, task.descendant_count,
+            task.checked_descendant_count
+        )
+
+    def commit(self) -> None:
+        super().commit()
+        if not self._changed_ids:
+            return
+        # Rows are taken now, because the tasks can be changed again before
+        # the rows are written
+        rows = {
+            task_id: self._get_row(task_id) for task_id in self._changed_ids
+        }
+        self._changed_ids.clear()
+        with self._condition:
+            if self._first_unwritten_commit_time is None:
+                self._first_unwritten_commit_time = time.monotonic()
+            self._unwritten_rows.update(rows)
+            self._condition.notify_all()
+
+    def _write_rows_infinitely(self) -> None:
+        connection = sqlite3.connect(self.database_path)
+        while True:
+            with self._condition:
+                while not (
+                    self._is_closed
+                    or self._unwritten_rows and (
+                        self._is_sync_requested
+                        or time.monotonic() - self._first_unwritten_commit_time
+                        >= self.durability_window
+                    )
+                ):
+                    self._condition.wait(
+                        None if not self._unwritten_rows else
+                        self._first_unwritten_commit_time
+                        + self.durability_window - time.monotonic()
+                    )
+                if not self._unwritten_rows:
+                    # Closed and everything is written
+                    break
+                self._rows_in_writing = self._unwritten_rows
+                self._unwritten_rows = {}
+                self._first_unwritten_commit_time = None
+            try:
+                with connection:
+                    connection.executemany(
+                        "DELETE FROM tasks WHERE id = ?",
+                        [
+                            (task_id,) for task_id, row in
+                            self._rows_in_writing.items() if row is None
+                        ]
+                    )
+                    connection.executemany(UPSERT_STATEMENT, [
+                        row for row in self._rows_in_writing.values()
+                        if row is not None
+                    ])
+                    tree_queries.prune_deleted_tasks(connection)
+            except sqlite3.Error as error:
+                print(
+                    f"Не удалось записать изменения в базу данных: {error}",
+                    file=sys.stderr
+                )
+                with self._condition:
+                    self._writing_error = error
+                    # Newer rows of the same tasks must win
+                    self._unwritten_rows = {
+                        **self._rows_in_writing, **self._unwritten_rows
+                    }
+                    self._rows_in_writing = {}
+                    self._is_sync_requested = False
+                    self._condition.notify_all()
+                    if self._is_closed:
+                        break
+                # The next attempt waits for the next window
+                time.sleep(self.durability_window)
+                with self._condition:
+                    if self._first_unwritten_commit_time is None:
+                        self._first_unwritten_commit_time = time.monotonic()
+                continue
+            with self._condition:
+                self._rows_in_writing = {}
+                self._writing_error = None
+                if not self._unwritten_rows:
+                    self._is_sync_requested = False
+                self._condition.notify_all()
+        connection.close()
+
+    def get_database_path(self) -> Optional[str]:
+        return self.database_path
+
+    def sync(self) -> None:
+        """
+        Waits until all committed changes are written to the database.
+
+        Raises:
+            OSError: if the changes can't be written
+        """
+        with self._condition:
+            if self._unwritten_rows:
+                self._is_sync_requested = True
+                self._condition.notify_all()
+            while self._unwritten_rows or self._rows_in_writing:
+                if self._writing_error is not None:
+                    raise OSError(
+                        str(self._writing_error)
+                    ) from self._writing_error
+                self._condition.wait()
+
+    def close(self) -> None:
+        """
+        Writes all committed changes and stops the background thread.
+        """
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify_all()
+        self._writer_thread.join()
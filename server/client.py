@@ -0,0 +1,41 @@
+import asyncio
+import json
+from typing import Optional
+
+from handlers.handler_helpers import HandlingResult
+from server.tree_server import DEFAULT_HOST, DEFAULT_PORT
+
+
+class TreeClient:
+    """
+    Client of server.tree_server, commands of one client are handled in the
+    order of sending.
+    """
+
+    def __init__(self):
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(
+            self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+
+    async def execute(self, command: str) -> HandlingResult:
+        """
+        Raises:
+            ConnectionError: if the server closed the connection
+        """
+        self._writer.write(command.encode("utf-8") + b"\n")
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        response = json.loads(line)
+        return HandlingResult(
+            response["message"],
+            whether_to_print_a_tree=response["tree_changed"]
+        )
+
+    async def close(self) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
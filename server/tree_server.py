@@ -0,0 +1,243 @@
+"""
+Network front end of the tree of tasks.
+
+Many clients can use one tree at the same time. Every client sends command
+lines (one per line, in UTF-8) over TCP and gets one JSON line per command:
+{"message": <message of HandlingResult>, "tree_changed": <bool>}.
+
+Usage (from the project root):
+    python -m server.tree_server [--host 127.0.0.1] [--port 8765]
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from typing import Optional, List, Callable, Any, Tuple
+
+from config.ini_worker import MyINIWorker
+from handlers.handler_helpers import HandlingResult
+from handlers.handlers import Handlers
+from lexer import exceptions, lexer_classes
+from main_logic import MainLogic, get_tasks_manager, CONFIG_FILE_PATH
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Name of the command, which is served from the rendered tree
+SHOW_COMMAND_NAME = "показать"
+# Names of the transaction commands, they aren't served, because all clients
+# share one session
+TRANSACTION_COMMAND_NAMES = ("начать", "зафиксировать", "откатить")
+# Name of the command, which isn't served, because it would switch the tree of
+# all clients
+WORKSPACE_COMMAND_NAME = "пространство"
+
+
+def _get_file_signature(
+        file_path: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Returns:
+        (modification time, size) of the file, or None if there is no file
+    """
+    if file_path is None:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class TreeServer:
+    """
+    All commands are handled one by one by a single writer (a thread, which
+    owns MainLogic and its database session), so the clients never see a half
+    of a change. The show command is served right in the event loop from the
+    tree, which was rendered after the last change, so readers don't wait in
+    the queue of the writer. Other processes can change the database too, so
+    the tree is served only while the file of the database isn't changed.
+    """
+
+    def __init__(self, main_logic: MainLogic):
+        self.main_logic = main_logic
+        # MainLogic isn't thread-safe, so it's used only by one thread
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="tree-writer"
+        )
+        self._jobs: Optional[
+            "asyncio.Queue[Tuple[Callable[[], Any], asyncio.Future]]"
+        ] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        # Rendered tree, None means that it is stale
+        self._rendered_tree: Optional[str] = None
+        # Database of the rendered tree and the signature of its file at the
+        # moment of rendering (None for storages, which aren't in files)
+        self._database_path: Optional[str] = None
+        self._database_signature: Optional[Tuple[int, int]] = None
+
+    async def start(
+            self, host: str = DEFAULT_HOST,
+            port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        self._jobs = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._run_jobs())
+        return await asyncio.start_server(self._serve_client, host, port)
+
+    async def _run_jobs(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job, future = await self._jobs.get()
+            try:
+                result = await loop.run_in_executor(self._executor, job)
+            except Exception as error:
+                if not future.cancelled():
+                    future.set_exception(error)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+
+    async def _run_in_writer(self, job: Callable[[], Any]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        await self._jobs.put((job, future))
+        return await future
+
+    def _handle_command(self, command: str) -> HandlingResult:
+        """
+        Runs in the writer thread.
+        """
+        # The command picks up the changes of other processes, they make the
+        # rendered tree stale too
+        if self.main_logic.handlers.refresh_tasks():
+            self._rendered_tree = None
+        result = self.main_logic.handle_command(command)
+        if result.whether_to_print_a_tree:
+            self._rendered_tree = None
+        return result
+
+    def _render_tree(self) -> str:
+        """
+        Runs in the writer thread, so the tree can't be changed meanwhile.
+        """
+        if self.main_logic.handlers.refresh_tasks():
+            self._rendered_tree = None
+        if self._rendered_tree is None:
+            # The signature is taken before the rendering, so changes, which
+            # are made meanwhile, make the tree stale
+            self._database_path = (
+                self.main_logic.handlers.tasks_manager.get_database_path()
+            )
+            self._database_signature = _get_file_signature(
+                self._database_path
+            )
+            self._rendered_tree = self.main_logic.render_tree()
+        return self._rendered_tree
+
+    def _get_fresh_rendered_tree(self) -> Optional[str]:
+        """
+        Returns:
+            the rendered tree, if the database wasn't changed since the
+            rendering, else None
+        """
+        rendered_tree = self._rendered_tree
+        if rendered_tree is None or _get_file_signature(
+            self._database_path
+        ) != self._database_signature:
+            return None
+        return rendered_tree
+
+    def _find_command(self, command: str) -> Optional[lexer_classes.Command]:
+        """
+        Returns:
+            the command, as which the line is parsed (like MainLogic parses
+            it, so aliases and any letter case are recognized), or None if
+            the line isn't parsed
+        """
+        for command_ in self.main_logic.commands:
+            try:
+                command_.convert_command_to_args(command)
+            except exceptions.ParsingError:
+                continue
+            return command_
+        return None
+
+    async def execute(self, command: str) -> HandlingResult:
+        parsed_command = self._find_command(command)
+        command_name = (
+            parsed_command.names[0] if parsed_command is not None else None
+        )
+        if command_name in TRANSACTION_COMMAND_NAMES:
+            return HandlingResult(
+                "Транзакции недоступны в режиме сервера!",
+                whether_to_print_a_tree=False, is_successful=False
+            )
+        if command_name == WORKSPACE_COMMAND_NAME:
+            return HandlingResult(
+                "Рабочее пространство нельзя сменить в режиме сервера, потому "
+                "что оно общее для всех клиентов!",
+                whether_to_print_a_tree=False, is_successful=False
+            )
+        if command_name == SHOW_COMMAND_NAME:
+            rendered_tree = self._get_fresh_rendered_tree()
+            if rendered_tree is None:
+                rendered_tree = await self._run_in_writer(self._render_tree)
+            return HandlingResult(rendered_tree, whether_to_print_a_tree=False)
+        return await self._run_in_writer(
+            functools.partial(self._handle_command, command)
+        )
+
+    async def _serve_client(
+            self, reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                result = await self.execute(
+                    line.decode("utf-8", errors="replace").rstrip("\r\n")
+                )
+                writer.write(json.dumps({
+                    "message": result.message,
+                    "tree_changed": result.whether_to_print_a_tree
+                }, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        # Too long line or the client disconnected
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self) -> None:
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+        self._executor.shutdown()
+
+
+async def serve(host: str, port: int) -> None:
+    ini_worker = MyINIWorker(ConfigParser(), CONFIG_FILE_PATH)
+    tree_server = TreeServer(MainLogic(ini_worker, Handlers(
+        ini_worker, functools.partial(get_tasks_manager, ini_worker)
+    )))
+    server = await tree_server.start(host, port)
+    print(f"Сервер запущен на {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        tree_server.close()
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(arguments)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from orm import backups
+
+
+class BackupRotationTest(unittest.TestCase):
+
+    def setUp(self):
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.directory = temporary_directory.name
+        self.backup_directory = os.path.join(self.directory, "backups")
+
+    def _create_database(self, name: str) -> str:
+        database_path = os.path.join(self.directory, name)
+        connection = sqlite3.connect(database_path)
+        connection.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY)")
+        connection.close()
+        return database_path
+
+    def test_databases_with_the_same_prefix(self):
+        # Backups of "tasks-old.db" start with "tasks-" too
+        database_path = self._create_database("tasks.db")
+        other_database_path = self._create_database("tasks-old.db")
+        other_backup_paths = [
+            backups.make_backup(other_database_path, self.backup_directory)
+            for _ in range(2)
+        ]
+        for _ in range(3):
+            backup_path = backups.make_backup(
+                database_path, self.backup_directory, retention=1
+            )
+        self.assertEqual(
+            backups.get_backups(database_path, self.backup_directory),
+            [backup_path]
+        )
+        self.assertEqual(
+            backups.get_backups(other_database_path, self.backup_directory),
+            other_backup_paths
+        )
+
+    def test_negative_retention(self):
+        database_path = self._create_database("tasks.db")
+        with self.assertRaises(ValueError):
+            backups.make_backup(
+                database_path, self.backup_directory, retention=-1
+            )
+        self.assertEqual(
+            backups.get_backups(database_path, self.backup_directory), []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()